@@ -2,16 +2,37 @@ from pprint import pprint
 import signal
 import sys
 import os
-import subprocess
-from time import clock_gettime, CLOCK_REALTIME, sleep
-import shutil
+from time import clock_gettime, CLOCK_REALTIME, CLOCK_MONOTONIC, sleep
 import abc
-from typing import List, Dict, Union, NoReturn, TextIO, Callable, Set, Collection
+import threading
+import concurrent.futures
+import socket
+import re
+from typing import List, Dict, Union, NoReturn, Callable, Set, Collection, Optional, Any
+from remote import *
+from confgen import *
+from spans import span
 
 K = 1024
 M = 1024 * 1024
 G = 1024 * 1024 * 1024
 
+# tools run on the bakers and on the harness that live outside the applications' homes. relative
+# paths resolve against the directory a command runs in, local_cluster uses that to give every
+# sandboxed baker its own cgroup tree.
+tools: Dict[str, str] = {
+	"cg_helper": "/homes/eurosys21/cg_helper",
+	"cgroup_root": "/sys/fs/cgroup/memory",
+	"toogle_swap": "/homes/liondavi/cluster-misc/bin/toogle_swap",
+	"obs_env": "/homes/adrian/cluster-misc/thermostat-scripts/env/bin/activate",
+	"obs": "/homes/adrian/cluster-misc/krgc-scripts/obs.py",
+	"jemalloc": "/home/eurosys21/applications/jemalloc-5.2.1/lib/libjemalloc.so",
+	"memtier": "/home/eurosys21/applications/memtier_benchmark-1.3.0/memtier_benchmark",
+}
+
+# set when other tests run on the same harness machine, so local cleanup only touches this test
+shared_harness: bool = False
+
 def memify(arg: str) -> int:
 	if arg[-1] == "k" or arg[-1] == "K":
 		return int(arg[:-1]) * K
@@ -22,40 +43,36 @@ def memify(arg: str) -> int:
 	else:
 		return int(arg)
 
-def do_cmds(cmds: List[List[str]], quiet: bool = False) -> None:
-	procs: List[subprocess.Popen] = []
-	for cmd in cmds:
-		procs.append(subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE))
-	for proc in procs:
-		proc.wait()
-		if not quiet and proc.returncode != 0:
-			print("[warn] ret: {} for: {}".format(proc.returncode, proc.args))
-			print(proc.stdout.read().decode("utf-8"))
-			print(proc.stderr.read().decode("utf-8"))
+def do_cmds(cmds: List[List[str]], quiet: bool = False, hosts: List[str] = None,
+		timeout: Optional[float] = -1) -> List[result]:
+	return executor().run(cmds, hosts, quiet, timeout)
 
 # TODO: change this to take List[str] / Callable[[str], List[str]]?
-def ssh_bakers(bakers: Collection[str], cmd: Union[str, Callable[[str], str]], quiet: bool = False) -> None:
+def ssh_bakers(bakers: Collection[str], cmd: Union[str, Callable[[str], str]], quiet: bool = False,
+		timeout: Optional[float] = -1) -> List[result]:
 	cmds: List[List[str]] = []
-	for baker in bakers:
-		cmds.append(["ssh", baker, cmd(baker) if callable(cmd) else cmd])
-	do_cmds(cmds, quiet)
+	hosts: List[str] = list(bakers)
+	for baker in hosts:
+		cmds.append(pool().cmd(baker, cmd(baker) if callable(cmd) else cmd))
+	return do_cmds(cmds, quiet, hosts, timeout)
 
 def rsync_bakers(bakers: Set[str], src_fn: Callable[[str], str], dst_fn: Callable[[str], str],
-		exclude: str = None) -> None:
+		exclude: str = None, timeout: Optional[float] = -1, extra: List[str] = None) -> List[result]:
 	cmds: List[List[str]] = []
-	for baker in bakers:
-		cmd = [ "rsync", "-a" ]
+	hosts: List[str] = list(bakers)
+	for baker in hosts:
+		args = [ "-a" ] + (extra if extra else [])
 		if exclude:
-			cmd.append("--exclude=" + exclude)
-		cmd.append(src_fn(baker))
-		cmd.append(dst_fn(baker))
-		cmds.append(cmd)
-	do_cmds(cmds)
+			args.append("--exclude=" + exclude)
+		args.append(src_fn(baker))
+		args.append(dst_fn(baker))
+		cmds.append(pool().rsync([ baker ], args))
+	return do_cmds(cmds, False, hosts, timeout)
 
-def wait_and_report(proc: subprocess.Popen):
-	proc.wait()
-	if proc.returncode != 0:
-		print("[warn] ret: {} for: {}".format(proc.returncode, proc.args))
+def wait_and_report(j: job) -> result:
+	res = j.wait()
+	res.report()
+	return res
 
 class cgroup:
 	def __init__(self, bakers: Set[str], group: str, mem: str) -> None:
@@ -66,17 +83,14 @@ class cgroup:
 		self.name = group.split(':')[-1]
 		self.init_done: bool = False
 
-	def write_conf(self) -> None:
-		with open(self.test_home + "/conf/cgroup_" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
-			conf_f.write("group {}\n".format(self.group))
-			conf_f.write("mem {}\n".format(self.mem))
+	def describe(self) -> Dict[str, Any]:
+		return { "type": type(self).__name__, "bakers": sorted(self.bakers), "group": self.group, "mem": self.mem }
 
-	def prologue(self) -> None:
+	def prologue(self, b: batch = None) -> None:
 		print("running cgroup.prologue")
-		ssh_bakers(self.bakers, "/homes/eurosys21/cg_helper " + self.group)
-		ssh_bakers(self.bakers, "echo {} > /sys/fs/cgroup/memory/{}/memory.limit_in_bytes".format(self.mem, self.name))
+		with batched(b, "cgroup.prologue") as b:
+			b.add(self.bakers, tools["cg_helper"] + ' ' + self.group)
+			b.add(self.bakers, "echo {} > {}/{}/memory.limit_in_bytes".format(self.mem, tools["cgroup_root"], self.name))
 
 class daemon:
 	def __init__(self, bakers: Set[str], test_home: str, name: str, cmd: str) -> None:
@@ -85,33 +99,36 @@ class daemon:
 		self.test_home: str = test_home
 		self.test_log_dir: str = test_home + '/' + name
 		self.cmd: str = cmd
-		self.procs: List[subprocess.Popen] = []
-		self.logs: List[TextIO] = []
+		self.jobs: List[job] = []
+
+	def describe(self) -> Dict[str, Any]:
+		return { "type": type(self).__name__, "test_log_dir": self.test_log_dir, "bakers": sorted(self.bakers) }
+
+	# what its epilogue waits for: the long running jobs and whatever its own threads run
+	def live_jobs(self) -> List[job]:
+		return self.jobs + executor().owned(self.test_log_dir)
 
-	def write_conf(self) -> None:
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("test_log_dir {}\n".format(self.test_log_dir))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
+	def setup(self, b: batch = None) -> None:
+		# both sigve and obs rely on this so always make it
+		with batched(b, "daemon.setup") as b:
+			b.add(self.bakers, "mkdir /tmp/sigve", quiet=True)
 
 	def prologue(self) -> None:
 		print("running daemon.prologue")
-		# both sigve and obs rely on this so always make it
-		ssh_bakers(self.bakers, "mkdir /tmp/sigve", quiet=True)
 		os.mkdir(self.test_log_dir)
 		for baker in self.bakers:
-			log = open(self.test_log_dir + '/' + baker + ".log", 'w')
-			self.logs.append(log)
-			self.procs.append(subprocess.Popen(["ssh", baker, self.cmd], stdout=log, stderr=log))
+			log = self.test_log_dir + '/' + baker + ".log"
+			self.jobs.append(executor().submit(pool().cmd(baker, self.cmd), baker, log, log,
+				timeout=None, bounded=False))
 
 	def epilogue(self) -> None:
 		print("running daemon.epilogue")
-		for proc in self.procs:
-			proc.terminate()
-		for log in self.logs:
-			log.close()
+		for j in self.jobs:
+			j.terminate()
+		for j in self.jobs:
+			j.wait()
 
-	def clean(self) -> None:
+	def clean(self, b: batch = None) -> None:
 		pass
 
 class sigve_conf:
@@ -156,20 +173,23 @@ class sigve_conf:
 				self.kill_time,
 				self.poll_time)
 
-	def write_conf(self, conf_f: TextIO) -> None:
-		conf_f.write("home {}\n".format(self.home))
-		conf_f.write("top {}\n".format(self.top))
-		conf_f.write("low_wm_init {}\n".format(self.low_wm_init))
-		conf_f.write("high_wm_init {}\n".format(self.high_wm_init))
-		conf_f.write("low_wm_ratio {}\n".format(self.low_wm_ratio))
-		conf_f.write("high_wm_ratio {}\n".format(self.high_wm_ratio))
-		conf_f.write("low_wm_period {}\n".format(self.low_wm_period))
-		conf_f.write("high_wm_period {}\n".format(self.high_wm_period))
-		conf_f.write("wm_increment_percent {}\n".format(self.wm_increment_percent))
-		conf_f.write("high_wm_pool {}\n".format(self.high_wm_pool))
-		conf_f.write("expected_shrink {}\n".format(self.expected_shrink))
-		conf_f.write("kill_time {}\n".format(self.kill_time))
-		conf_f.write("poll_time {}\n".format(self.poll_time))
+	def describe(self) -> Dict[str, Any]:
+		return {
+			"type": type(self).__name__,
+			"home": self.home,
+			"top": self.top,
+			"low_wm_init": self.low_wm_init,
+			"high_wm_init": self.high_wm_init,
+			"low_wm_ratio": self.low_wm_ratio,
+			"high_wm_ratio": self.high_wm_ratio,
+			"low_wm_period": self.low_wm_period,
+			"high_wm_period": self.high_wm_period,
+			"wm_increment_percent": self.wm_increment_percent,
+			"high_wm_pool": self.high_wm_pool,
+			"expected_shrink": self.expected_shrink,
+			"kill_time": self.kill_time,
+			"poll_time": self.poll_time,
+		}
 
 class sigve_daemon(daemon):
 	def __init__(self, bakers: Set[str], test_home: str, conf: sigve_conf) -> None:
@@ -177,23 +197,117 @@ class sigve_daemon(daemon):
 		cmd = "{}/bin/sigve {}".format(self.conf.home, self.conf.args())
 		super(sigve_daemon, self).__init__(bakers, test_home, "sigve", cmd)
 
-	def write_conf(self) -> None:
-		print("running sigve_daemon.write_conf")
-		super(sigve_daemon, self).write_conf()
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			self.conf.write_conf(conf_f)
+	def describe(self) -> Dict[str, Any]:
+		fields = super(sigve_daemon, self).describe()
+		fields["runtime"] = self.conf.describe()
+		return fields
 
-	def clean(self):
+	def clean(self, b: batch = None) -> None:
 		print("running sigve_daemon.clean")
-		ssh_bakers(self.bakers, "rm -r /tmp/sigve", quiet=True)
+		with batched(b, "sigve_daemon.clean") as b:
+			b.add(self.bakers, "rm -r /tmp/sigve", quiet=True)
 
 class obs_daemon(daemon):
 	def __init__(self, bakers: Set[str], test_home) -> None:
-		observer_cmd: str = "source /homes/adrian/cluster-misc/thermostat-scripts/env/bin/activate; "
+		observer_cmd: str = ". {}; ".format(tools["obs_env"])
 		observer_cmd += "export PYTHONUNBUFFERED=1; "
-		observer_cmd += "/homes/adrian/cluster-misc/krgc-scripts/obs.py"
+		observer_cmd += tools["obs"]
 		super(obs_daemon, self).__init__(bakers, test_home, "observer_wards", observer_cmd)
 
+# memsampler.py on every baker, reading the cgroup every interval seconds, its frames stream back
+# over the ssh job's stdout into mem_sampler/<baker>.bin. the script is run from this checkout,
+# which the bakers see on the shared home.
+class mem_sampler(daemon):
+	def __init__(self, bakers: Set[str], test_home: str, group: str = "thermostat", interval: float = 0.02,
+			script: str = None) -> None:
+		self.group: str = group
+		self.interval: float = interval
+		self.script: str = script if script else os.path.dirname(os.path.abspath(__file__)) + "/memsampler.py"
+		cmd = "exec python3 {} --root {} --cgroup {} --interval {} --test {}".format(self.script, tools["cgroup_root"],
+			group, interval, test_home)
+		super(mem_sampler, self).__init__(bakers, test_home, "mem_sampler", cmd)
+
+	def describe(self) -> Dict[str, Any]:
+		fields = super(mem_sampler, self).describe()
+		fields.update({ "group": self.group, "interval": self.interval })
+		return fields
+
+	def setup(self, b: batch = None) -> None:
+		pass
+
+	def prologue(self) -> None:
+		print("running mem_sampler.prologue")
+		os.mkdir(self.test_log_dir)
+		for baker in self.bakers:
+			log = self.test_log_dir + '/' + baker
+			self.jobs.append(executor().submit(pool().cmd(baker, self.cmd), baker, log + ".bin", log + ".log",
+				timeout=None, bounded=False))
+
+	def epilogue(self) -> None:
+		print("running mem_sampler.epilogue")
+		# a TERM on the baker makes the sampler flush what it still holds before it exits.
+		# the [m] keeps the pattern from matching the shell that runs pkill.
+		ssh_bakers(self.bakers, "pkill -TERM -f '[m]emsampler.py .*--test {}$'".format(self.test_home), quiet=True, timeout=30)
+		for j in self.jobs:
+			try:
+				j.wait(10)
+			except concurrent.futures.TimeoutError:
+				j.terminate()
+				j.wait()
+
+	def clean(self, b: batch = None) -> None:
+		with batched(b, "mem_sampler.clean") as b:
+			b.add(self.bakers, "pkill -9 -f '[m]emsampler.py'", quiet=True)
+
+# pulls spark_home/work from every baker while the test runs, so the epilogue only has to fetch
+# the last few seconds of executor output. executor logs only ever grow, so --append resumes
+# each file from the size we already have and ships just the new bytes, compressed.
+class spark_log_collector(daemon):
+	def __init__(self, bakers: Set[str], test_home: str, spark_home: str, interval: float = 30) -> None:
+		super(spark_log_collector, self).__init__(bakers, test_home, "spark_log_collector", "")
+		self.spark_home: str = spark_home
+		self.spark_log_dir: str = test_home + "/spark"
+		self.interval: float = interval
+		self.stop: threading.Event = threading.Event()
+		self.lock: threading.Lock = threading.Lock()
+		self.thread: threading.Thread = None
+		self.done: bool = False
+
+	def describe(self) -> Dict[str, Any]:
+		fields = super(spark_log_collector, self).describe()
+		fields.update({ "spark_log_dir": self.spark_log_dir, "interval": self.interval })
+		return fields
+
+	def setup(self, b: batch = None) -> None:
+		pass
+
+	def sync(self) -> None:
+		src_fn: Callable[[str], str] = lambda baker: baker + ':' + self.spark_home + "/work"
+		dst_fn: Callable[[str], str] = lambda baker: self.spark_log_dir + '/' + baker
+		with self.lock:
+			rsync_bakers(self.bakers, src_fn, dst_fn, "*.jar", extra=[ "-z", "--append" ])
+
+	def loop(self) -> None:
+		with owning(self.test_log_dir):
+			while not self.stop.wait(self.interval):
+				self.sync()
+
+	def prologue(self) -> None:
+		print("running spark_log_collector.prologue")
+		os.makedirs(self.spark_log_dir, exist_ok=True)
+		self.thread = threading.Thread(target=self.loop, daemon=True)
+		self.thread.start()
+
+	def epilogue(self) -> None:
+		print("running spark_log_collector.epilogue")
+		if self.done:
+			return
+		self.stop.set()
+		if self.thread:
+			self.thread.join()
+		self.sync()
+		self.done = True
+
 class jvm_conf:
 	def __init__(self, home: str, args: List[str] = []) -> None:
 		self.home = home
@@ -216,11 +330,9 @@ class jvm_conf:
 	def __str__(self) -> str:
 		return "-Xmx" + self.max + ' ' + ' '.join(self.args)
 
-	def write_conf(self, conf_f: TextIO) -> None:
-		conf_f.write("xmx {}\n".format(self.max))
-		conf_f.write("use_sigve {}\n".format(self.use_sigve))
-		conf_f.write("sigve_percent {}\n".format(self.sigve_percent))
-		conf_f.write("args {}\n".format(self))
+	def describe(self) -> Dict[str, Any]:
+		return { "type": type(self).__name__, "xmx": self.max, "use_sigve": self.use_sigve,
+			"sigve_percent": self.sigve_percent, "args": [ "-Xmx" + self.max ] + self.args }
 
 class go_conf:
 	def __init__(self, args: Dict[str, str] = None) -> None:
@@ -231,9 +343,66 @@ class go_conf:
 		self.args["GO_SIGVE_PERCENT"] = str(threshold)
 		return self
 
-	def write_conf(self, conf_f: TextIO) -> None:
-		for k, v in self.args.items():
-			conf_f.write("{} {}\n".format(k, v))
+	def describe(self) -> Dict[str, Any]:
+		fields: Dict[str, Any] = { "type": type(self).__name__ }
+		fields.update(self.args)
+		return fields
+
+class not_ready(Exception):
+	pass
+
+# one check of one host, application.wait_ready polls them until they all pass
+class probe:
+	def ready(self, host: str) -> bool:
+		raise NotImplementedError
+
+	def __str__(self) -> str:
+		return type(self).__name__
+
+class tcp_probe(probe):
+	def __init__(self, port: int, connect_timeout: float = 1) -> None:
+		self.port: int = port
+		self.connect_timeout: float = connect_timeout
+
+	def connect(self, host: str) -> socket.socket:
+		return socket.create_connection((pool().addr(host), self.port), self.connect_timeout)
+
+	def ready(self, host: str) -> bool:
+		try:
+			self.connect(host).close()
+			return True
+		except OSError:
+			return False
+
+	def __str__(self) -> str:
+		return "{} :{}".format(type(self).__name__, self.port)
+
+# memcached accepts connections before it serves, wait for it to answer "version"
+class memcached_probe(tcp_probe):
+	def ready(self, host: str) -> bool:
+		try:
+			with self.connect(host) as s:
+				s.settimeout(self.connect_timeout)
+				s.sendall(b"version\r\n")
+				return s.recv(64).startswith(b"VERSION")
+		except OSError:
+			return False
+
+# a line in a log the harness collects locally, e.g. the service's stdout
+class log_probe(probe):
+	def __init__(self, path_fn: Callable[[str], str], pattern: str) -> None:
+		self.path_fn: Callable[[str], str] = path_fn
+		self.pattern: "re.Pattern[str]" = re.compile(pattern, re.M)
+
+	def ready(self, host: str) -> bool:
+		path = self.path_fn(host)
+		if not os.path.exists(path):
+			return False
+		with open(path, errors="replace") as f:
+			return self.pattern.search(f.read()) is not None
+
+	def __str__(self) -> str:
+		return "{} /{}/".format(type(self).__name__, self.pattern.pattern)
 
 class application:
 	def __init__(self, bakers: Set[str], cg: cgroup) -> None:
@@ -246,6 +415,8 @@ class application:
 		self.init_done: bool = False
 		self.epilogue_done: bool = False
 		self.clean_done: bool = False
+		self.probes: List[probe] = []
+		self.startup: Dict[str, float] = {}
 
 	def prepare(self, test_home: str, order: int) -> None:
 		self.test_home = test_home
@@ -254,21 +425,98 @@ class application:
 		if self.cg:
 			self.cg.test_home = test_home
 
-	def write_conf(self) -> None:
+	# its entry in the test's manifest
+	def describe(self) -> Dict[str, Any]:
 		raise NotImplementedError
+
+	def describe_startup(self) -> Dict[str, Any]:
+		if not self.startup:
+			return {}
+		return { "startup_secs": { h: round(s, 3) for h, s in sorted(self.startup.items()) },
+			"startup_max_secs": round(max(self.startup.values()), 3) }
+
+	# polls every baker's probes side by side until they all pass, recording how long each took.
+	# a baker whose job exits or that is still not ready after timeout raises not_ready.
+	def wait_ready(self, jobs: Dict[str, job] = None, timeout: float = 60, interval: float = 0.05) -> None:
+		start = clock_gettime(CLOCK_MONOTONIC)
+		failed: Dict[str, str] = {}
+
+		def poll(host: str) -> None:
+			todo = list(self.probes)
+			while True:
+				todo = [ p for p in todo if not p.ready(host) ]
+				elapsed = clock_gettime(CLOCK_MONOTONIC) - start
+				if not todo:
+					self.startup[host] = elapsed
+					return
+				if jobs and host in jobs and jobs[host].done():
+					failed[host] = "exited with {} before {}".format(jobs[host].wait().returncode, todo[0])
+					return
+				if elapsed > timeout:
+					failed[host] = "{} not ready after {}s".format(todo[0], timeout)
+					return
+				sleep(interval)
+
+		threads = [ threading.Thread(target=poll, args=(host,)) for host in self.bakers ]
+		with span(self.name + ".wait_ready", "ready"):
+			for t in threads:
+				t.start()
+			for t in threads:
+				t.join()
+		if failed:
+			raise not_ready("{}: {}".format(self.name, ", ".join([ "{} {}".format(h, why)
+				for h, why in sorted(failed.items()) ])))
+		print("{} ready in {:.3f}s".format(self.name, max(self.startup.values(), default=0)))
+
+	# remote setup that can share a round trip with the rest of the test's setup
+	def setup(self, b: batch = None) -> None:
+		pass
 	def prologue(self) -> None:
 		raise NotImplementedError
 	def epilogue(self) -> None:
 		raise NotImplementedError
-	def clean(self) -> None:
+	def clean(self, b: batch = None) -> None:
 		raise NotImplementedError
 
+# a standalone spark master on the first of bakers with a worker on each of them, so the executors
+# of a partition's tests stay on the partition's bakers, under their cgroups. the shared cluster's
+# master and workers keep running next to it. ident keeps the daemons' pid files apart.
+class spark_standalone:
+	def __init__(self, bakers: List[str], spark_home: str, ident: str, port: int) -> None:
+		self.bakers: List[str] = bakers
+		self.spark_home: str = spark_home
+		self.ident: str = ident
+		self.port: int = port
+
+	def url(self) -> str:
+		return "spark://{}:{}".format(pool().addr(self.bakers[0]), self.port)
+
+	def env(self) -> str:
+		return "SPARK_IDENT_STRING={} SPARK_MASTER_HOST={} SPARK_MASTER_PORT={} SPARK_MASTER_WEBUI_PORT={} " \
+			"SPARK_WORKER_PORT={} SPARK_WORKER_WEBUI_PORT={}".format(self.ident, pool().addr(self.bakers[0]),
+			self.port, self.port + 1, self.port + 2, self.port + 3)
+
+	def start(self) -> None:
+		print("running spark_standalone.start")
+		sbin = self.spark_home + "/sbin"
+		with batched(None, "spark_standalone.start") as b:
+			# workers retry until the master is up
+			b.add(self.bakers[:1], "{} {}/start-master.sh".format(self.env(), sbin))
+			b.add(self.bakers, "{} {}/start-slave.sh {}".format(self.env(), sbin, self.url()))
+
+	def stop(self) -> None:
+		print("running spark_standalone.stop")
+		sbin = self.spark_home + "/sbin"
+		with batched(None, "spark_standalone.stop") as b:
+			b.add(self.bakers, "{} {}/stop-slave.sh".format(self.env(), sbin), quiet=True)
+			b.add(self.bakers[:1], "{} {}/stop-master.sh".format(self.env(), sbin), quiet=True)
+
 class hibench_spark(application):
 	def __init__(self, bakers: Set[str], hibench_home: str, spark_home: str,
 			jvm: jvm_conf, scale: str = "bigdata0", workload: str = "ml/kmeans",
 			cores: int = -1, max_cores: int = -1, mem_frac: float = -1,
 			mem_storage_frac: float = -1, sigve: bool = False, sigve_n: int = -1,
-			sigve_f: float = -1, cg: cgroup = None) -> None:
+			sigve_f: float = -1, cg: cgroup = None, master: str = None) -> None:
 		super(hibench_spark, self).__init__(bakers, cg)
 		self.hibench_home: str = hibench_home
 		self.spark_home: str = spark_home
@@ -282,42 +530,50 @@ class hibench_spark(application):
 		self.sigve: bool = sigve
 		self.sigve_n: int = sigve_n
 		self.sigve_f: float = sigve_f
-
-	def write_conf(self) -> None:
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
-			conf_f.write("test_home {}\n".format(self.test_home))
-			conf_f.write("name {}\n".format(self.name))
-			conf_f.write("hibench_home {}\n".format(self.hibench_home))
-			conf_f.write("spark_home {}\n".format(self.spark_home))
-			conf_f.write("scale {}\n".format(self.scale))
-			conf_f.write("workload {}\n".format(self.workload))
-			conf_f.write("cores {}\n".format(self.cores))
-			conf_f.write("max_cores {}\n".format(self.max_cores))
-			conf_f.write("mem_fraction {}\n".format(self.mem_frac))
-			conf_f.write("mem_storage_fraction {}\n".format(self.mem_storage_frac))
-			conf_f.write("test_log_dir {}\n".format(self.test_log_dir))
-			conf_f.write("conf_dir {}\n".format(self.conf_dir))
-			conf_f.write("report_dir {}\n".format(self.report_dir))
-			conf_f.write("spark_log_dir {}\n".format(self.spark_log_dir))
-			conf_f.write("sigve {}\n".format(self.sigve))
-			conf_f.write("sigve_n {}\n".format(self.sigve_n))
-			conf_f.write("sigve_f {}\n".format(self.sigve_f))
-			conf_f.write("cgroup {}\n".format("None" if self.cg is None else self.cg.name))
-			self.jvm.write_conf(conf_f)
-
-	def setup_cgroup(self) -> None:
+		self.master: str = master
+		self.collector: spark_log_collector = None
+
+	def describe(self) -> Dict[str, Any]:
+		return {
+			"type": type(self).__name__,
+			"bakers": sorted(self.bakers),
+			"test_home": self.test_home,
+			"name": self.name,
+			"hibench_home": self.hibench_home,
+			"spark_home": self.spark_home,
+			"scale": self.scale,
+			"workload": self.workload,
+			"cores": self.cores,
+			"max_cores": self.max_cores,
+			"mem_fraction": self.mem_frac,
+			"mem_storage_fraction": self.mem_storage_frac,
+			"test_log_dir": self.test_log_dir,
+			"conf_dir": self.conf_dir,
+			"report_dir": self.report_dir,
+			"spark_log_dir": self.spark_log_dir,
+			"sigve": self.sigve,
+			"sigve_n": self.sigve_n,
+			"sigve_f": self.sigve_f,
+			"cgroup": None if self.cg is None else self.cg.name,
+			"master": self.master,
+			"runtime": self.jvm.describe(),
+		}
+
+	def setup(self, b: batch = None) -> None:
+		self.setup_cgroup(b)
+
+	def setup_cgroup(self, b: batch = None) -> None:
 		java_bin = self.jvm.home + "/bin"
-		ssh_bakers(self.bakers, "rm " + java_bin + "/java")
-		if self.cg:
-			ssh_bakers(self.bakers, "cp {} {}".format(java_bin + "/java_cgroup", java_bin + "/java"))
-			sed_java = "sed -i "
-			sed_java += "s/CHANGE_ME/{}/ ".format(self.cg.group)
-			sed_java += java_bin + "/java"
-			ssh_bakers(self.bakers, sed_java)
-		else:
-			ssh_bakers(self.bakers, "cp {} {}".format(java_bin + "/java_real", java_bin + "/java"))
+		with batched(b, "hibench_spark.setup_cgroup") as b:
+			b.add(self.bakers, "rm " + java_bin + "/java")
+			if self.cg:
+				b.add(self.bakers, "cp {} {}".format(java_bin + "/java_cgroup", java_bin + "/java"))
+				sed_java = "sed -i "
+				sed_java += "s/CHANGE_ME/{}/ ".format(self.cg.group)
+				sed_java += java_bin + "/java"
+				b.add(self.bakers, sed_java)
+			else:
+				b.add(self.bakers, "cp {} {}".format(java_bin + "/java_real", java_bin + "/java"))
 
 	def prologue(self) -> None:
 		print("running hibench_spark.prologue")
@@ -330,65 +586,63 @@ class hibench_spark(application):
 
 		os.mkdir(self.test_log_dir)
 		os.mkdir(self.conf_dir)
-		self.setup_cgroup()
 		if not os.path.exists(self.spark_log_dir):
 			os.mkdir(self.spark_log_dir)
-		shutil.copy(self.hibench_home + "/conf/hibench.conf", self.conf_dir)
-		shutil.copy(self.hibench_home + "/conf/hadoop.conf", self.conf_dir)
-		shutil.copy(self.hibench_home + "/conf/spark.conf", self.conf_dir)
 		os.makedirs(self.report_dir)
 
-		hibench_conf = self.conf_dir + "/hibench.conf"
-		spark_conf = self.conf_dir + "/spark.conf"
-
 		# setup hibench.conf
-		sed_report = "s|\${{hibench\.home}}/report|{}/report|".format(self.test_log_dir)
-		subprocess.run(["sed", "-i", sed_report, hibench_conf])
-		sed_scale = "s/\(hibench\.scale\.profile\).*/\\1 {}/".format(self.scale)
-		subprocess.run(["sed", "-i", sed_scale, hibench_conf])
+		hibench_conf = conf_file(self.hibench_home + "/conf/hibench.conf")
+		hibench_conf.sub("report", r"\$\{hibench\.home\}/report", escape(self.test_log_dir) + "/report")
+		hibench_conf.sub("hibench.scale.profile", r"(hibench\.scale\.profile).*", r"\g<1> " + escape(self.scale))
 
 		# setup spark.conf
-		sed_heap_size ="s/\(spark\.executor\.memory\).*/\\1 {}/".format(self.jvm.max)
-		subprocess.run(["sed", "-i", sed_heap_size, spark_conf])
+		spark_conf = conf_file(self.hibench_home + "/conf/spark.conf")
+		spark_conf.sub("spark.executor.memory", r"(spark\.executor\.memory).*", r"\g<1> " + escape(self.jvm.max))
+		if self.master:
+			spark_conf.sub("hibench.spark.master", r"(hibench\.spark\.master).*", r"\g<1> " + escape(self.master))
 		if self.cores != -1:
-			sed_cores = "s/^#\(spark\.executor\.cores\).*/\\1 {}/".format(self.cores)
-			subprocess.run(["sed", "-i", sed_cores, spark_conf])
+			spark_conf.sub("spark.executor.cores", r"^#(spark\.executor\.cores).*", r"\g<1> " + escape(self.cores))
 		if self.max_cores != -1:
-			sed_max_cores = "s/^#\(spark\.cores\.max\).*/\\1 {}/".format(self.max_cores)
-			subprocess.run(["sed", "-i", sed_max_cores, spark_conf])
+			spark_conf.sub("spark.cores.max", r"^#(spark\.cores\.max).*", r"\g<1> " + escape(self.max_cores))
 		if self.mem_frac != -1:
-			sed_mem_frac = "s/^#\(spark\.memory\.fraction\).*/\\1 {}/".format(self.mem_frac)
-			subprocess.run(["sed", "-i", sed_mem_frac, spark_conf])
+			spark_conf.sub("spark.memory.fraction", r"^#(spark\.memory\.fraction).*", r"\g<1> " + escape(self.mem_frac))
 		if self.mem_storage_frac != -1:
-			sed_mem_storage_frac = "s/^#\(spark\.memory\.storageFraction\).*/\\1 {}/".format(self.mem_storage_frac)
-			subprocess.run(["sed", "-i", sed_mem_storage_frac, spark_conf])
+			spark_conf.sub("spark.memory.storageFraction", r"^#(spark\.memory\.storageFraction).*",
+				r"\g<1> " + escape(self.mem_storage_frac))
 
 		if self.sigve:
-			sed_sigve = "s/^#\(spark\.sigve\) .*/\\1 true/"
-			subprocess.run(["sed", "-i", sed_sigve, spark_conf])
+			spark_conf.sub("spark.sigve", r"^#(spark\.sigve) .*", r"\g<1> true")
 		if self.sigve_n != -1:
-			sed_sigve_n = "s/^#\(spark\.sigve_n\) .*/\\1 {}/".format(self.sigve_n)
-			subprocess.run(["sed", "-i", sed_sigve_n, spark_conf])
+			spark_conf.sub("spark.sigve_n", r"^#(spark\.sigve_n) .*", r"\g<1> " + escape(self.sigve_n))
 		if self.sigve_f != -1:
-			sed_sigve_f = "s/^#\(spark\.sigve_f\) .*/\\1 {}/".format(self.sigve_f)
-			subprocess.run(["sed", "-i", sed_sigve_f, spark_conf])
+			spark_conf.sub("spark.sigve_f", r"^#(spark\.sigve_f) .*", r"\g<1> " + escape(self.sigve_f))
 
-		sed_jvm = "/^#.*PrintGCTimeStamps$/s/^#\(.*\)/\\1 {}/".format(' '.join(self.jvm.args))
-		subprocess.run(["sed", "-i", sed_jvm, spark_conf])
+		spark_conf.sub("PrintGCTimeStamps", r"^#(.*)", r"\g<1> " + escape(' '.join(self.jvm.args)),
+			address=r"^#.*PrintGCTimeStamps$")
+
+		hibench_conf.write(self.conf_dir + "/hibench.conf")
+		conf_file(self.hibench_home + "/conf/hadoop.conf").write(self.conf_dir + "/hadoop.conf")
+		spark_conf.write(self.conf_dir + "/spark.conf")
 
 	def epilogue(self) -> None:
-		src_fn: Callable[[str], str] = lambda baker: baker + ':' + self.spark_home + "/work"
-		dst_fn: Callable[[str], str] = lambda baker: self.spark_log_dir + '/' + baker
-		rsync_bakers(self.bakers, src_fn, dst_fn, "*.jar")
+		# with a collector the logs are already here, it does the final sync after the executors die
+		if self.collector is None:
+			src_fn: Callable[[str], str] = lambda baker: baker + ':' + self.spark_home + "/work"
+			dst_fn: Callable[[str], str] = lambda baker: self.spark_log_dir + '/' + baker
+			rsync_bakers(self.bakers, src_fn, dst_fn, "*.jar")
 		java_bin = self.jvm.home + "/bin"
-		ssh_bakers(self.bakers, "cp {} {}".format(java_bin + "/java_real", java_bin + "/java"))
-
-		subprocess.run(["pkill", "-9", "-f", "SparkSubmit"])
-		ssh_bakers(self.bakers, r'pkill -9 -f "java_real .*CoarseGrainedExecutorBackend"', quiet = True)
-
-	def clean(self) -> None:
+		# spark-submit reads its properties from under our report dir, which tells it apart from
+		# the submits of tests running next to this one
+		submit = "SparkSubmit.*" + self.test_log_dir if shared_harness else "SparkSubmit"
+		do_cmds([ [ "pkill", "-9", "-f", submit ] ], quiet=True)
+		with batched(None, "hibench_spark.epilogue") as b:
+			b.add(self.bakers, "cp {} {}".format(java_bin + "/java_real", java_bin + "/java"))
+			b.add(self.bakers, r'pkill -9 -f "[j]ava_real .*[C]oarseGrainedExecutorBackend"', quiet = True)
+
+	def clean(self, b: batch = None) -> None:
 		print("running hibench_spark.clean")
-		ssh_bakers(self.bakers, "rm -rf " + self.spark_home + "/work/*", quiet=True)
+		with batched(b, "hibench_spark.clean") as b:
+			b.add(self.bakers, "rm -rf " + self.spark_home + "/work/*", quiet=True)
 
 class detc(application):
 	def __init__(self, bakers: Set[str], detc_home: str, go: go_conf,
@@ -403,28 +657,29 @@ class detc(application):
 		self.low_shrink: int = low_shrink
 		self.high_shrink: int = high_shrink
 
-		self.procs: List[subprocess.Popen]
-		self.logs: List[TextIO]
-
-	def write_conf(self) -> None:
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
-			conf_f.write("test_home {}\n".format(self.test_home))
-			conf_f.write("name {}\n".format(self.name))
-			conf_f.write("detc_home {}\n".format(self.detc_home))
-			conf_f.write("size_gb {}\n".format(self.size_gb))
-			conf_f.write("wounds {}\n".format(self.wounds))
-			conf_f.write("port {}\n".format(self.port))
-			conf_f.write("test_log_dir {}\n".format(self.test_log_dir))
-			conf_f.write("cgroup {}\n".format("None" if self.cg is None else self.cg.name))
-			conf_f.write("low_shrink {}\n".format(self.low_shrink))
-			conf_f.write("high_shrink {}\n".format(self.high_shrink))
-			self.go.write_conf(conf_f)
+		self.jobs: List[job]
+
+	def describe(self) -> Dict[str, Any]:
+		return {
+			"type": type(self).__name__,
+			"bakers": sorted(self.bakers),
+			"test_home": self.test_home,
+			"name": self.name,
+			"detc_home": self.detc_home,
+			"size_gb": self.size_gb,
+			"wounds": self.wounds,
+			"port": self.port,
+			"test_log_dir": self.test_log_dir,
+			"cgroup": None if self.cg is None else self.cg.name,
+			"low_shrink": self.low_shrink,
+			"high_shrink": self.high_shrink,
+			"runtime": self.go.describe(),
+		}
 
 	def prologue(self) -> None:
 		print("running detc.prologue")
 		os.mkdir(self.test_log_dir)
+		# markbench (detc_stress) holds the cache in its own process, there is no server to probe
 		"""
 		base_cmd = []
 		for k, v in self.go.args.items():
@@ -451,9 +706,9 @@ class detc(application):
 
 	def epilogue(self) -> None:
 		print("running detc.epilogue")
-		ssh_bakers(self.bakers, r'pkill -9 -f "detcdetc/markbench"')
+		ssh_bakers(self.bakers, r'pkill -9 -f "[d]etcdetc/markbench"')
 
-	def clean(self) -> None:
+	def clean(self, b: batch = None) -> None:
 		print("running detc.clean (noop)")
 
 class memcached(application):
@@ -464,64 +719,61 @@ class memcached(application):
 		self.size_gb: int = size_gb
 		self.port: int = port
 		self.sigve: bool = sigve
-
-		self.procs: List[subprocess.Popen]
-		self.logs: List[TextIO]
-
-	def write_conf(self) -> None:
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
-			conf_f.write("test_home {}\n".format(self.test_home))
-			conf_f.write("name {}\n".format(self.name))
-			conf_f.write("memcached_home {}\n".format(self.memcached_home))
-			conf_f.write("size_gb {}\n".format(self.size_gb))
-			conf_f.write("port {}\n".format(self.port))
-			conf_f.write("sigve {}\n".format(self.sigve))
-			conf_f.write("test_log_dir {}\n".format(self.test_log_dir))
-			conf_f.write("cgroup {}\n".format("None" if self.cg is None else self.cg.name))
+		self.probes.append(memcached_probe(self.port))
+
+		self.jobs: List[job]
+
+	def describe(self) -> Dict[str, Any]:
+		fields: Dict[str, Any] = {
+			"type": type(self).__name__,
+			"bakers": sorted(self.bakers),
+			"test_home": self.test_home,
+			"name": self.name,
+			"memcached_home": self.memcached_home,
+			"size_gb": self.size_gb,
+			"port": self.port,
+			"sigve": self.sigve,
+			"test_log_dir": self.test_log_dir,
+			"cgroup": None if self.cg is None else self.cg.name,
+		}
+		fields.update(self.describe_startup())
+		return fields
 
 	def prologue(self) -> None:
 		print("running memcached.prologue")
 		os.mkdir(self.test_log_dir)
 
 		base_cmd = [ "cgexec", "-g",  self.cg.group,
-			"export", "LD_PRELOAD=/home/eurosys21/applications/jemalloc-5.2.1/lib/libjemalloc.so;",
+			"export", "LD_PRELOAD={};".format(tools["jemalloc"]),
 			"export", "MALLOC_CONF=background_thread:true,dirty_decay_ms:0;",
-			"/home/eurosys21/applications/memcached-1.6.7/bin/memcached",
+			self.memcached_home + "/bin/memcached",
 			"-p", str(self.port),
 			"-t", "8", "-m", str(self.size_gb * 1024) ]
 
 		if self.sigve:
 			base_cmd.append("-z")
 
-		self.procs = []
-		self.logs = []
+		self.jobs = []
+		by_baker: Dict[str, job] = {}
 		for baker in self.bakers:
-			cmd = [ "ssh", baker ]
-			cmd.extend(base_cmd)
-			cmd.extend([ "-l", baker ])
-
+			cmd = pool().cmd(baker, ' '.join(base_cmd + [ "-l", pool().addr(baker) ]))
 			log_name = "{}/{}".format(self.test_log_dir, baker)
-			outlog = open(log_name + "_stdout.log", 'w')
-			errlog = open(log_name + "_stderr.log", 'w')
-			self.logs.append(outlog)
-			self.logs.append(errlog)
-
-			proc = subprocess.Popen(cmd, stdout=outlog, stderr=errlog)
-			self.procs.append(proc)
+			by_baker[baker] = executor().submit(cmd, baker, log_name + "_stdout.log", log_name + "_stderr.log",
+				timeout=None, bounded=False)
+			self.jobs.append(by_baker[baker])
 
-		sleep(8) # give memcached time to start
+		self.wait_ready(by_baker)
 
 	def epilogue(self) -> None:
 		print("running memcached.epilogue")
-		ssh_bakers(self.bakers, r'pkill -9 -f "memcached-1.6.7/bin/memcached"')
-		for proc in self.procs:
-			proc.terminate()
-		for log in self.logs:
-			log.close()
+		ssh_bakers(self.bakers, r'pkill -9 -f "[m]emcached-1.6.7/bin/memcached"')
+		for j in self.jobs:
+			j.terminate()
+		for j in self.jobs:
+			j.wait()
 
-	def clean(self) -> None:
+	def clean(self, b: batch = None) -> None:
 		print("running memcached.clean")
-		ssh_bakers(self.bakers, r'pkill -9 -f "memcached-1.6.7/bin/memcached"')
+		with batched(b, "memcached.clean") as b:
+			b.add(self.bakers, r'pkill -9 -f "[m]emcached-1.6.7/bin/memcached"')
 
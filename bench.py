@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+# times the harness itself rather than the workloads: command fan-out, conf generation, test
+# setup, test numbering and a whole workload_n against the local cluster stand-ins, so it runs
+# on any machine. every case keeps the median of its runs in a history file, and a median more
+# than --threshold (and --floor seconds) above the median of the last --window runs on this
+# machine is a regression.
+#
+#   ./bench.py                   run everything, record, exit 1 on a regression
+#   ./bench.py --only fanout     cases whose name starts with fanout
+#   ./bench.py --no-record       compare only
+
+import os
+import sys
+import json
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from time import clock_gettime, CLOCK_MONOTONIC, strftime
+from typing import List, Dict, Any, Callable, Optional
+
+import launch
+from launch import spark_params, detc_params, memcached_params, stresses_n, workload_n, use_local_cluster
+from apps import ssh_bakers, hibench_spark, jvm_conf
+from remote import use_pool, conn_pool
+from tests import test, test_runner, config
+from localcluster import local_cluster
+
+class case:
+	def __init__(self, name: str, fn: Callable[[int], None], repeat: int = 10,
+			setup: Callable[[int], None] = None) -> None:
+		self.name: str = name
+		self.fn: Callable[[int], None] = fn
+		self.repeat: int = repeat
+		# untimed, before every run
+		self.setup: Optional[Callable[[int], None]] = setup
+
+	# one untimed warmup run, then repeat timed ones. the harness prints a lot, none of it is wanted here.
+	def measure(self, repeat: int = 0) -> List[float]:
+		times: List[float] = []
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			for i in range(-1, repeat if repeat else self.repeat):
+				if self.setup:
+					self.setup(i)
+				start = clock_gettime(CLOCK_MONOTONIC)
+				self.fn(i)
+				if i >= 0:
+					times.append(clock_gettime(CLOCK_MONOTONIC) - start)
+		return times
+
+def names(n: int) -> List[str]:
+	return [ "baker{}".format(i) for i in range(10, 10 + n) ]
+
+def fanout_cases(root: str, sizes: List[int]) -> List[case]:
+	lc = local_cluster(root + "/fanout", names(max(sizes)), 0)
+	lc.install(workloads=())
+	cases: List[case] = []
+	for n in sizes:
+		hosts = names(n)
+		cases.append(case("fanout.{}".format(n), lambda i, hosts=hosts: ssh_bakers(hosts, "true", quiet=True),
+			setup=lambda i: use_pool(conn_pool(lc.transport()))))
+	return cases
+
+def prologue_case(root: str) -> case:
+	lc = local_cluster(root + "/prologue", names(8), 0)
+	lc.install(workloads=("ml/kmeans",))
+	state: Dict[str, hibench_spark] = {}
+
+	def setup(i: int) -> None:
+		test_home = "{}/prologue/test-{}".format(root, i + 1)
+		os.makedirs(test_home + "/conf")
+		app = hibench_spark(set(lc.hosts), lc.hibench_home, lc.spark_home,
+			jvm_conf(lc.java_home, [ "-XX:+UseG1GC", "-XX:+PrintGCApplicationStoppedTime" ]).heap("8g"),
+			scale="gigantic0", workload="ml/kmeans", cores=5, max_cores=40, mem_frac=0.6,
+			mem_storage_frac=0.5, master="spark://127.0.0.10:7077")
+		app.prepare(test_home, 0)
+		state["app"] = app
+
+	return case("hibench_spark.prologue", lambda i: state["app"].prologue(), 50, setup)
+
+# construction and the manifest of a three benchmark test, the daemons' included. no spark, its
+# entry needs the dirs its prologue makes, which the case above times.
+def test_conf_case(root: str) -> case:
+	lc = local_cluster(root + "/conf", names(8), 0)
+	lc.install(workloads=())
+	path = "{}/conf/bench-m3-CMC0".format(root)
+	os.makedirs(path)
+
+	def run(i: int) -> None:
+		launch.detc_home = lc.detc_home
+		launch.memcached_home = lc.memcached_home
+		launch.java_home = lc.java_home
+		hosts = set(lc.hosts)
+		stresses, sc = stresses_n(config.sigve, [ detc_params(4), memcached_params(4), detc_params(4) ],
+			0, path, "8g", hosts)
+		t = test("{}/test-{}".format(path, i + 1), config.sigve, stresses)
+		t.add_obs_daemon()
+		t.add_mem_sampler()
+		t.add_sigve_daemon(sc)
+		for d in t.daemons:
+			t.manifest.add(d.name, d.describe())
+		for bm in t.benchmarks:
+			for app in bm.apps:
+				if app.cg and not app.cg.init_done:
+					t.manifest.add("cgroup_" + app.cg.name, app.cg.describe())
+					app.cg.init_done = True
+				t.manifest.add(app.name, app.describe())
+			t.manifest.add(bm.name, bm.describe())
+		t.manifest.add("test", t.describe())
+		t.manifest.write()
+
+	return case("test.manifest", run, 50, lambda i: use_pool(conn_pool(lc.transport())))
+
+def next_test_num_case(root: str, tests: int = 10000) -> case:
+	path = root + "/numbered"
+	os.makedirs(path)
+	for i in range(tests):
+		os.mkdir("{}/test-{}".format(path, i))
+	return case("next_test_num.{}".format(tests), lambda i: test_runner.next_test_num(path), 20)
+
+# a whole MCM0 test with workloads that exit right away: clean, prologue, readiness, the
+# phases, epilogue, log collection and conf writing on two bakers
+def cycle_case(root: str) -> case:
+	def setup(i: int) -> None:
+		launch.bakers = set(names(2))
+		use_local_cluster(root + "/cycle", 0)
+
+	def run(i: int) -> None:
+		workload_n(config.sigve, [ spark_params(8, "ml/kmeans"), detc_params(4), memcached_params(4) ],
+			0, root + "/cycle/bench-m3-MCM0", "8g")
+
+	return case("workload_n.MCM0", run, 3, setup)
+
+def revision() -> str:
+	try:
+		return subprocess.run([ "git", "rev-parse", "--short", "HEAD" ], capture_output=True, text=True,
+			cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+	except OSError:
+		return ""
+
+# case -> runs, oldest first. only runs from this machine count as its baseline.
+def read_history(path: str) -> Dict[str, List[Dict[str, Any]]]:
+	if not os.path.exists(path):
+		return {}
+	with open(path) as f:
+		return json.load(f)
+
+def write_history(path: str, history: Dict[str, List[Dict[str, Any]]]) -> None:
+	tmp = path + ".tmp"
+	with open(tmp, 'w') as f:
+		json.dump(history, f, indent=1)
+	os.replace(tmp, path)
+
+def baseline(runs: List[Dict[str, Any]], host: str, window: int) -> Optional[float]:
+	mine = [ r["median"] for r in runs if r.get("host") == host ][-window:]
+	return statistics.median(mine) if mine else None
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--only", action="append", default=[], help="run the cases starting with this")
+	parser.add_argument("--repeat", type=int, default=0, help="timed runs per case, instead of its own")
+	parser.add_argument("--history", default="bench_history.json")
+	parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown over the baseline")
+	parser.add_argument("--window", type=int, default=5, help="runs the baseline is the median of")
+	parser.add_argument("--floor", type=float, default=0.0005, help="slowdowns under this many seconds are noise")
+	parser.add_argument("--no-record", action="store_true")
+	parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+	args = parser.parse_args()
+
+	wanted = lambda name: not args.only or any(name.startswith(o) for o in args.only)
+	root = tempfile.mkdtemp(prefix="m3-bench-")
+	host = socket.gethostname()
+	history = read_history(args.history)
+	rev = revision()
+	regressions: List[str] = []
+	try:
+		cases: List[case] = []
+		if any(wanted("fanout.{}".format(n)) for n in (8, 32, 128)):
+			cases.extend(fanout_cases(root, [ 8, 32, 128 ]))
+		if wanted("hibench_spark.prologue"):
+			cases.append(prologue_case(root))
+		if wanted("test.manifest"):
+			cases.append(test_conf_case(root))
+		if wanted("next_test_num"):
+			cases.append(next_test_num_case(root))
+		if wanted("workload_n"):
+			cases.append(cycle_case(root))
+
+		print("{:<24} {:>5} {:>10} {:>10} {:>10} {:>8}".format("case", "runs", "min", "median", "baseline", "change"))
+		for c in cases:
+			if not wanted(c.name):
+				continue
+			times = c.measure(args.repeat)
+			median = statistics.median(times)
+			base = baseline(history.get(c.name, []), host, args.window)
+			change = median / base - 1 if base else None
+			flag = ""
+			if change is not None and change > args.threshold and median - base > args.floor:
+				flag = "  REGRESSION"
+				regressions.append(c.name)
+			print("{:<24} {:>5} {:>9.2f}ms {:>9.2f}ms {:>10} {:>8}{}".format(c.name, len(times), min(times) * 1e3,
+				median * 1e3, "{:.2f}ms".format(base * 1e3) if base else "-",
+				"{:+.0%}".format(change) if change is not None else "-", flag), flush=True)
+			history.setdefault(c.name, []).append({ "when": strftime("%Y-%m-%dT%H:%M:%S"), "rev": rev,
+				"host": host, "runs": len(times), "min": min(times), "median": median })
+	finally:
+		if not args.keep:
+			shutil.rmtree(root, ignore_errors=True)
+		else:
+			print("scratch in " + root)
+
+	if not args.no_record:
+		write_history(args.history, history)
+	if regressions:
+		print("[warn] regressions: " + ' '.join(regressions))
+		sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,101 @@
+import multiprocessing
+import multiprocessing.connection
+from typing import List, Dict, Set, Callable, Collection, Tuple
+import apps
+from apps import memify
+
+# one queued test: fn(hosts, partition) runs it on the hosts it was given
+class test_spec:
+	def __init__(self, name: str, fn: Callable[[Set[str], "partition"], None], expected: float,
+			hosts: int = 1, mem: str = "64g", ports: int = 1) -> None:
+		self.name: str = name
+		self.fn: Callable[[Set[str], partition], None] = fn
+		self.expected: float = expected
+		self.hosts: int = hosts
+		self.mem: int = memify(mem)
+		self.ports: int = ports
+
+class partition:
+	def __init__(self, index: int, hosts: List[str], port_base: int, port_span: int) -> None:
+		self.index: int = index
+		self.hosts: List[str] = hosts
+		self.port_base: int = port_base
+		self.port_span: int = port_span
+
+	def __str__(self) -> str:
+		return "{}:{}".format(self.index, ','.join(self.hosts))
+
+	# the partition's own spark master and workers listen from here on, clear of the shared
+	# cluster's 7077 and of the apps' ports
+	def spark_port(self) -> int:
+		return 17077 + self.port_base
+
+# splits the bakers into disjoint partitions and keeps every partition busy, longest test first.
+# each test runs in its own forked process so its signal handlers and alarm stay its own.
+class scheduler:
+	def __init__(self, hosts: Collection[str], parts: int = 1, host_mem: str = "64g",
+			port_span: int = 100) -> None:
+		ordered = sorted(hosts)
+		parts = max(1, min(parts, len(ordered)))
+		self.hosts: List[str] = ordered
+		self.host_mem: int = memify(host_mem)
+		self.port_span: int = port_span
+		n = len(ordered)
+		self.parts: List[partition] = [ partition(i, ordered[i * n // parts:(i + 1) * n // parts],
+			i * port_span, port_span) for i in range(parts) ]
+		self.queue: List[test_spec] = []
+
+	def add(self, spec: test_spec) -> None:
+		self.queue.append(spec)
+
+	def fits(self, spec: test_spec, part: partition) -> bool:
+		return len(part.hosts) >= spec.hosts and spec.mem <= self.host_mem and spec.ports <= part.port_span
+
+	def start(self, spec: test_spec, part: partition) -> multiprocessing.Process:
+		print("== scheduling {} on partition {}".format(spec.name, part))
+		proc = multiprocessing.get_context("fork").Process(target=spec.fn,
+			args=(set(part.hosts), part), name=spec.name)
+		proc.start()
+		return proc
+
+	def run(self) -> None:
+		queue = sorted(self.queue, key=lambda spec: -spec.expected)
+		self.queue = []
+		apps.shared_harness = len(self.parts) > 1
+		# a test too big for any partition waits for the cluster to drain and gets all of it
+		whole = partition(0, self.hosts, 0, self.port_span)
+		big = [ spec for spec in queue if not any(self.fits(spec, part) for part in self.parts) ]
+		queue = [ spec for spec in queue if spec not in big ]
+
+		free: List[partition] = list(self.parts)
+		running: Dict[int, Tuple[multiprocessing.Process, partition]] = {}
+		while queue or running:
+			started = True
+			while started:
+				started = False
+				for spec in queue:
+					part = next((p for p in free if self.fits(spec, p)), None)
+					if part is None:
+						continue
+					proc = self.start(spec, part)
+					running[proc.sentinel] = (proc, part)
+					free.remove(part)
+					queue.remove(spec)
+					started = True
+					break
+			if not running:
+				break
+			for sentinel in multiprocessing.connection.wait(list(running)):
+				proc, part = running.pop(sentinel)
+				proc.join()
+				if proc.exitcode != 0:
+					print("[warn] {} exited with status {}".format(proc.name, proc.exitcode))
+				free.append(part)
+			free.sort(key=lambda p: p.index)
+
+		for spec in big:
+			if not self.fits(spec, whole):
+				print("[error] {} needs more than the whole cluster, skipping".format(spec.name))
+				continue
+			proc = self.start(spec, whole)
+			proc.join()
@@ -0,0 +1,83 @@
+import os
+import re
+from typing import List, Dict, Tuple, Pattern, Optional
+
+# a template file is read and split into lines once and kept for the rest of the campaign,
+# every test then applies its overrides to the cached lines in memory
+class conf_template:
+	_cache: Dict[str, Tuple[float, "conf_template"]] = {}
+
+	def __init__(self, path: str) -> None:
+		self.path: str = path
+		with open(path) as f:
+			self.lines: List[str] = f.read().splitlines(keepends=True)
+
+	@staticmethod
+	def load(path: str) -> "conf_template":
+		mtime = os.stat(path).st_mtime
+		cached = conf_template._cache.get(path)
+		if cached is None or cached[0] != mtime:
+			cached = (mtime, conf_template(path))
+			conf_template._cache[path] = cached
+		return cached[1]
+
+# one override, the equivalent of a "[/address/]s/pattern/repl/" sed command
+class conf_edit:
+	_compiled: Dict[str, Pattern] = {}
+
+	def __init__(self, key: str, pattern: str, repl: str, address: str = None) -> None:
+		self.key: str = key
+		self.pattern: Pattern = conf_edit.compile(pattern)
+		self.repl: str = repl
+		self.address: Optional[Pattern] = conf_edit.compile(address) if address else None
+		self.matched: bool = False
+
+	@staticmethod
+	def compile(pattern: str) -> Pattern:
+		if pattern not in conf_edit._compiled:
+			conf_edit._compiled[pattern] = re.compile(pattern)
+		return conf_edit._compiled[pattern]
+
+	def apply(self, line: str) -> str:
+		body = line.rstrip("\n")
+		if self.address and not self.address.search(body):
+			return line
+		new, n = self.pattern.subn(self.repl, body, count=1)
+		if n == 0:
+			return line
+		self.matched = True
+		return new + line[len(body):]
+
+def escape(value: object) -> str:
+	return str(value).replace('\\', r'\\')
+
+class conf_file:
+	def __init__(self, template: str) -> None:
+		self.template: conf_template = conf_template.load(template)
+		self.edits: List[conf_edit] = []
+
+	def sub(self, key: str, pattern: str, repl: str, address: str = None) -> "conf_file":
+		self.edits.append(conf_edit(key, pattern, repl, address))
+		return self
+
+	def render(self) -> str:
+		lines: List[str] = []
+		for line in self.template.lines:
+			for edit in self.edits:
+				line = edit.apply(line)
+			lines.append(line)
+		return ''.join(lines)
+
+	def unmatched(self) -> List[str]:
+		return [ edit.key for edit in self.edits if not edit.matched ]
+
+	def write(self, path: str) -> List[str]:
+		data = self.render()
+		tmp = path + ".tmp"
+		with open(tmp, 'w') as f:
+			f.write(data)
+		os.replace(tmp, path)
+		missed = self.unmatched()
+		for key in missed:
+			print("[warn] {}: {} matched nothing in {}".format(path, key, self.template.path))
+		return missed
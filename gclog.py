@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import mmap
+import json
+import numpy as np
+from typing import List, Dict, Tuple, Any, Iterator, Optional
+
+# every pattern starts with a literal so the regex engine can skip ahead instead of trying
+# each byte, that is most of the speed on multi-GB logs
+# -XX:+PrintGCApplicationStoppedTime
+stopped_re = re.compile(rb"Total time for which application threads were stopped: (\d+\.\d+) seconds")
+sync_re = re.compile(rb"Stopping threads took: (\d+\.\d+) seconds")
+# g1 pauses and full gcs, the last ", x secs]" on the line is the event's own duration
+gc_re = re.compile(rb"\[(GC pause|GC remark|GC cleanup|Full GC)[^\n]*, (\d+\.\d+) secs\]")
+# -XX:+PrintGCTimeStamps uptime right before a gc event
+uptime_re = re.compile(rb"(\d+\.\d+): $")
+app_id_re = re.compile(rb"(app-\d{14}-\d{4})")
+
+gc_kinds: List[bytes] = [ b"GC pause", b"GC remark", b"GC cleanup", b"Full GC" ]
+chunk_size: int = 64 * 1024 * 1024
+
+def floats(col: List[bytes]) -> np.ndarray:
+	arr = np.array(col, dtype=np.bytes_) if col else np.zeros(0, dtype="S1")
+	return np.where(arr == b"", b"nan", arr).astype(np.float64)
+
+def chunks(mm: mmap.mmap) -> Iterator[Tuple[int, int]]:
+	start = 0
+	size = len(mm)
+	while start < size:
+		end = min(start + chunk_size, size)
+		if end < size:
+			nl = mm.rfind(b"\n", start, end)
+			end = nl + 1 if nl >= start else end
+		yield start, end
+		start = end
+
+def mapped(path: str) -> Optional[mmap.mmap]:
+	if os.path.getsize(path) == 0:
+		return None
+	with open(path, "rb") as f:
+		return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# runs a one-group pattern over the mapped file a chunk at a time, every chunk ends on a line
+# boundary, the matches come back as bytes that numpy converts in one go
+def scan(path: str, pattern: "re.Pattern[bytes]") -> List[bytes]:
+	found: List[bytes] = []
+	mm = mapped(path)
+	if mm is None:
+		return found
+	with mm:
+		for start, end in chunks(mm):
+			found.extend(pattern.findall(mm, start, end))
+	return found
+
+def scan_gc(path: str) -> Tuple[List[bytes], List[bytes], List[bytes]]:
+	ts: List[bytes] = []
+	kinds: List[bytes] = []
+	durs: List[bytes] = []
+	mm = mapped(path)
+	if mm is None:
+		return ts, kinds, durs
+	with mm:
+		for start, end in chunks(mm):
+			for m in gc_re.finditer(mm, start, end):
+				line = mm.rfind(b"\n", start, m.start()) + 1
+				up = uptime_re.search(mm[max(line, m.start() - 64):m.start()])
+				ts.append(up.group(1) if up else b"")
+				kinds.append(m.group(1))
+				durs.append(m.group(2))
+	return ts, kinds, durs
+
+class pauses:
+	def __init__(self) -> None:
+		self.stopped: np.ndarray = np.zeros(0)
+		self.safepoint_sync: np.ndarray = np.zeros(0)
+		self.gc_ts: np.ndarray = np.zeros(0)
+		self.gc: np.ndarray = np.zeros(0)
+		self.gc_kind: np.ndarray = np.zeros(0, dtype=np.int8)
+
+	def add(self, path: str) -> None:
+		self.stopped = np.concatenate([ self.stopped, floats(scan(path, stopped_re)) ])
+		self.safepoint_sync = np.concatenate([ self.safepoint_sync, floats(scan(path, sync_re)) ])
+		ts, kind, dur = scan_gc(path)
+		self.gc_ts = np.concatenate([ self.gc_ts, floats(ts) ])
+		self.gc = np.concatenate([ self.gc, floats(dur) ])
+		kinds = np.array([ gc_kinds.index(k) for k in kind ], dtype=np.int8)
+		self.gc_kind = np.concatenate([ self.gc_kind, kinds ])
+
+	def histogram(self, bins: int = 24) -> Tuple[np.ndarray, np.ndarray]:
+		# log spaced from 10us to 100s, pauses span several orders of magnitude
+		edges = np.logspace(-5, 2, bins + 1)
+		counts, _ = np.histogram(np.clip(self.stopped, edges[0], edges[-1]), edges)
+		return counts, edges
+
+	def summary(self) -> Dict[str, Any]:
+		s = self.stopped
+		counts, edges = self.histogram()
+		return {
+			"stopped_count": int(len(s)),
+			"stopped_total": float(s.sum()),
+			"stopped_p50": float(np.percentile(s, 50)) if len(s) else 0.0,
+			"stopped_p99": float(np.percentile(s, 99)) if len(s) else 0.0,
+			"stopped_max": float(s.max()) if len(s) else 0.0,
+			"safepoint_sync_total": float(np.nansum(self.safepoint_sync)),
+			"gc_count": { k.decode(): int((self.gc_kind == i).sum()) for i, k in enumerate(gc_kinds) },
+			"gc_total": { k.decode(): float(self.gc[self.gc_kind == i].sum()) for i, k in enumerate(gc_kinds) },
+			"histogram": { "edges": edges.tolist(), "counts": counts.tolist() },
+		}
+
+# hibench_spark app name -> spark app ids, from the "app-YYYYMMDDhhmmss-NNNN" ids in its driver log
+def app_ids(test_home: str) -> Dict[str, List[str]]:
+	ids: Dict[str, List[str]] = {}
+	for name in sorted(os.listdir(test_home)):
+		log = test_home + '/' + name + "/stderr.log"
+		if name.startswith("hibench_spark") and os.path.exists(log):
+			found: List[str] = []
+			for m in scan(log, app_id_re):
+				if m.decode() not in found:
+					found.append(m.decode())
+			ids[name] = found
+	return ids
+
+# executor logs are collected as spark/<baker>/<app id>/<executor id>/{stdout,stderr}
+def analyze_test(test_home: str) -> Dict[str, Dict[str, Any]]:
+	spark_log_dir = test_home + "/spark"
+	report: Dict[str, Dict[str, Any]] = {}
+	if not os.path.isdir(spark_log_dir):
+		return report
+	for name, ids in app_ids(test_home).items():
+		for app_id in ids:
+			p = pauses()
+			for baker in sorted(os.listdir(spark_log_dir)):
+				app_dir = spark_log_dir + '/' + baker + '/' + app_id
+				if not os.path.isdir(app_dir):
+					continue
+				for executor in os.listdir(app_dir):
+					for log in ("stdout", "stderr"):
+						path = app_dir + '/' + executor + '/' + log
+						if os.path.exists(path):
+							p.add(path)
+			report[name + '/' + app_id] = p.summary()
+	return report
+
+def main() -> None:
+	for test_home in sys.argv[1:]:
+		report = analyze_test(test_home)
+		with open(test_home + "/gc_pauses.json", 'w') as f:
+			json.dump(report, f, indent=1)
+		for app, s in report.items():
+			print("{} {}: {} pauses, total {:.3f}s, p50 {:.4f}s, p99 {:.4f}s, max {:.4f}s".format(test_home, app,
+				s["stopped_count"], s["stopped_total"], s["stopped_p50"], s["stopped_p99"], s["stopped_max"]))
+
+if __name__ == "__main__":
+	main()
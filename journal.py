@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+from time import clock_gettime, CLOCK_REALTIME
+from typing import Dict, Tuple, Any, Optional
+
+def stable_hash(obj: Any) -> str:
+	def plain(o: Any) -> Any:
+		if isinstance(o, (str, int, float, bool)) or o is None:
+			return o
+		if isinstance(o, (list, tuple)):
+			return [ plain(x) for x in o ]
+		if isinstance(o, dict):
+			return { str(k): plain(v) for k, v in o.items() }
+		if hasattr(o, "__dict__"):
+			return { "type": type(o).__name__, "vars": plain(vars(o)) }
+		return str(o)
+	return hashlib.sha256(json.dumps(plain(obj), sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# append-only record of every test in a campaign, one json object per line. a test is keyed by the
+# hash of its full parameters plus how many times the campaign has asked for that same test so far,
+# so "count" repetitions and repeated run_* calls each get their own entry.
+class campaign_journal:
+	def __init__(self, path: str, retries: int = 1) -> None:
+		self.path: str = path
+		self.retries: int = retries
+		self.seen: Dict[str, int] = {}
+		self.started: Dict[Tuple[str, int], str] = {}
+		self.finished: Dict[Tuple[str, int], str] = {}
+		self.timeouts: Dict[Tuple[str, int], int] = {}
+		if os.path.exists(path):
+			self.load()
+
+	def load(self) -> None:
+		with open(self.path) as f:
+			for line in f:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					# a line cut short when the harness died
+					continue
+				k = (entry["key"], entry["rep"])
+				if entry["event"] == "start":
+					self.started[k] = entry["test_home"]
+					self.finished.pop(k, None)
+				elif entry["event"] in ("timeout", "stall"):
+					self.timeouts[k] = self.timeouts.get(k, 0) + 1
+					self.finished[k] = entry["event"]
+				else:
+					self.finished[k] = entry["event"]
+
+	def append(self, entry: Dict[str, Any]) -> None:
+		entry["time"] = int(clock_gettime(CLOCK_REALTIME) * 1e9)
+		line = (json.dumps(entry, sort_keys=True) + "\n").encode("utf-8")
+		# one write on an O_APPEND fd, so tests finishing side by side never interleave lines
+		fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			os.write(fd, line)
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+
+	def quarantine(self, test_home: str) -> None:
+		if not os.path.exists(test_home):
+			return
+		base, name = os.path.split(test_home)
+		dst = "{}/quarantine-{}".format(base, name)
+		i = 0
+		while os.path.exists(dst):
+			i += 1
+			dst = "{}/quarantine-{}.{}".format(base, name, i)
+		print("[warn] quarantining partial {} as {}".format(test_home, dst))
+		os.rename(test_home, dst)
+
+	# returns the (key, rep) to run under, or None when it already completed
+	def claim(self, params: Any) -> Optional[Tuple[str, int]]:
+		key = stable_hash(params)
+		rep = self.seen.get(key, 0)
+		self.seen[key] = rep + 1
+		k = (key, rep)
+		state = self.finished.get(k)
+		if state == "done":
+			return None
+		if state in ("timeout", "stall") and self.timeouts[k] > self.retries:
+			return None
+		if k in self.started and state is None:
+			self.quarantine(self.started[k])
+		return k
+
+	def start(self, k: Tuple[str, int], test_home: str) -> None:
+		self.started[k] = test_home
+		self.append({ "event": "start", "key": k[0], "rep": k[1], "test_home": test_home })
+
+	def finish(self, k: Tuple[str, int], test_home: str, event: str) -> None:
+		self.finished[k] = event
+		self.append({ "event": event, "key": k[0], "rep": k[1], "test_home": test_home })
@@ -2,8 +2,14 @@
 
 from apps import *
 from tests import *
+from campaign import test_spec, partition, scheduler
+from localcluster import local_cluster
+from manifest import read_test
+from repetition import rep_controller
 import sys
-from typing import Dict, Tuple, Union, cast
+import contextlib
+import statistics
+from typing import Dict, Tuple, Union, Iterator, Callable, cast
 import copy
 
 java_home = "/home/eurosys21/jvms/java_home"
@@ -30,7 +36,7 @@ def _jvm_conf(heap_size: str, sigve: bool = False, jvm_args: List[str] = None) -
 class spark_params:
 	def __init__(self, heap_size: int, workload: str = "ml/kmeans", scale: str = None,
 			mem_frac: float = -1, mem_storage_frac: float = -1,
-			sigve: bool = False, sigve_n: int = -1, sigve_f: float = -1) -> None:
+			sigve: bool = False, sigve_n: int = -1, sigve_f: float = -1, cores: int = -1) -> None:
 		self.heap_size: int = heap_size
 		self.mem_frac: float = mem_frac
 		self.mem_storage_frac: float = mem_storage_frac
@@ -51,6 +57,8 @@ class spark_params:
 		self.sigve: bool = sigve
 		self.sigve_n: int = sigve_n
 		self.sigve_f: float = sigve_f
+		# executor cores, -1 for the default of the cgroup size
+		self.cores: int = cores
 
 class detc_params:
 	def __init__(self, size: int, wounds: int = 5, clients: int = 5,
@@ -113,8 +121,8 @@ def init_detc(conf: config, dp: detc_params) -> go_conf:
 		go = go_conf(_go_conf)
 	return go
 
-def init_global(conf: config, cgroup_mem: str = "64g") -> Tuple[cgroup, sigve_conf]:
-	cg = cgroup(bakers, "memory:thermostat", cgroup_mem)
+def init_global(conf: config, cgroup_mem: str = "64g", hosts: Set[str] = None) -> Tuple[cgroup, sigve_conf]:
+	cg = cgroup(hosts if hosts else bakers, "memory:thermostat", cgroup_mem)
 	sc: sigve_conf = None
 	if conf == config.sigve:
 		if cgroup_mem == "64g":
@@ -126,10 +134,11 @@ def init_global(conf: config, cgroup_mem: str = "64g") -> Tuple[cgroup, sigve_co
 				high_wm_init = "7g")
 	return cg, sc
 
-def init_params(conf: config, params: List[Union[spark_params, detc_params, memcached_params]]) -> List[Union[jvm_conf, go_conf]]:
+def init_params(conf: config, params: List[Union[spark_params, detc_params, memcached_params]],
+		port_base: int = 0) -> List[Union[jvm_conf, go_conf]]:
 	runtimes: List[Union[jvm_conf, go_conf]] = []
 	spark_count: Dict[str, int] = {}
-	port_count: int = 0
+	port_count: int = port_base
 	for param in params:
 		if isinstance(param, spark_params):
 			if param.workload not in spark_count:
@@ -152,8 +161,109 @@ def init_params(conf: config, params: List[Union[spark_params, detc_params, memc
 			sys.exit(1)
 	return runtimes
 
-def workload_n(conf: config, params: List[Union[spark_params, detc_params, memcached_params]], delay: int = 0, path: str = None, cgroup_mem: str = "64g") -> None:
-	cg, sc = init_global(conf, cgroup_mem)
+# set inside partitioned(), workload_n then queues the test instead of running it
+_campaign: scheduler = None
+
+# seconds each earlier test of the same mix ran, the ones that timed out or stalled left out
+def past_runtimes(path: str) -> List[float]:
+	runtimes: List[float] = []
+	if path and os.path.exists(path):
+		for d in os.listdir(path):
+			test_home = path + '/' + d
+			if not d.startswith("test-") or os.path.exists(test_home + "/timeout") or os.path.exists(test_home + "/stall"):
+				continue
+			kv = read_test(test_home)[1]
+			if "start" in kv and "end" in kv:
+				runtimes.append((int(kv["end"]) - int(kv["start"])) / 1e9)
+	return runtimes
+
+def expected_runtime(path: str, params: List[Union[spark_params, detc_params, memcached_params]],
+		delay: int) -> float:
+	# median of earlier runs of the same mix, otherwise a guess from the stagger
+	runtimes = past_runtimes(path)
+	if runtimes:
+		return statistics.median(runtimes)
+	return delay * (len(params) - 1) + minutes(30)
+
+# the alarm of a test: twice the median of three or more earlier runs of the same mix, at least a
+# quarter over the slowest of them and 10 minutes, at most 3 hours. the watchdog ends stalled
+# tests long before, so this only has to catch the slow ones. 45 minutes without a history.
+def history_timeout(path: str) -> int:
+	runtimes = past_runtimes(path)
+	if len(runtimes) < 3:
+		return minutes(45)
+	return int(min(max(2 * statistics.median(runtimes), 1.25 * max(runtimes), minutes(10)), minutes(180)))
+
+# every baker becomes a sandbox under root on this machine with stand-ins for the applications,
+# so a whole campaign runs end to end on one box
+def use_local_cluster(root: str, secs: float = 5) -> local_cluster:
+	global java_home, hibench_home, spark_home, detc_home, memcached_home
+	lc = local_cluster(root, bakers, secs)
+	lc.install()
+	java_home = lc.java_home
+	hibench_home = lc.hibench_home
+	spark_home = lc.spark_home
+	detc_home = lc.detc_home
+	memcached_home = lc.memcached_home
+	tools.update(lc.tools())
+	use_pool(conn_pool(lc.transport()))
+	return lc
+
+# set by use_journal(), completed tests are then skipped when a campaign is rerun
+_journal: campaign_journal = None
+
+def use_journal(path: str, retries: int = 1) -> campaign_journal:
+	global _journal
+	_journal = campaign_journal(path, retries)
+	return _journal
+
+# set inside repeated(), workload_n then registers the test with the repetition controller
+_repeat: rep_controller = None
+
+def workload_n(conf: config, params: List[Union[spark_params, detc_params, memcached_params]], delay: int = 0, path: str = None, cgroup_mem: str = "64g",
+		hosts: Set[str] = None, part: partition = None, journal_key: Tuple[str, int] = None,
+		timeout: int = None, sample: int = -1) -> None:
+	if hosts is None:
+		if _repeat is not None:
+			# every run gets fresh params, init_params mutates them
+			_repeat.add(path, lambda p=copy.deepcopy(params): workload_n(conf, copy.deepcopy(p), delay, path, cgroup_mem,
+				timeout = timeout, sample = len(past_runtimes(path))), lambda: past_runtimes(path))
+			return
+		if _journal is not None:
+			# params are hashed before init_params mutates them. a repeated() run is told apart by
+			# how many samples there were before it, so a rerun after a crash resumes from the disk.
+			journal_key = _journal.claim([ str(conf), params, delay, path, cgroup_mem ] + ([ "sample", sample ] if sample >= 0 else []))
+			if journal_key is None:
+				print("== skipping {}, already completed".format(path))
+				return
+		if _campaign is not None:
+			_campaign.add(test_spec(path, lambda h, p: workload_n(conf, params, delay, path, cgroup_mem, h, p, journal_key, timeout),
+				expected_runtime(path, params, delay), 1, cgroup_mem, len(params)))
+			return
+	hosts = hosts if hosts else bakers
+	if timeout is None:
+		timeout = history_timeout(path)
+	stresses, sc = stresses_n(conf, params, delay, path, cgroup_mem, hosts, part)
+	standalone = partition_spark(part) if part and any([ isinstance(p, spark_params) for p in params ]) else None
+	if standalone:
+		standalone.start()
+	try:
+		test_runner.run_1time(path if path else sys.argv[1], conf, stresses, timeout = timeout, _sigve_conf = sc,
+			partition = str(part) if part else None, journal = _journal if journal_key else None,
+			journal_key = journal_key)
+	finally:
+		if standalone:
+			standalone.stop()
+
+# the spark master and workers a test in part runs its spark apps on, started and stopped around
+# the test in its forked process
+def partition_spark(part: partition) -> spark_standalone:
+	return spark_standalone(part.hosts, spark_home, "m3-part{}".format(part.index), part.spark_port())
+
+# the apps and benchmarks of one workload_n test on hosts, nothing is run yet
+def stresses_n(conf: config, params: List[Union[spark_params, detc_params, memcached_params]], delay: int, path: str,
+		cgroup_mem: str, hosts: Set[str], part: partition = None) -> Tuple[List[benchmark], sigve_conf]:
+	cg, sc = init_global(conf, cgroup_mem, hosts)
 	if sc != None and path != None and "hightop" in path:
 		sc.top = 64 * 1024 * 1024 * 1024
 	if sc != None and path != None and "nokill" in path:
@@ -165,34 +275,38 @@ def workload_n(conf: config, params: List[Union[spark_params, detc_params, memca
 	if sc != None and path != None and "dynamic" in path:
 		sc.low_wm_init = 40 * 1024 * 1024 * 1024
 		sc.high_wm_init = 45 * 1024 * 1024 * 1024
-	runtimes = init_params(conf, params)
+	runtimes = init_params(conf, params, part.port_base if part else 0)
+	master = partition_spark(part).url() if part else None
 
 	apps: List[application] = []
 	for param, runtime in zip(params, runtimes):
 		if isinstance(param, spark_params):
 			if path != None and "util-smolbrain" in path and len(apps) == 2:
-				apps.append(hibench_spark(bakers, hibench_home, spark_home, cast(jvm_conf, runtime),
+				apps.append(hibench_spark(hosts, hibench_home, spark_home, cast(jvm_conf, runtime),
 					scale = param.scale, workload = param.workload,
-					max_cores = 5 * 8, cores = 5,
+					max_cores = 5 * len(hosts), cores = 5,
 					mem_frac = param.mem_frac, mem_storage_frac = param.mem_storage_frac,
-					cg = None))
+					cg = None, master = master))
 			else:
 				if cgroup_mem == "64g":
-					max_cores = 5 * 8
+					max_cores = 5 * len(hosts)
 					cores = 5
 				else:
 					max_cores = 8
 					cores = 8
-				apps.append(hibench_spark(bakers, hibench_home, spark_home, cast(jvm_conf, runtime),
+				if param.cores != -1:
+					max_cores = param.cores * max_cores // cores
+					cores = param.cores
+				apps.append(hibench_spark(hosts, hibench_home, spark_home, cast(jvm_conf, runtime),
 					scale = param.scale, workload = param.workload,
 					max_cores = max_cores, cores = cores,
 					mem_frac = param.mem_frac, mem_storage_frac = param.mem_storage_frac,
 					sigve = param.sigve, sigve_n = param.sigve_n, sigve_f = param.sigve_f,
-					cg = cg))
+					cg = cg, master = master))
 		elif isinstance(param, detc_params):
-			apps.append(detc(bakers, detc_home, cast(go_conf, runtime), param.size, param.wounds, param.low_shrink, param.high_shrink, param.port, cg))
+			apps.append(detc(hosts, detc_home, cast(go_conf, runtime), param.size, param.wounds, param.low_shrink, param.high_shrink, param.port, cg))
 		elif isinstance(param, memcached_params):
-			apps.append(memcached(bakers, memcached_home, param.size, param.port, param.sigve, cg))
+			apps.append(memcached(hosts, memcached_home, param.size, param.port, param.sigve, cg))
 		else:
 			print("[error] workload_n apps invalid param type... {}".format(param))
 			sys.exit(1)
@@ -201,18 +315,56 @@ def workload_n(conf: config, params: List[Union[spark_params, detc_params, memca
 	for i, app_param in enumerate(zip(apps, params)):
 		app, param = app_param
 		if isinstance(app, hibench_spark):
-			stresses.append(hibench_stress(bakers, cast(hibench_spark, app), 0 if i == 0 else delay))
+			stresses.append(hibench_stress(hosts, cast(hibench_spark, app), 0 if i == 0 else delay))
 		elif isinstance(app, detc):
 			dp = cast(detc_params, param)
-			stresses.append(detc_stress(bakers, cast(detc, app), 0 if i == 0 else delay, dp.clients, dp.requests, dp.keys, dp.cores, dp.port))
+			stresses.append(detc_stress(hosts, cast(detc, app), 0 if i == 0 else delay, dp.clients, dp.requests, dp.keys, dp.cores, dp.port))
 		elif isinstance(app, memcached):
 			mcp = cast(memcached_params, param)
-			stresses.append(memcached_stress(bakers, cast(memcached, app), 0 if i == 0 else delay, mcp.requests, mcp.keys, mcp.port))
+			stresses.append(memcached_stress(hosts, cast(memcached, app), 0 if i == 0 else delay, mcp.requests, mcp.keys, mcp.port))
 		else:
 			print("[error] workload_n stresses invalid param type... {}".format(param))
 			sys.exit(1)
+	return stresses, sc
+
+# runs every workload_n issued inside the block side by side over disjoint sets of bakers
+@contextlib.contextmanager
+def partitioned(parts: int, hosts: Set[str] = None) -> Iterator[scheduler]:
+	global _campaign
+	camp = scheduler(hosts if hosts else bakers, parts)
+	_campaign = camp
+	try:
+		yield camp
+	finally:
+		_campaign = None
+	camp.run()
+
+# runs every workload_n issued inside the block until its runtime is known to within target, see
+# rep_controller. count of the run_* functions inside does not matter, 1 will do. with parts, each
+# round runs side by side as in partitioned(). not inside partitioned(), it needs every round's
+# results before picking the next.
+@contextlib.contextmanager
+def repeated(target: float = 0.05, min_reps: int = 3, max_reps: int = 10, compare: List[Tuple[str, str]] = None,
+		parts: int = 1) -> Iterator[rep_controller]:
+	global _repeat
+	ctl = rep_controller(target, min_reps, max_reps, compare)
+	_repeat = ctl
+	try:
+		yield ctl
+	finally:
+		_repeat = None
+
+	def execute(runs: List[Callable[[], None]]) -> None:
+		if parts > 1:
+			with partitioned(parts):
+				for run in runs:
+					run()
+		else:
+			for run in runs:
+				run()
 
-	test_runner.run_1time(path if path else sys.argv[1], conf, stresses, _sigve_conf = sc)
+	ctl.run(execute)
+	ctl.report()
 
 def run_global_optimal(prefix: str, count: int = 1) -> None:
 	nw = lambda: spark_params(24, "graph/nweight", mem_frac = 0.5, mem_storage_frac = 0.9)
@@ -320,85 +472,58 @@ def run_default(prefix: str, count: int = 1) -> None:
 				[ detc(), detc(), detc() ],
 				480, prefix + "-default-CCC480")
 
-def run_oracle(conf: config, prefix: str, count: int = 1) -> None:
-	detc = lambda x: detc_params(x, gc = 5)
+# heap or cache size in GB per app of each oracle mix, in the order workload_n takes them.
+# oracle.py searches these and writes a table of the same shape for run_oracle's sizes.
+oracle_sizes: Dict[str, List[int]] = {
+	"WW0": [ 27, 27 ],
+	"CCC0": [ 16, 16, 16 ],
+	"PPP0": [ 18, 18, 18 ],
+	"MMM0": [ 18, 18, 18 ],
+	"MMM180": [ 18, 18, 18 ],
+	"MMW180": [ 16, 16, 24 ],
+	"WMM300": [ 24, 16, 16 ],
+	"MCM180": [ 20, 13, 20 ],
+	"CPW180": [ 13, 16, 24 ],
+	"WPM180": [ 24, 16, 14 ],
+	"CWM180": [ 11, 24, 17 ],
+	"CMW180": [ 11, 18, 24 ],
+	"WMP240": [ 24, 14, 16 ],
+	"CCC480": [ 16, 16, 16 ],
+	"CCW300": [ 14, 14, 24 ],
+	"MWP180": [ 14, 24, 16 ],
+}
+
+# "MCM180" -> ("MCM", 180)
+def split_mix(mix: str) -> Tuple[str, int]:
+	letters = mix.rstrip("0123456789")
+	return letters, int(mix[len(letters):])
+
+# the app of each mix letter sized in GB, and the path label, for an oracle run under conf
+def oracle_apps(conf: config) -> Tuple[Dict[str, Callable[[int], Union[spark_params, detc_params]]], str]:
+	apps: Dict[str, Callable[[int], Union[spark_params, detc_params]]] = {
+		"C": lambda x: detc_params(x, gc = 5),
+	}
 	if conf == config.big_brain:
-		km = lambda x: spark_params(x, "ml/kmeans", mem_frac = 0.7, mem_storage_frac = 0.9)
-		nw = lambda x: spark_params(x, "graph/nweight", mem_frac = 0.5, mem_storage_frac = 0.9)
-		pr = lambda x: spark_params(x, "websearch/pagerank", mem_frac = 0.7, mem_storage_frac = 0.9)
-		path = "oracle-spark"
-	else:
-		km = lambda x: spark_params(x, "ml/kmeans")
-		nw = lambda x: spark_params(x, "graph/nweight")
-		pr = lambda x: spark_params(x, "websearch/pagerank")
-		path = "oracle"
-
+		apps["M"] = lambda x: spark_params(x, "ml/kmeans", mem_frac = 0.7, mem_storage_frac = 0.9)
+		apps["W"] = lambda x: spark_params(x, "graph/nweight", mem_frac = 0.5, mem_storage_frac = 0.9)
+		apps["P"] = lambda x: spark_params(x, "websearch/pagerank", mem_frac = 0.7, mem_storage_frac = 0.9)
+		return apps, "oracle-spark"
+	apps["M"] = lambda x: spark_params(x, "ml/kmeans")
+	apps["W"] = lambda x: spark_params(x, "graph/nweight")
+	apps["P"] = lambda x: spark_params(x, "websearch/pagerank")
+	return apps, "oracle"
+
+def oracle_params(conf: config, mix: str, sizes: List[int]) -> List[Union[spark_params, detc_params]]:
+	apps, _ = oracle_apps(conf)
+	return [ apps[l](size) for l, size in zip(split_mix(mix)[0], sizes) ]
+
+def run_oracle(conf: config, prefix: str, count: int = 1, sizes: Dict[str, List[int]] = None) -> None:
+	_, path = oracle_apps(conf)
 	for i in range(count):
-		##WW0
-		workload_n(conf,
-			[ nw(27), nw(27) ],
-			0, prefix + "-" + path + "-WW0")
-		##CCC0
-		workload_n(conf,
-			[ detc(16), detc(16), detc(16) ],
-			0, prefix + "-" + path + "-CCC0")
-		##PPP0
-		workload_n(conf,
-			[ pr(18), pr(18), pr(18) ],
-			0, prefix + "-" + path + "-PPP0")
-		##MMM0
-		workload_n(conf,
-			[ km(18), km(18), km(18) ],
-			0, prefix + "-" + path + "-MMM0")
-
-		##MMM180
-		workload_n(conf,
-			[ km(18), km(18), km(18) ],
-			180, prefix + "-" + path + "-MMM180")
-		##MMW180
-		workload_n(conf,
-			[ km(16), km(16), nw(24) ],
-			180, prefix + "-" + path + "-MMW180")
-		##WMM300
-		workload_n(conf,
-			[ nw(24), km(16), km(16) ],
-			300, prefix + "-" + path + "-WMM300")
-		##MCM180
-		workload_n(conf,
-			[ km(20), detc(13), km(20) ],
-			180, prefix + "-" + path + "-MCM180")
-		##CPW180
-		workload_n(conf,
-			[ detc(13), pr(16), nw(24) ],
-			180, prefix + "-" + path + "-CPW180")
-		##WPM180
-		workload_n(conf,
-			[ nw(24), pr(16), km(14) ],
-			180, prefix + "-" + path + "-WPM180")
-		##CWM180
-		workload_n(conf,
-			[ detc(11), nw(24), km(17) ],
-			180, prefix + "-" + path + "-CWM180")
-		##CMW180
-		workload_n(conf,
-			[ detc(11), km(18), nw(24) ],
-			180, prefix + "-" + path + "-CMW180")
-		##WMMP240
-		workload_n(conf,
-			[ nw(24), km(14), pr(16) ],
-			240, prefix + "-" + path + "-WMP240")
-		##CCC480
-		workload_n(conf,
-			[ detc(16), detc(16), detc(16) ],
-			480, prefix + "-" + path + "-CCC480")
-		##CCW300
-		workload_n(conf,
-			[ detc(14), detc(14), nw(24) ],
-			300, prefix + "-" + path + "-CCW300")
-		##MWP180
-		workload_n(conf,
-			[ km(14), nw(24), pr(16) ],
-			180, prefix + "-" + path + "-MWP180")
+		for mix, mix_sizes in (sizes if sizes else oracle_sizes).items():
+			workload_n(conf,
+				oracle_params(conf, mix, mix_sizes),
+				split_mix(mix)[1], prefix + "-" + path + "-" + mix)
 
 def run_m3(prefix: str, count: int = 1) -> None:
 	nw = lambda: spark_params(64, "graph/nweight")
@@ -493,6 +618,8 @@ def main() -> None:
 	# The string argument ("artifact") is a prefix for the directory the tests will be saved in.
 	# The integer argument (1) is the number of runs to perform.
 	# As is, this will run all benchmarks for the main results (Figure 5 and 8) once.
+	# Rerunning after a crash skips every test the journal already has as completed.
+	use_journal("artifact.journal")
 	run_default("artifact", 1)
 
 	run_m3("artifact", 1)
@@ -501,6 +628,22 @@ def main() -> None:
 	run_global_optimal("artifact", 1)
 	run_default("artifact", 1)
 
+	# To rerun every mix only until its mean runtime is known within 5%, 3 to 10 times, with the
+	# runs that are left going to comparisons not decided yet, wrap the calls, e.g.
+	#with repeated(0.05, 3, 10, compare=[ ("-m3-", "-default-"), ("-MMW180", "-WMM300") ]):
+	#	run_m3("artifact")
+	#	run_default("artifact")
+
+	# To run independent tests side by side, wrap the calls, e.g.
+	#with partitioned(2):
+	#	run_m3("artifact", 1)
+	# every test then starts its own spark master on the first baker of its partition, with the
+	# partition's bakers as workers, next to the shared cluster's.
+
+	# To try the harness without the cluster, call this first, every baker then is a directory
+	# under the given root running stand-ins that finish in a few seconds:
+	#use_local_cluster("/tmp/m3-local")
+
 	# In order to run this the Spark cluster must be restarted with only one worker.
 	# Comment all workers except "baker10" in "~/applications/spark-2.3.2-bin-hadoop2.7/conf/slaves"
 	#memcached_workload("artifact", 1)
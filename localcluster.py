@@ -0,0 +1,208 @@
+import os
+import stat
+from typing import List, Dict, Collection
+
+from remote import local_transport
+
+# stand-ins for everything the harness starts, small enough that a whole workload_n finishes in
+# seconds. each keeps the interface the harness relies on: the command line it is given, the
+# process name pkill looks for, the log lines the parsers read and the files the epilogues fetch.
+
+cg_helper_sh = """#!/bin/sh
+# cg_helper memory:<group>, a fake cgroup v1 directory under the baker's sandbox
+group=${{1#*:}}
+mkdir -p {cgroup_root}/$group
+cd {cgroup_root}/$group
+[ -e memory.usage_in_bytes ] || echo 0 > memory.usage_in_bytes
+[ -e memory.limit_in_bytes ] || echo 9223372036854771712 > memory.limit_in_bytes
+[ -e cgroup.procs ] || : > cgroup.procs
+[ -e memory.stat ] || printf "cache 0\\nrss 0\\nmapped_file 0\\nswap 0\\npgmajfault 0\\n" > memory.stat
+[ -e memory.oom_control ] || printf "oom_kill_disable 0\\nunder_oom 0\\noom_kill 0\\n" > memory.oom_control
+"""
+
+cgexec_sh = """#!/bin/sh
+# cgexec -g <controller>:<group> cmd..., joins the fake cgroup so the sampler sees the pid
+group=${{2#*:}}
+shift 2
+[ -d {cgroup_root}/$group ] && echo $$ >> {cgroup_root}/$group/cgroup.procs
+exec "$@"
+"""
+
+idle_sh = """#!/bin/sh
+# stands in for long running daemons (sigve, obs.py), they only have to live until terminated
+exec sleep 1000000
+"""
+
+true_sh = """#!/bin/sh
+exit 0
+"""
+
+spark_run_py = """#!/usr/bin/env python3
+# hibench <workload>/spark/run.sh: prints an app id like the driver does and leaves executor
+# logs with gc lines in every baker's spark_home/work for the collector and gclog.py
+import os, sys, time
+app_id = time.strftime("app-%Y%m%d%H%M%S-") + "{{:04d}}".format(os.getpid() % 10000)
+print("Connected to Spark cluster with app ID " + app_id, file=sys.stderr, flush=True)
+secs = float(os.environ.get("M3_LOCAL_SECS", {secs}))
+start = time.time()
+tasks = 0
+logs = []
+for baker in {hosts!r}:
+	d = "{root}/" + baker + "{spark_home}/work/" + app_id + "/0"
+	os.makedirs(d, exist_ok=True)
+	logs.append(open(d + "/stdout", "a"))
+	open(d + "/stderr", "a").close()
+while time.time() - start < secs:
+	up = time.time() - start
+	for f in logs:
+		f.write("{{:.3f}}: [GC pause (G1 Evacuation Pause) (young) 100M->50M(1G), 0.0100000 secs]\\n".format(up))
+		f.write("Total time for which application threads were stopped: 0.0110000 seconds, Stopping threads took: 0.0001000 seconds\\n")
+		f.flush()
+	tasks += 1
+	print("INFO TaskSetManager: Finished task {{}}.0 in stage 0.0 (TID {{}})".format(tasks, tasks), file=sys.stderr, flush=True)
+	time.sleep(0.5)
+print("finished " + app_id, file=sys.stderr)
+"""
+
+markbench_py = """#!/usr/bin/env python3
+# markbench -clients n ...: per client rate lines once a second, then per client totals
+import sys, time
+args = sys.argv[1:]
+clients = int(args[args.index("-clients") + 1]) if "-clients" in args else 4
+secs = float({secs})
+start = time.time()
+n = 0
+while time.time() - start < secs:
+	time.sleep(1)
+	n += 1
+	stamp = time.strftime("%Y/%m/%d %H:%M:%S") + ".000000"
+	for c in range(clients):
+		print("{{}} client {{}}: {{}} req/s latency {{}}us".format(stamp, c, 1000, 100), flush=True)
+for c in range(clients):
+	print("client {{}}: {{}} requests in {{:.1f}}s".format(c, 1000 * n, time.time() - start))
+"""
+
+memcached_py = """#!/usr/bin/env python3
+# memcached -p port -l addr ...: answers "version" so the readiness probe passes
+import sys, socketserver
+args = sys.argv[1:]
+port = int(args[args.index("-p") + 1])
+addr = args[args.index("-l") + 1] if "-l" in args else "127.0.0.1"
+class handler(socketserver.StreamRequestHandler):
+	def handle(self):
+		for line in self.rfile:
+			if line.startswith(b"version"):
+				self.wfile.write(b"VERSION 1.6.7\\r\\n")
+socketserver.ThreadingTCPServer.allow_reuse_address = True
+socketserver.ThreadingTCPServer((addr, port), handler).serve_forever()
+"""
+
+memtier_py = """#!/usr/bin/env python3
+# memtier_benchmark ... -n requests: the 1.3.0 summary table and latency distribution
+import sys, time
+args = sys.argv[1:]
+secs = int(float({secs}) / 2)
+for s in range(1, secs + 1):
+	time.sleep(1)
+	sys.stderr.write("[RUN #1 {{}}%, {{}} secs] 12 threads: 1000 ops, 1000 (avg: 1000) ops/sec\\r".format(100 * s // secs, s))
+sys.stderr.write("\\n")
+print("ALL STATS")
+print("=" * 70)
+print("Type         Ops/sec     Hits/sec   Misses/sec      Latency       KB/sec")
+print("-" * 70)
+print("Sets          500.00          ---          ---      1.00000       1000.00")
+print("Gets         5000.00      5000.00         0.00      0.90000       10000.00")
+print("Totals       5500.00      5000.00         0.00      0.91000       11000.00")
+print()
+print()
+print("Request Latency Distribution")
+print("Type     <= msec         Percent")
+print("-" * 70)
+for kind in ("SET", "GET"):
+	for msec, pct in ((0.5, 40.0), (1.0, 90.0), (2.0, 99.0), (5.0, 100.0)):
+		print("{{}}       {{}}         {{}}".format(kind, msec, pct))
+"""
+
+hibench_conf = """hibench.scale.profile tiny
+hibench.report.dir ${{hibench.home}}/report
+"""
+
+spark_conf = """hibench.spark.master spark://{master}:7077
+spark.executor.memory 4g
+#spark.executor.cores 1
+#spark.cores.max 1
+#spark.memory.fraction 0.6
+#spark.memory.storageFraction 0.5
+#spark.sigve false
+#spark.sigve_n 1
+#spark.sigve_f 1
+#spark.executor.extraJavaOptions -XX:+PrintGCTimeStamps
+"""
+
+# every baker is a directory under root with its own loopback address, the applications live once
+# under root/apps. commands run in the baker's directory, so the relative cgroup root in tools
+# lands in that baker's own fake cgroup tree, and the relative java_home in the baker's own copy:
+# hibench_spark.setup_cgroup rewrites bin/java per baker, side by side.
+class local_cluster:
+	def __init__(self, root: str, hosts: Collection[str], secs: float = 5) -> None:
+		self.root: str = os.path.abspath(root)
+		self.hosts: List[str] = sorted(hosts)
+		self.secs: float = secs
+		self.bin: str = self.root + "/bin"
+		self.apps: str = self.root + "/apps"
+		self.java_home: str = "java_home"
+		self.hibench_home: str = self.apps + "/HiBench"
+		self.spark_home: str = self.apps + "/spark-2.3.2-bin-hadoop2.7"
+		self.detc_home: str = self.apps + "/detc"
+		self.memcached_home: str = self.apps + "/memcached-1.6.7"
+		self.addrs: Dict[str, str] = { h: "127.0.0.{}".format(i + 10) for i, h in enumerate(self.hosts) }
+
+	def tools(self) -> Dict[str, str]:
+		return {
+			"cg_helper": self.bin + "/cg_helper",
+			"cgroup_root": "cgroup",
+			"toogle_swap": self.bin + "/true",
+			"obs_env": self.bin + "/obs_env",
+			"obs": self.bin + "/idle",
+			"jemalloc": "",
+			"memtier": self.bin + "/memtier_benchmark",
+		}
+
+	def transport(self) -> local_transport:
+		return local_transport(self.root, self.addrs, { "PATH": self.bin + ':' + os.environ.get("PATH", "") })
+
+	def write(self, path: str, data: str, exe: bool = False) -> None:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'w') as f:
+			f.write(data)
+		if exe:
+			os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+	def install(self, workloads: Collection[str] = ("ml/kmeans", "websearch/pagerank", "graph/nweight")) -> None:
+		fmt = { "cgroup_root": "cgroup", "secs": self.secs, "hosts": self.hosts, "root": self.root,
+			"spark_home": self.spark_home, "master": self.addrs[self.hosts[0]] }
+		self.write(self.bin + "/cg_helper", cg_helper_sh.format(**fmt), True)
+		self.write(self.bin + "/cgexec", cgexec_sh.format(**fmt), True)
+		self.write(self.bin + "/idle", idle_sh, True)
+		self.write(self.bin + "/true", true_sh, True)
+		self.write(self.bin + "/obs_env", "")
+		self.write(self.bin + "/memtier_benchmark", memtier_py.format(**fmt), True)
+
+		for host in self.hosts:
+			java_home = self.root + '/' + host + '/' + self.java_home
+			for name in ("java", "java_real", "java_cgroup"):
+				self.write(java_home + "/bin/" + name, "#!/bin/sh\n# CHANGE_ME\nexec java \"$@\"\n", True)
+			self.write(java_home + "/bin/sigve", idle_sh, True)
+		self.write(self.hibench_home + "/conf/hibench.conf", hibench_conf.format(**fmt))
+		self.write(self.hibench_home + "/conf/spark.conf", spark_conf.format(**fmt))
+		self.write(self.hibench_home + "/conf/hadoop.conf", "")
+		for name in ("start-master.sh", "start-slave.sh", "stop-master.sh", "stop-slave.sh"):
+			self.write(self.spark_home + "/sbin/" + name, true_sh, True)
+		for workload in workloads:
+			self.write(self.hibench_home + "/bin/workloads/" + workload + "/spark/run.sh",
+				spark_run_py.format(**fmt), True)
+		self.write(self.detc_home + "/markbench", markbench_py.format(**fmt), True)
+		self.write(self.memcached_home + "/bin/memcached", memcached_py, True)
+
+		for host in self.hosts:
+			os.makedirs(self.root + '/' + host + self.spark_home + "/work", exist_ok=True)
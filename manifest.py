@@ -0,0 +1,104 @@
+import os
+import json
+from time import clock_gettime, CLOCK_REALTIME
+from typing import Dict, Set, Tuple, Any
+
+# test-N/manifest.json, everything a test ran with: one entry per cgroup, daemon, application and
+# benchmark plus the test itself, each from its describe(), and the run's timestamps. built in
+# memory while the test is set up and replaced whole on every write.
+#
+# the conf/<name> and info text files of older tests are generated from it, a "runtime" field
+# (jvm_conf, go_conf, sigve_conf) flattened into its entry's file like write_conf used to.
+version: int = 1
+
+def now_ns() -> int:
+	return int(clock_gettime(CLOCK_REALTIME) * 1e9)
+
+def text_value(v: Any) -> str:
+	if isinstance(v, (list, tuple)):
+		return ' '.join([ str(x) for x in v ])
+	if isinstance(v, dict):
+		return ' '.join([ "{}:{}".format(k, x) for k, x in v.items() ])
+	return str(v)
+
+# one entry as the key value pairs of its conf/<name> file
+def kv(fields: Dict[str, Any]) -> Dict[str, str]:
+	out: Dict[str, str] = {}
+	for k, v in fields.items():
+		if k == "runtime":
+			out.update({ rk: text_value(rv) for rk, rv in v.items() if rk != "type" })
+		else:
+			out[k] = text_value(v)
+	return out
+
+def text(fields: Dict[str, Any]) -> str:
+	return ''.join([ "{} {}\n".format(k, v) for k, v in kv(fields).items() ])
+
+class manifest:
+	def __init__(self, test_home: str) -> None:
+		self.test_home: str = test_home
+		self.path: str = test_home + "/manifest.json"
+		self.created: int = now_ns()
+		# conf file name -> fields, in the order the test set them up
+		self.entries: Dict[str, Dict[str, Any]] = {}
+		# run timestamps in ns, what the info file holds
+		self.info: Dict[str, int] = {}
+		# entries do not change once added, their text files are written once
+		self.written: Set[str] = set()
+
+	def add(self, name: str, fields: Dict[str, Any]) -> None:
+		self.entries[name] = fields
+		self.written.discard(name)
+
+	def to_json(self) -> Dict[str, Any]:
+		return { "version": version, "test_home": self.test_home, "created": self.created,
+			"written": now_ns(), "entries": self.entries, "info": self.info }
+
+	def write(self) -> None:
+		tmp = self.path + ".tmp"
+		with open(tmp, 'w') as f:
+			json.dump(self.to_json(), f, indent=1)
+		os.replace(tmp, self.path)
+		self.write_text()
+
+	def write_text(self) -> None:
+		os.makedirs(self.test_home + "/conf", exist_ok=True)
+		for name, fields in self.entries.items():
+			if name in self.written:
+				continue
+			with open(self.test_home + "/conf/" + name, 'w') as conf_f:
+				conf_f.write(text(fields))
+			self.written.add(name)
+		if self.info:
+			with open(self.test_home + "/info", 'w') as info_f:
+				info_f.write(''.join([ "{} {}\n".format(k, v) for k, v in self.info.items() ]))
+
+def load(test_home: str) -> Dict[str, Any]:
+	with open(test_home + "/manifest.json") as f:
+		m = json.load(f)
+	if m.get("version", 0) > version:
+		print("[warn] {}: manifest version {} is newer than {}".format(test_home, m["version"], version))
+	return m
+
+# conf name -> key value pairs and the info pairs of a test, from its manifest if it has one,
+# otherwise from the text files of tests from before the manifest
+def read_test(test_home: str) -> Tuple[Dict[str, Dict[str, str]], Dict[str, str]]:
+	if os.path.exists(test_home + "/manifest.json"):
+		m = load(test_home)
+		return { name: kv(fields) for name, fields in m["entries"].items() }, { k: str(v) for k, v in m["info"].items() }
+	confs: Dict[str, Dict[str, str]] = {}
+	conf_dir = test_home + "/conf"
+	if os.path.isdir(conf_dir):
+		for name in os.listdir(conf_dir):
+			confs[name] = read_kv(conf_dir + '/' + name)
+	info = read_kv(test_home + "/info") if os.path.exists(test_home + "/info") else {}
+	return confs, info
+
+def read_kv(path: str) -> Dict[str, str]:
+	kv: Dict[str, str] = {}
+	with open(path) as f:
+		for line in f:
+			parts = line.rstrip("\n").split(' ', 1)
+			if parts[0]:
+				kv[parts[0]] = parts[1] if len(parts) > 1 else ""
+	return kv
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import json
+import numpy as np
+from typing import List, Dict, Tuple, Any, Optional
+
+from results import parse_name
+from manifest import read_test
+
+# markbench prints a rate line per client once a second and a total line per client at the end:
+#   2021/01/12 10:31:05.000000 client 3: 81234 req/s latency 97us
+#   client 3: 4000000 requests in 49.2s
+# each field has its own pattern, a line contributes whatever fields it carries.
+# adjust these if markbench's output changes.
+go_time_re = re.compile(r"^(\d{4})/(\d\d)/(\d\d) (\d\d):(\d\d):(\d\d(?:\.\d+)?)")
+client_re = re.compile(r"\bclient (\d+):")
+requests_re = re.compile(r"\b(\d+) requests\b")
+rate_re = re.compile(r"\b([\d.]+) req/s\b")
+latency_re = re.compile(r"\blatency ([\d.]+)(ns|us|µs|ms|s)\b")
+elapsed_re = re.compile(r"\bin ([\d.]+)(ms|s|m)\b")
+
+unit_secs: Dict[str, float] = { "ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1.0, "m": 60.0 }
+
+def timestamp(line: str) -> Optional[float]:
+	m = go_time_re.match(line)
+	if m:
+		y, mo, d, h, mi, s = m.groups()
+		return float(np.datetime64("{}-{}-{}T{}:{}".format(y, mo, d, h, mi), "s").astype(np.int64)) + float(s)
+	return None
+
+class host_stats:
+	def __init__(self, host: str) -> None:
+		self.host: str = host
+		# (time, client, rate) samples, time and client are nan/-1 when the line has none
+		self.samples: List[Tuple[float, int, float]] = []
+		self.latencies: List[float] = []
+		# client -> (requests, seconds) from summary lines
+		self.totals: Dict[int, Tuple[float, float]] = {}
+
+	def parse(self, path: str) -> "host_stats":
+		with open(path, errors="replace") as f:
+			for line in f:
+				ts = timestamp(line)
+				c = client_re.search(line)
+				client = int(c.group(1)) if c else -1
+				for value, unit in latency_re.findall(line):
+					self.latencies.append(float(value) * unit_secs[unit])
+				r = rate_re.search(line)
+				if r:
+					self.samples.append((ts if ts is not None else np.nan, client, float(r.group(1))))
+				n = requests_re.search(line)
+				e = elapsed_re.search(line)
+				if n and e:
+					self.totals[client] = (float(n.group(1)), float(e.group(1)) * unit_secs[e.group(2)])
+		return self
+
+	def client_rates(self) -> Dict[int, float]:
+		rates: Dict[int, float] = { c: n / s for c, (n, s) in self.totals.items() if s > 0 }
+		if not rates and self.samples:
+			arr = np.array(self.samples)
+			for c in np.unique(arr[:, 1]):
+				rates[int(c)] = float(arr[arr[:, 1] == c, 2].mean())
+		return rates
+
+	# total throughput per bin across clients, from the timestamped rate samples
+	def timeline(self, bin_secs: float = 1) -> Tuple[np.ndarray, np.ndarray]:
+		arr = np.array([ s for s in self.samples if not np.isnan(s[0]) ]) if self.samples else np.zeros((0, 3))
+		if len(arr) == 0:
+			return np.zeros(0), np.zeros(0)
+		t = arr[:, 0] - arr[:, 0].min()
+		bins = (t // bin_secs).astype(np.int64)
+		n = bins.max() + 1
+		# a client reporting twice in one bin counts once, averaged
+		clients = np.unique(arr[:, 1])
+		total = np.zeros(n)
+		for c in clients:
+			sel = arr[:, 1] == c
+			s = np.bincount(bins[sel], weights=arr[sel, 2], minlength=n)
+			k = np.bincount(bins[sel], minlength=n)
+			total += np.divide(s, k, out=np.zeros(n), where=k > 0)
+		return np.arange(n) * bin_secs, total
+
+	def summary(self) -> Dict[str, Any]:
+		lat = np.array(self.latencies)
+		times, tput = self.timeline()
+		rates = self.client_rates()
+		return {
+			"host": self.host,
+			"client_rates": { str(c): r for c, r in sorted(rates.items()) },
+			"total_rate": float(sum(rates.values())),
+			"latency": { "count": int(len(lat)),
+				"p50": float(np.percentile(lat, 50)) if len(lat) else None,
+				"p99": float(np.percentile(lat, 99)) if len(lat) else None,
+				"max": float(lat.max()) if len(lat) else None },
+			"timeline": { "t": times.tolist(), "rate": tput.tolist() },
+		}
+
+# logs are <detc test_log_dir>/<benchmark name>_<baker>_stdout.log
+def report(test_home: str, log_dir: str, bm_name: str) -> Dict[str, Any]:
+	hosts: List[Dict[str, Any]] = []
+	for name in sorted(os.listdir(log_dir)):
+		m = re.match(re.escape(bm_name) + r"_(.+)_stdout\.log$", name)
+		if m:
+			hosts.append(host_stats(m.group(1)).parse(log_dir + '/' + name).summary())
+	path = test_home + "/markbench.json"
+	out: Dict[str, Any] = {}
+	if os.path.exists(path):
+		with open(path) as f:
+			out = json.load(f)
+	out[bm_name] = { "hosts": hosts, "total_rate": sum(h["total_rate"] for h in hosts) }
+	tmp = path + ".tmp"
+	with open(tmp, 'w') as f:
+		json.dump(out, f, indent=1)
+	os.replace(tmp, path)
+	return out[bm_name]
+
+# sum of all hosts' timelines, and its worst 10s window against the mean: the dip when the
+# cache is shrunk under memory pressure shows up as a low ratio
+def dip(bm: Dict[str, Any], window: int = 10) -> Tuple[float, float]:
+	tls = [ np.array(h["timeline"]["rate"]) for h in bm["hosts"] if h["timeline"]["rate"] ]
+	if not tls:
+		return bm["total_rate"], np.nan
+	n = max(len(t) for t in tls)
+	total = sum(np.pad(t, (0, n - len(t))) for t in tls)
+	if n < window:
+		return float(total.mean()), np.nan
+	w = np.convolve(total, np.ones(window) / window, mode="valid")
+	return float(total.mean()), float(w.min() / total.mean()) if total.mean() > 0 else np.nan
+
+def detc_benchmarks(test_home: str) -> List[Tuple[str, Dict[str, str]]]:
+	bms: List[Tuple[str, Dict[str, str]]] = []
+	confs = read_test(test_home)[0]
+	for name, kv in sorted(confs.items()):
+		if kv.get("type") == "detc_stress":
+			bms.append((name, confs[kv["apps"].split()[0]]))
+	return bms
+
+# every detc benchmark under root, its tests grouped per mix and config with the go and shrink
+# settings next to it: mean and standard deviation of their throughput, mean and worst dip.
+# tests parsed before are read back from their markbench.json.
+def summarize(root: str = ".") -> None:
+	groups: Dict[Tuple[str, str, str, str], List[Tuple[float, float]]] = {}
+	for d in sorted(os.listdir(root)):
+		prefix, label, mix, delay = parse_name(d)
+		if "C" not in mix:
+			continue
+		for t in sorted(os.listdir(root + '/' + d)):
+			test_home = root + '/' + d + '/' + t
+			bms = detc_benchmarks(test_home)
+			if not bms:
+				continue
+			out: Dict[str, Any] = {}
+			if os.path.exists(test_home + "/markbench.json"):
+				with open(test_home + "/markbench.json") as f:
+					out = json.load(f)
+			for bm_name, app in bms:
+				if bm_name not in out:
+					out[bm_name] = report(test_home, app["test_log_dir"], bm_name)
+				key = (mix + str(delay), label, str(app.get("GO_SIGVE_PERCENT", "-")),
+					"{}-{}".format(app.get("low_shrink"), app.get("high_shrink")))
+				groups.setdefault(key, []).append(dip(out[bm_name]))
+
+	print("{:<8} {:<24} {:>6} {:>7} {:>5} {:>12} {:>10} {:>6} {:>6}".format("mix", "config", "sigve%", "shrink",
+		"tests", "mean req/s", "sd", "dip", "worst"))
+	for (mix, label, sigve, shrink), rows in sorted(groups.items()):
+		arr = np.array(rows)
+		ratios = arr[~np.isnan(arr[:, 1]), 1]
+		print("{:<8} {:<24} {:>6} {:>7} {:>5} {:>12.1f} {:>10.1f} {:>6.2f} {:>6.2f}".format(mix, label, sigve, shrink,
+			len(arr), arr[:, 0].mean(), arr[:, 0].std(ddof=1) if len(arr) > 1 else np.nan,
+			ratios.mean() if len(ratios) else np.nan, ratios.min() if len(ratios) else np.nan))
+
+if __name__ == "__main__":
+	summarize(sys.argv[1] if len(sys.argv) > 1 else ".")
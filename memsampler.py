@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+
+# samples one memory cgroup on a baker: memory.usage_in_bytes, memory.stat, its oom kills and the
+# rss of every pid in it, and writes frames to stdout, which the harness stores as
+# mem_sampler/<baker>.bin. runs on the bakers, so stdlib only. memtrace.py reads the frames back as
+# numpy arrays, the watchdog the latest counters while the test runs.
+#
+# frame: header "<4sBIII" magic, kind, rows, cols, payload length, then the payload
+#   kind 0: json meta, the column names of the kind 1 frames
+#   kind 1: rows x [ time_ns, usage, memory.stat values... ]
+#   kind 2: rows x [ time_ns, pid, rss ]
+# kind 1 and 2 payloads are zlib'd little endian int64, column by column, every column delta
+# encoded from its first value, so each frame decodes on its own and a cut off tail loses nothing
+# before it.
+
+import os
+import sys
+import json
+import zlib
+import struct
+import signal
+import argparse
+from array import array
+from time import clock_gettime, CLOCK_REALTIME, CLOCK_MONOTONIC, sleep
+from typing import List, Dict, Optional, BinaryIO
+
+magic: bytes = b"M3MS"
+header = struct.Struct("<4sBIII")
+kind_meta: int = 0
+kind_cgroup: int = 1
+kind_pids: int = 2
+
+def encode(buf: array, rows: int, cols: int) -> bytes:
+	out = array('q', bytes(8 * rows * cols))
+	for c in range(cols):
+		prev = 0
+		base = c * rows
+		for r in range(rows):
+			v = buf[r * cols + c]
+			out[base + r] = v - prev
+			prev = v
+	if sys.byteorder != "little":
+		out.byteswap()
+	return zlib.compress(out.tobytes(), 1)
+
+def write_frame(f: BinaryIO, kind: int, rows: int, cols: int, payload: bytes) -> None:
+	f.write(header.pack(magic, kind, rows, cols, len(payload)))
+	f.write(payload)
+
+# preallocated rows x cols int64s, reused after every flush
+class ring:
+	def __init__(self, rows: int, cols: int) -> None:
+		self.rows: int = rows
+		self.cols: int = cols
+		self.buf: array = array('q', bytes(8 * rows * cols))
+		self.n: int = 0
+
+	def full(self) -> bool:
+		return self.n == self.rows
+
+	def append(self, values: List[int]) -> None:
+		base = self.n * self.cols
+		for i, v in enumerate(values):
+			self.buf[base + i] = v
+		self.n += 1
+
+	def flush(self, f: BinaryIO, kind: int) -> None:
+		if self.n:
+			write_frame(f, kind, self.n, self.cols, encode(self.buf, self.n, self.cols))
+			self.n = 0
+
+class sampler:
+	def __init__(self, cg_dir: str, interval: float, flush_secs: float, pids_every: float) -> None:
+		self.cg_dir: str = cg_dir
+		self.interval: float = interval
+		self.flush_secs: float = flush_secs
+		self.pids_every: float = pids_every
+		self.page: int = os.sysconf("SC_PAGE_SIZE")
+		# kept open and pread, no open/close per sample
+		self.usage_fd: int = os.open(cg_dir + "/memory.usage_in_bytes", os.O_RDONLY)
+		self.stat_fd: int = os.open(cg_dir + "/memory.stat", os.O_RDONLY)
+		self.statm: Dict[int, int] = {}
+		self.keys: List[str] = [ line.split()[0] for line in self.read(self.stat_fd).splitlines() if line ]
+		# the oom kill counter lives in memory.oom_control, on kernels that have one
+		self.oom_fd: Optional[int] = None
+		try:
+			fd = os.open(cg_dir + "/memory.oom_control", os.O_RDONLY)
+			if "oom_kill " in self.read(fd):
+				self.oom_fd = fd
+				self.keys.append("oom_kill")
+			else:
+				os.close(fd)
+		except OSError:
+			pass
+		self.index: Dict[str, int] = { k: i for i, k in enumerate(self.keys) }
+		rows = max(1, int(flush_secs / interval))
+		self.cg: ring = ring(rows, 2 + len(self.keys))
+		self.pids: ring = ring(rows * 8, 3)
+		self.stopping: bool = False
+
+	def read(self, fd: int) -> str:
+		return os.pread(fd, 65536, 0).decode()
+
+	def refresh_pids(self) -> None:
+		try:
+			with open(self.cg_dir + "/cgroup.procs") as f:
+				pids = set([ int(p) for p in f.read().split() ])
+		except OSError:
+			pids = set()
+		for pid in list(self.statm):
+			if pid not in pids:
+				os.close(self.statm.pop(pid))
+		for pid in pids:
+			if pid not in self.statm:
+				try:
+					self.statm[pid] = os.open("/proc/{}/statm".format(pid), os.O_RDONLY)
+				except OSError:
+					pass
+
+	def sample(self, now: int, out: BinaryIO) -> None:
+		values = [ 0 ] * self.cg.cols
+		values[0] = now
+		values[1] = int(self.read(self.usage_fd))
+		for line in self.read(self.stat_fd).splitlines():
+			parts = line.split()
+			i = self.index.get(parts[0]) if parts else None
+			if i is not None:
+				values[2 + i] = int(parts[1])
+		if self.oom_fd is not None:
+			for line in self.read(self.oom_fd).splitlines():
+				if line.startswith("oom_kill "):
+					values[2 + self.index["oom_kill"]] = int(line.split()[1])
+		if self.cg.full():
+			self.cg.flush(out, kind_cgroup)
+		self.cg.append(values)
+		for pid, fd in list(self.statm.items()):
+			try:
+				rss = int(os.pread(fd, 256, 0).split()[1]) * self.page
+			except (OSError, IndexError):
+				os.close(self.statm.pop(pid))
+				continue
+			if self.pids.full():
+				self.pids.flush(out, kind_pids)
+			self.pids.append([ now, pid, rss ])
+
+	def flush(self, out: BinaryIO) -> None:
+		self.cg.flush(out, kind_cgroup)
+		self.pids.flush(out, kind_pids)
+		out.flush()
+
+	def run(self, out: BinaryIO, meta: Dict[str, object]) -> None:
+		meta["columns"] = [ "time_ns", "usage" ] + self.keys
+		write_frame(out, kind_meta, 0, 0, json.dumps(meta).encode())
+		start = clock_gettime(CLOCK_MONOTONIC)
+		next_sample = start
+		next_flush = start + self.flush_secs
+		next_pids = start
+		while not self.stopping:
+			now = clock_gettime(CLOCK_MONOTONIC)
+			if now >= next_pids:
+				self.refresh_pids()
+				next_pids = now + self.pids_every
+			self.sample(int(clock_gettime(CLOCK_REALTIME) * 1e9), out)
+			if now >= next_flush:
+				self.flush(out)
+				next_flush = now + self.flush_secs
+			# fixed schedule, a slow sample skips ticks instead of pushing every later one back
+			next_sample += self.interval
+			now = clock_gettime(CLOCK_MONOTONIC)
+			if next_sample < now:
+				next_sample += (int((now - next_sample) / self.interval) + 1) * self.interval
+			sleep(next_sample - now)
+		self.flush(out)
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--cgroup", default="thermostat")
+	parser.add_argument("--root", default="/sys/fs/cgroup/memory")
+	parser.add_argument("--interval", type=float, default=0.02)
+	parser.add_argument("--flush", type=float, default=1)
+	parser.add_argument("--pids-every", type=float, default=1)
+	# the test_home this sampler belongs to, so teardown only stops its own
+	parser.add_argument("--test", default="")
+	args = parser.parse_args()
+
+	s = sampler(args.root + '/' + args.cgroup, args.interval, args.flush, args.pids_every)
+	def stop(signum, frame) -> None:
+		s.stopping = True
+	signal.signal(signal.SIGTERM, stop)
+	signal.signal(signal.SIGHUP, stop)
+	signal.signal(signal.SIGINT, stop)
+	try:
+		s.run(sys.stdout.buffer, { "cgroup": args.cgroup, "interval": args.interval,
+			"host": os.uname().nodename, "page_size": s.page, "test": args.test })
+	except BrokenPipeError:
+		# the harness went away, nobody to write to
+		pass
+
+if __name__ == "__main__":
+	main()
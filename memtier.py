@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import json
+from typing import List, Dict, Any, Optional, Callable
+
+percentiles: List[float] = [ 50, 90, 99, 99.9 ]
+
+run_secs_re = re.compile(r"\[RUN #\d+ 100%,\s*(\d+) secs\]")
+
+# "Avg. Latency", "p99 Latency" are one column each in newer releases, 1.3.0 has a bare "Latency"
+def columns(header: str) -> List[str]:
+	cols: List[str] = []
+	for tok in header.split()[1:]:
+		if tok == "Latency" and cols and (cols[-1] == "Avg." or cols[-1].startswith('p')):
+			cols[-1] += " Latency"
+		else:
+			cols.append(tok)
+	return cols
+
+def number(s: str) -> Optional[float]:
+	try:
+		return float(s)
+	except ValueError:
+		return None
+
+# one memtier_benchmark stdout: the "ALL STATS" table plus the cumulative "Request Latency
+# Distribution", the column names are read from the header since they differ across versions
+def parse(stdout: str, stderr: str = None) -> Dict[str, Any]:
+	rec: Dict[str, Any] = { "stats": {}, "distribution": {}, "secs": None }
+	with open(stdout) as f:
+		lines = f.read().splitlines()
+	i = 0
+	while i < len(lines):
+		line = lines[i].strip()
+		if line == "ALL STATS":
+			# title, =====, header, -----, rows until blank
+			cols = columns(lines[i + 2])
+			i += 4
+			while i < len(lines) and lines[i].strip():
+				row = lines[i].split()
+				rec["stats"][row[0].lower()] = { c: number(v) for c, v in zip(cols, row[1:]) }
+				i += 1
+			continue
+		if line == "Request Latency Distribution":
+			i += 3
+			while i < len(lines) and lines[i].strip():
+				row = lines[i].split()
+				if len(row) == 3 and number(row[1]) is not None:
+					rec["distribution"].setdefault(row[0].lower(), []).append([ float(row[1]), float(row[2]) ])
+				i += 1
+			continue
+		i += 1
+	if stderr and os.path.exists(stderr):
+		with open(stderr, errors="replace") as f:
+			# progress lines are \r separated
+			found = run_secs_re.findall(f.read())
+		if found:
+			rec["secs"] = float(found[-1])
+	return rec
+
+def ops_per_sec(rec: Dict[str, Any], kind: str) -> float:
+	row = rec["stats"].get(kind + "s", rec["stats"].get(kind, {}))
+	return row.get("Ops/sec") or 0.0
+
+# cumulative percent buckets of every record, weighted by how many requests each one made, or by
+# its rate alone when one of them lacks the progress line on stderr. records with the same key ran
+# side by side, as long as the longest of them, records with different keys one after the other.
+# without a key every record ran on its own. ops_per_sec is all requests over the time the groups
+# took, or when that is not known the mean over the groups of their summed rates.
+def merge(recs: List[Dict[str, Any]], key: Callable[[Dict[str, Any]], Any] = None) -> Dict[str, Any]:
+	merged: Dict[str, Any] = {}
+	timed = all([ rec["secs"] for rec in recs ])
+	groups: Dict[Any, List[Dict[str, Any]]] = {}
+	for i, rec in enumerate(recs):
+		groups.setdefault(key(rec) if key else i, []).append(rec)
+	secs = sum([ max([ rec["secs"] for rec in g ]) for g in groups.values() ]) if timed else 0.0
+	for kind in ("set", "get"):
+		buckets: Dict[float, float] = {}
+		ops = 0.0
+		for rec in recs:
+			rate = ops_per_sec(rec, kind)
+			weight = rate * rec["secs"] if timed else rate
+			ops += weight
+			prev = 0.0
+			for msec, cum in rec["distribution"].get(kind, []):
+				buckets[msec] = buckets.get(msec, 0.0) + (cum - prev) / 100 * weight
+				prev = cum
+		if not buckets or ops == 0:
+			continue
+		if timed:
+			out: Dict[str, Any] = { "ops": ops, "secs": secs, "ops_per_sec": ops / secs }
+		else:
+			out = { "ops_per_sec": sum([ sum([ ops_per_sec(rec, kind) for rec in g ]) for g in groups.values() ]) / len(groups) }
+		total = sum(buckets.values())
+		acc = 0.0
+		todo = list(percentiles)
+		for msec in sorted(buckets):
+			acc += buckets[msec]
+			while todo and acc / total * 100 >= todo[0] - 1e-9:
+				out["p{}_msec".format(todo.pop(0))] = msec
+		merged[kind] = out
+	return merged
+
+# logs are <memcached test_log_dir>/<benchmark name><phase>_<server>_{stdout,stderr}.log. the
+# servers of a phase are driven side by side, the phases one after the other. "measured" merges
+# the measured phases only, load and warmup stay under "phases".
+def report(test_home: str, log_dir: str, bm_name: str, phases: List[str], measured: List[str]) -> Dict[str, Any]:
+	out: Dict[str, Any] = {}
+	path = test_home + "/memtier.json"
+	if os.path.exists(path):
+		with open(path) as f:
+			out = json.load(f)
+	runs: List[Dict[str, Any]] = []
+	for name in sorted(os.listdir(log_dir)):
+		m = re.match(re.escape(bm_name) + r"(\d)_(.+)_stdout\.log$", name)
+		if not m:
+			continue
+		rec = parse(log_dir + '/' + name, log_dir + '/' + name[:-len("stdout.log")] + "stderr.log")
+		rec["phase"] = phases[int(m.group(1))] if int(m.group(1)) < len(phases) else m.group(1)
+		rec["server"] = m.group(2)
+		runs.append(rec)
+	out[bm_name] = {
+		"runs": runs,
+		"phases": { phase: merge([ r for r in runs if r["phase"] == phase ], lambda r: r["phase"]) for phase in phases },
+		"measured": merge([ r for r in runs if r["phase"] in measured ], lambda r: r["phase"]),
+	}
+	tmp = path + ".tmp"
+	with open(tmp, 'w') as f:
+		json.dump(out, f, indent=1)
+	os.replace(tmp, path)
+	return out[bm_name]
+
+def load(test_home: str) -> Dict[str, Any]:
+	with open(test_home + "/memtier.json") as f:
+		return json.load(f)
+
+# every memcached_stress of every test, merged across its runs, e.g. vanilla vs m3. the servers
+# of one benchmark ran side by side, the benchmarks are counted one after the other.
+def compare(test_homes: List[str], phase: str = "run") -> None:
+	print("{:<48} {:>4} {:>12} {:>9} {:>9} {:>9}".format("test", "type", "ops/sec", "p50", "p99", "p99.9"))
+	for test_home in test_homes:
+		recs: List[Dict[str, Any]] = []
+		for name, bm in load(test_home).items():
+			recs.extend([ dict(r, benchmark=name) for r in bm["runs"] if r["phase"] == phase ])
+		for kind, m in merge(recs, lambda r: r["benchmark"]).items():
+			print("{:<48} {:>4} {:>12.1f} {:>9} {:>9} {:>9}".format(test_home, kind, m["ops_per_sec"],
+				m.get("p50_msec"), m.get("p99_msec"), m.get("p99.9_msec")))
+
+if __name__ == "__main__":
+	compare(sys.argv[1:])
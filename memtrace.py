@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import zlib
+import numpy as np
+from typing import List, Dict, Tuple, Any
+
+from memsampler import header, magic, kind_meta, kind_cgroup, kind_pids
+
+def decode(payload: bytes, rows: int, cols: int) -> np.ndarray:
+	deltas = np.frombuffer(zlib.decompress(payload), dtype="<i8").reshape(cols, rows)
+	return np.cumsum(deltas, axis=1).T
+
+# one baker's frames. a frame cut short by the sampler being killed ends the read.
+class mem_trace:
+	def __init__(self, path: str) -> None:
+		self.path: str = path
+		self.meta: Dict[str, Any] = {}
+		self.columns: List[str] = []
+		cg: List[np.ndarray] = []
+		pids: List[np.ndarray] = []
+		with open(path, "rb") as f:
+			data = f.read()
+		off = 0
+		while off + header.size <= len(data):
+			m, kind, rows, cols, size = header.unpack_from(data, off)
+			off += header.size
+			if m != magic or off + size > len(data):
+				break
+			payload = data[off:off + size]
+			off += size
+			if kind == kind_meta:
+				self.meta = json.loads(payload.decode())
+				self.columns = self.meta["columns"]
+			elif kind == kind_cgroup:
+				cg.append(decode(payload, rows, cols))
+			elif kind == kind_pids:
+				pids.append(decode(payload, rows, cols))
+		self.samples: np.ndarray = np.concatenate(cg) if cg else np.zeros((0, len(self.columns)), dtype=np.int64)
+		self.pids: np.ndarray = np.concatenate(pids) if pids else np.zeros((0, 3), dtype=np.int64)
+
+	def __len__(self) -> int:
+		return len(self.samples)
+
+	def column(self, name: str) -> np.ndarray:
+		return self.samples[:, self.columns.index(name)]
+
+	def time(self) -> np.ndarray:
+		return self.column("time_ns")
+
+	# pid -> (time_ns, rss) series
+	def rss(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+		out: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+		for pid in np.unique(self.pids[:, 1]):
+			sel = self.pids[:, 1] == pid
+			out[int(pid)] = (self.pids[sel, 0], self.pids[sel, 2])
+		return out
+
+	def summary(self) -> Dict[str, Any]:
+		if not len(self):
+			return { "samples": 0 }
+		t = self.time()
+		usage = self.column("usage")
+		gaps = np.diff(t) / 1e9
+		return {
+			"samples": int(len(self)),
+			"secs": float((t[-1] - t[0]) / 1e9),
+			"interval_p50": float(np.median(gaps)) if len(gaps) else 0.0,
+			"interval_max": float(gaps.max()) if len(gaps) else 0.0,
+			"usage_max": int(usage.max()),
+			"usage_mean": float(usage.mean()),
+			"pids": int(len(np.unique(self.pids[:, 1]))),
+		}
+
+# every baker of a test, as written by the mem_sampler daemon
+def load(test_home: str) -> Dict[str, mem_trace]:
+	d = test_home + "/mem_sampler"
+	traces: Dict[str, mem_trace] = {}
+	if os.path.isdir(d):
+		for name in sorted(os.listdir(d)):
+			if name.endswith(".bin"):
+				traces[name[:-len(".bin")]] = mem_trace(d + '/' + name)
+	return traces
+
+def main() -> None:
+	for test_home in sys.argv[1:]:
+		for baker, tr in load(test_home).items():
+			s = tr.summary()
+			if not s["samples"]:
+				print("{} {}: no samples".format(test_home, baker))
+				continue
+			print("{} {}: {} samples over {:.1f}s, every {:.3f}s (max gap {:.3f}s), usage max {:.2f}g mean {:.2f}g, {} pids".format(
+				test_home, baker, s["samples"], s["secs"], s["interval_p50"], s["interval_max"],
+				s["usage_max"] / 2**30, s["usage_mean"] / 2**30, s["pids"]))
+
+if __name__ == "__main__":
+	main()
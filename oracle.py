@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import math
+import argparse
+import numpy as np
+from typing import List, Dict, Tuple, Optional
+
+from launch import config, oracle_sizes, oracle_apps, oracle_params, split_mix, spark_params, workload_n, use_local_cluster
+from results import results_store
+from apps import G
+
+# finds the smallest heap or cache size of every app of an oracle mix that keeps the mix's runtime
+# within slo times its baseline, the mix run at the hi sizes (run_oracle's by default), which may
+# be over the shared cgroup limit. the found sizes always fit it.
+#   - all apps shrink together first: one bisection over a common step from lo to hi, largest
+#     step that fits limit as the upper end
+#   - then each app alone, largest first, is bisected down with the others fixed
+# bisection assumes smaller never runs faster. a trial is stopped at slo times the baseline, a run
+# that long has failed whatever it would have done next, and one failed repetition fails a setting.
+# every run is an ordinary test under <prefix>-<label>-search-<mix>, a setting with runs of the
+# same conf, mix and sizes anywhere in the results store, run_oracle's own included, is not rerun.
+#
+#   ./oracle.py MCM180 MMW180 --conf big_brain     writes oracle_table.json
+#   run_oracle(config.big_brain, "artifact", sizes=oracle.load_table("oracle_table.json"))
+
+# the smallest size searched, spark apps need their executors to start at all
+floors: Dict[str, int] = { "C": 2, "M": 4, "P": 4, "W": 4 }
+
+class oracle_search:
+	def __init__(self, conf: config, mix: str, hi: List[int] = None, lo: List[int] = None, slo: float = 1.1,
+			limit: int = 64, reps: int = 1, prefix: str = "oracle", root: str = ".", max_trial: int = 45 * 60) -> None:
+		self.conf: config = conf
+		self.mix: str = mix
+		self.letters, self.delay = split_mix(mix)
+		self.hi: List[int] = hi if hi else oracle_sizes[mix]
+		self.lo: List[int] = lo if lo else [ min(floors[l], h) for l, h in zip(self.letters, self.hi) ]
+		self.slo: float = slo
+		self.limit: int = limit
+		self.reps: int = reps
+		self.max_trial: int = max_trial
+		self.path: str = "{}/{}-{}-search-{}".format(root, prefix, oracle_apps(conf)[1], mix)
+		self.store: results_store = results_store(root)
+		self.baseline: float = math.nan
+		self.trials: int = 0
+		self.store.ingest()
+
+	# what each app's row in the results store holds when run at sizes
+	def expected(self, sizes: List[int]) -> List[Tuple[str, int, float, float]]:
+		out: List[Tuple[str, int, float, float]] = []
+		for p in oracle_params(self.conf, self.mix, sizes):
+			if isinstance(p, spark_params):
+				out.append((p.workload, p.heap_size * G, p.mem_frac, p.mem_storage_frac))
+			else:
+				out.append(("detc", p.size * G, -1, -1))
+		return out
+
+	# runtime of every test of the mix at sizes, inf for the ones that timed out or stalled
+	def runtimes(self, sizes: List[int]) -> List[float]:
+		rows = self.store.query(config=self.conf.name, mix=self.letters, delay=self.delay).rows
+		want = self.expected(sizes)
+		out: List[float] = []
+		for t in np.unique(rows["test"]):
+			apps = rows[rows["test"] == t]
+			# apps are named after their place in the mix, hibench_spark0, detc1, ...
+			got = { int(a["app"].lstrip("abcdefghijklmnopqrstuvwxyz_")): a for a in apps }
+			if len(got) != len(want) or any([ i not in got or got[i]["workload"] != w or got[i]["heap"] != h
+					or not np.isclose(got[i]["mem_frac"], f) or not np.isclose(got[i]["mem_storage_frac"], s)
+					for i, (w, h, f, s) in enumerate(want) ]):
+				continue
+			out.append(math.inf if apps[0]["timeout"] or apps[0]["stall"] else float(apps[0]["runtime"]))
+		return out
+
+	def trial(self, sizes: List[int], timeout: int) -> None:
+		print("== oracle {}: {} (timeout {}s)".format(self.mix, sizes, timeout))
+		workload_n(self.conf, oracle_params(self.conf, self.mix, sizes), self.delay, self.path, timeout=timeout)
+		self.trials += 1
+		self.store.ingest()
+
+	# median runtime at sizes over reps runs, inf as soon as one of them misses the slo
+	def measure(self, sizes: List[int], bound: float = math.inf) -> float:
+		timeout = self.max_trial if math.isinf(bound) else min(self.max_trial, int(bound) + 1)
+		while True:
+			runs = self.runtimes(sizes)
+			if any([ r > bound for r in runs ]):
+				return math.inf
+			if len(runs) >= self.reps:
+				return float(np.median(runs))
+			self.trial(sizes, timeout)
+
+	def ok(self, sizes: List[int]) -> bool:
+		return sum(sizes) <= self.limit and self.measure(sizes, self.baseline * self.slo) <= self.baseline * self.slo
+
+	# smallest k in lo..hi with ok(at(k)), hi itself assumed ok
+	def bisect(self, lo: int, hi: int, at) -> int:
+		bad = lo - 1
+		while hi - bad > 1:
+			mid = (bad + hi) // 2
+			if self.ok(at(mid)):
+				hi = mid
+			else:
+				bad = mid
+		return hi
+
+	# the smallest sizes found and their runtime, None when even the largest that fit miss the slo
+	def search(self) -> Optional[Tuple[List[int], float]]:
+		self.baseline = self.measure(self.hi)
+		if math.isinf(self.baseline):
+			print("[error] oracle {}: baseline {} did not complete".format(self.mix, self.hi))
+			return None
+		steps = max([ h - l for h, l in zip(self.hi, self.lo) ])
+		joint = lambda k: [ l + round((h - l) * k / steps) if steps else h for h, l in zip(self.hi, self.lo) ]
+		top = steps
+		while top >= 0 and sum(joint(top)) > self.limit:
+			top -= 1
+		if top < 0 or not self.ok(joint(top)):
+			print("[error] oracle {}: nothing under {}g meets {:.2f}x of {:.0f}s".format(self.mix, self.limit,
+				self.slo, self.baseline))
+			return None
+		sizes = joint(self.bisect(0, top, joint))
+		for i in sorted(range(len(sizes)), key=lambda i: -sizes[i]):
+			one = lambda s, i=i: sizes[:i] + [ s ] + sizes[i + 1:]
+			sizes = one(self.bisect(self.lo[i], sizes[i], one))
+		return sizes, self.measure(sizes)
+
+def load_table(path: str) -> Dict[str, List[int]]:
+	with open(path) as f:
+		return { mix: row["sizes"] for mix, row in json.load(f).items() }
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("mixes", nargs="*", help="e.g. MCM180, all of run_oracle's by default")
+	parser.add_argument("--conf", choices=[ "big_brain", "smol_brain" ], default="big_brain")
+	parser.add_argument("--slo", type=float, default=1.1, help="allowed runtime over the baseline")
+	parser.add_argument("--limit", type=int, default=64, help="GB all apps of a mix share")
+	parser.add_argument("--reps", type=int, default=1, help="runs per setting")
+	parser.add_argument("--prefix", default="oracle")
+	parser.add_argument("--table", default="oracle_table.json")
+	parser.add_argument("--local", help="run on a local cluster under this root instead")
+	args = parser.parse_args()
+
+	if args.local:
+		use_local_cluster(args.local)
+	conf = config[args.conf]
+	table: Dict[str, Dict] = {}
+	if os.path.exists(args.table):
+		with open(args.table) as f:
+			table = json.load(f)
+	for mix in (args.mixes if args.mixes else list(oracle_sizes)):
+		s = oracle_search(conf, mix, slo=args.slo, limit=args.limit, reps=args.reps, prefix=args.prefix)
+		found = s.search()
+		if found:
+			table[mix] = { "conf": conf.name, "sizes": found[0], "runtime": found[1], "baseline": s.baseline,
+				"baseline_sizes": s.hi, "slo": args.slo, "limit": args.limit, "trials": s.trials }
+		tmp = args.table + ".tmp"
+		with open(tmp, 'w') as f:
+			json.dump(table, f, indent=1)
+		os.replace(tmp, args.table)
+
+	print("{:<8} {:<16} {:>5} {:>9} {:>9} {:>6} {:>7}".format("mix", "sizes", "total", "runtime", "baseline",
+		"ratio", "trials"))
+	for mix, row in table.items():
+		print("{:<8} {:<16} {:>4}g {:>8.0f}s {:>8.0f}s {:>6.2f} {:>7}".format(mix, ' '.join(map(str, row["sizes"])),
+			sum(row["sizes"]), row["runtime"], row["baseline"], row["runtime"] / row["baseline"], row["trials"]))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,468 @@
+import os
+import signal
+import subprocess
+import atexit
+import abc
+import asyncio
+import threading
+import concurrent.futures
+import contextlib
+from time import clock_gettime, CLOCK_MONOTONIC, CLOCK_REALTIME
+from typing import List, Dict, Union, TextIO, Optional, Tuple, Callable, Collection, Iterator
+from spans import tracing
+
+# transports turn "run this on host" into an argv we can exec locally
+class transport(abc.ABC):
+	@abc.abstractmethod
+	def connect(self, host: str) -> bool:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def check(self, host: str) -> bool:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def disconnect(self, host: str) -> None:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def cmd(self, host: str, cmd: str) -> List[str]:
+		raise NotImplementedError
+	@abc.abstractmethod
+	def rsync(self, args: List[str]) -> List[str]:
+		raise NotImplementedError
+
+	def addr(self, host: str) -> str:
+		return host
+
+class ssh_transport(transport):
+	def __init__(self, control_dir: str = "/tmp/m3-ssh", persist: str = "yes") -> None:
+		self.control_dir: str = control_dir
+		self.persist: str = persist
+		os.makedirs(self.control_dir, mode=0o700, exist_ok=True)
+
+	def opts(self, host: str) -> List[str]:
+		return [ "-o", "ControlMaster=auto",
+			"-o", "ControlPath={}/{}".format(self.control_dir, host),
+			"-o", "ControlPersist=" + self.persist ]
+
+	def connect(self, host: str) -> bool:
+		# -f backgrounds once authenticated, the master then serves every later ssh/rsync
+		cmd = [ "ssh", "-N", "-f" ] + self.opts(host) + [ host ]
+		proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+		if proc.returncode != 0:
+			print("[warn] ret: {} for: {}".format(proc.returncode, proc.args))
+			print(proc.stderr.decode("utf-8"))
+		return proc.returncode == 0
+
+	def check(self, host: str) -> bool:
+		cmd = [ "ssh", "-O", "check" ] + self.opts(host) + [ host ]
+		return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+	def disconnect(self, host: str) -> None:
+		cmd = [ "ssh", "-O", "exit" ] + self.opts(host) + [ host ]
+		subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+	def cmd(self, host: str, cmd: str) -> List[str]:
+		return [ "ssh" ] + self.opts(host) + [ host, cmd ]
+
+	def rsync(self, args: List[str]) -> List[str]:
+		# any "host:path" argument rides on that host's master connection
+		return [ "rsync", "-e", "ssh " + ' '.join(self.opts("%h")) ] + args
+
+# runs every "host" as a directory on this machine, for testing the harness without bakers.
+# addrs gives each host its own loopback address, env is added to every command's environment.
+class local_transport(transport):
+	def __init__(self, root: str, addrs: Dict[str, str] = None, env: Dict[str, str] = None) -> None:
+		self.root: str = os.path.abspath(root)
+		self.addrs: Dict[str, str] = addrs if addrs else {}
+		self.env: Dict[str, str] = env if env else {}
+		self.connected: Dict[str, bool] = {}
+
+	def home(self, host: str) -> str:
+		return self.root + '/' + host
+
+	def connect(self, host: str) -> bool:
+		os.makedirs(self.home(host), exist_ok=True)
+		self.connected[host] = True
+		return True
+
+	def check(self, host: str) -> bool:
+		return self.connected.get(host, False) and os.path.isdir(self.home(host))
+
+	def disconnect(self, host: str) -> None:
+		self.connected[host] = False
+
+	def cmd(self, host: str, cmd: str) -> List[str]:
+		return [ "env", "BAKER=" + host, "BAKER_HOME=" + self.home(host) ] + \
+			[ "{}={}".format(k, v) for k, v in self.env.items() ] + \
+			[ "sh", "-c", "cd {} && {}".format(self.home(host), cmd) ]
+
+	def addr(self, host: str) -> str:
+		return self.addrs.get(host, "127.0.0.1")
+
+	def path(self, arg: str) -> str:
+		host, sep, path = arg.partition(':')
+		if not sep or '/' in host:
+			return arg
+		return self.home(host) + path
+
+	def rsync(self, args: List[str]) -> List[str]:
+		return [ "rsync" ] + [ self.path(arg) for arg in args ]
+
+class conn_pool:
+	def __init__(self, trans: transport = None, check_interval: float = 30) -> None:
+		self.transport: transport = trans if trans else ssh_transport()
+		self.check_interval: float = check_interval
+		self.checked: Dict[str, float] = {}
+		# launcher and phase threads ask for the same hosts at once, each host is connected and
+		# checked by one of them at a time, different hosts side by side
+		self.lock: threading.Lock = threading.Lock()
+		self.host_locks: Dict[str, threading.Lock] = {}
+
+	def host_lock(self, host: str) -> threading.Lock:
+		with self.lock:
+			if host not in self.host_locks:
+				self.host_locks[host] = threading.Lock()
+			return self.host_locks[host]
+
+	def connect(self, host: str) -> None:
+		if not self.transport.connect(host):
+			print("[warn] could not open connection to {}".format(host))
+			return
+		self.checked[host] = clock_gettime(CLOCK_MONOTONIC)
+
+	def get(self, host: str) -> transport:
+		with self.host_lock(host):
+			now = clock_gettime(CLOCK_MONOTONIC)
+			if host not in self.checked:
+				self.connect(host)
+			elif now - self.checked[host] > self.check_interval:
+				if self.transport.check(host):
+					self.checked[host] = now
+				else:
+					print("[warn] reconnecting to {}".format(host))
+					self.transport.disconnect(host)
+					self.connect(host)
+		return self.transport
+
+	def cmd(self, host: str, cmd: str) -> List[str]:
+		return self.get(host).cmd(host, cmd)
+
+	def rsync(self, hosts: List[str], args: List[str]) -> List[str]:
+		for host in hosts:
+			self.get(host)
+		return self.transport.rsync(args)
+
+	def addr(self, host: str) -> str:
+		return self.transport.addr(host)
+
+	def close(self) -> None:
+		for host in list(self.checked):
+			with self.host_lock(host):
+				self.transport.disconnect(host)
+		self.checked = {}
+
+_pool: conn_pool = None
+_pool_lock: threading.Lock = threading.Lock()
+
+def pool() -> conn_pool:
+	# launcher threads may be the first to ask, several at once
+	with _pool_lock:
+		if _pool is None:
+			_set_pool(conn_pool())
+		return _pool
+
+def use_pool(p: conn_pool) -> conn_pool:
+	with _pool_lock:
+		return _set_pool(p)
+
+def _set_pool(p: conn_pool) -> conn_pool:
+	global _pool
+	if _pool is not None:
+		_pool.close()
+	else:
+		atexit.register(lambda: _pool.close())
+	_pool = p
+	return p
+
+class result:
+	def __init__(self, host: Optional[str], args: List[str]) -> None:
+		self.host: Optional[str] = host
+		self.args: List[str] = args
+		self.returncode: int = -1
+		self.stdout: bytes = b""
+		self.stderr: bytes = b""
+		self.start: float = 0
+		self.end: float = 0
+		self.timed_out: bool = False
+
+	def ok(self) -> bool:
+		return self.returncode == 0 and not self.timed_out
+
+	def report(self, quiet: bool = False) -> None:
+		if self.timed_out:
+			print("[warn] timeout after {:.1f}s for: {}".format(self.end - self.start, self.args))
+		elif not quiet and self.returncode != 0:
+			print("[warn] ret: {} for: {}".format(self.returncode, self.args))
+		else:
+			return
+		if self.stdout:
+			print(self.stdout.decode("utf-8", "replace"))
+		if self.stderr:
+			print(self.stderr.decode("utf-8", "replace"))
+
+# what a command shows up as in the trace, the remote command line rather than the ssh options
+def label(args: List[str], width: int = 120) -> str:
+	if args and args[0] == "ssh":
+		text = args[-1]
+	elif args and args[0] == "env" and "sh" in args:
+		text = args[-1].split("&& ", 1)[-1]
+	else:
+		text = ' '.join(args)
+	text = text.split("\n", 1)[0]
+	return text if len(text) <= width else text[:width - 3] + "..."
+
+# output goes to a path or an open file (streamed by the kernel, never through us) or,
+# when None, is drained into memory while the command runs so a full pipe can't block it
+Sink = Union[None, str, TextIO]
+
+# what a job is part of, so it can be stopped from elsewhere: jobs submitted inside owning(tag)
+# from that thread carry tag, threads started inside it do not inherit it
+_owner: threading.local = threading.local()
+
+@contextlib.contextmanager
+def owning(tag: str) -> Iterator[None]:
+	prev = getattr(_owner, "tag", None)
+	_owner.tag = tag
+	try:
+		yield
+	finally:
+		_owner.tag = prev
+
+class job:
+	def __init__(self, args: List[str], host: Optional[str], stdout: Sink, stderr: Sink,
+			timeout: Optional[float], env: Optional[Dict[str, str]], bounded: bool, owner: Optional[str]) -> None:
+		self.args: List[str] = args
+		self.host: Optional[str] = host
+		self.stdout: Sink = stdout
+		self.stderr: Sink = stderr
+		self.timeout: Optional[float] = timeout
+		self.env: Optional[Dict[str, str]] = env
+		self.bounded: bool = bounded
+		self.name: str = None
+		self.owner: Optional[str] = owner
+		self.proc: asyncio.subprocess.Process = None
+		self.stopped: bool = False
+		self.future: concurrent.futures.Future
+		self.loop: asyncio.AbstractEventLoop
+
+	def wait(self, timeout: float = None) -> result:
+		return self.future.result(timeout)
+
+	def done(self) -> bool:
+		return self.future.done()
+
+	def signal(self, sig: int) -> None:
+		def _signal() -> None:
+			self.stopped = True
+			self.send(sig)
+		self.loop.call_soon_threadsafe(_signal)
+
+	def send(self, sig: int) -> None:
+		# every job leads its own process group so helpers it forked go down with it
+		if self.proc is not None and self.proc.returncode is None:
+			try:
+				os.killpg(self.proc.pid, sig)
+			except ProcessLookupError:
+				pass
+
+	def terminate(self) -> None:
+		self.signal(signal.SIGTERM)
+
+	def kill(self) -> None:
+		self.signal(signal.SIGKILL)
+
+# one event loop on a background thread owns every child process; callers get jobs back
+class cmd_executor:
+	def __init__(self, limit: int = 64, timeout: Optional[float] = 10 * 60) -> None:
+		self.limit: int = limit
+		self.timeout: Optional[float] = timeout
+		self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+		self.sem: asyncio.Semaphore = asyncio.Semaphore(limit)
+		self.live: Dict[job, None] = {}
+		self.lock: threading.Lock = threading.Lock()
+		self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+		self.thread.start()
+
+	def submit(self, args: List[str], host: str = None, stdout: Sink = None, stderr: Sink = None,
+			timeout: Optional[float] = -1, env: Dict[str, str] = None, bounded: bool = True, name: str = None,
+			owner: str = None) -> job:
+		j = job(args, host, stdout, stderr, self.timeout if timeout == -1 else timeout, env, bounded,
+			owner if owner else getattr(_owner, "tag", None))
+		j.name = name if name else label(args)
+		j.loop = self.loop
+		with self.lock:
+			self.live[j] = None
+		j.future = asyncio.run_coroutine_threadsafe(self._run(j), self.loop)
+		j.future.add_done_callback(lambda f: self.forget(j))
+		return j
+
+	def forget(self, j: job) -> None:
+		with self.lock:
+			self.live.pop(j, None)
+
+	# the unfinished jobs tagged owner
+	def owned(self, owner: str) -> List[job]:
+		with self.lock:
+			return [ j for j in self.live if j.owner == owner ]
+
+	def run(self, cmds: List[List[str]], hosts: List[str] = None, quiet: bool = False,
+			timeout: Optional[float] = -1, name: str = None) -> List[result]:
+		jobs = [ self.submit(cmd, hosts[i] if hosts else None, timeout=timeout, name=name) for i, cmd in enumerate(cmds) ]
+		results = [ j.wait() for j in jobs ]
+		for res in results:
+			res.report(quiet)
+		return results
+
+	async def _run(self, j: job) -> result:
+		if j.bounded:
+			async with self.sem:
+				return await self._exec(j)
+		return await self._exec(j)
+
+	async def _exec(self, j: job) -> result:
+		res = result(j.host, j.args)
+		opened: List[TextIO] = []
+		def sink(s: Sink) -> Union[int, TextIO]:
+			if s is None:
+				return asyncio.subprocess.PIPE
+			if isinstance(s, str):
+				if s == j.stdout and opened:
+					return opened[0]
+				opened.append(open(s, "wb"))
+				return opened[-1]
+			return s
+		try:
+			res.start = clock_gettime(CLOCK_REALTIME)
+			if j.stopped:
+				return res
+			j.proc = await asyncio.create_subprocess_exec(*j.args, stdin=asyncio.subprocess.DEVNULL,
+					stdout=sink(j.stdout), stderr=sink(j.stderr), env=j.env, start_new_session=True)
+			if j.stopped:
+				j.send(signal.SIGTERM)
+			try:
+				out, err = await asyncio.wait_for(j.proc.communicate(), j.timeout)
+				res.stdout = out if out else b""
+				res.stderr = err if err else b""
+			except asyncio.TimeoutError:
+				res.timed_out = True
+				j.send(signal.SIGKILL)
+				await j.proc.wait()
+			res.returncode = j.proc.returncode
+		except OSError as e:
+			res.stderr = str(e).encode("utf-8")
+		finally:
+			res.end = clock_gettime(CLOCK_REALTIME)
+			for f in opened:
+				f.close()
+			tracing().complete(j.name, "cmd", res.start, res.end, j.host if j.host else "local",
+				{ "returncode": res.returncode, "timed_out": res.timed_out })
+		return res
+
+_executor: cmd_executor = None
+_executor_lock: threading.Lock = threading.Lock()
+
+def executor() -> cmd_executor:
+	global _executor
+	# teardown steps may be the first to ask, several at once
+	with _executor_lock:
+		if _executor is None:
+			_executor = cmd_executor()
+		return _executor
+
+def _reset_executor() -> None:
+	# the loop thread does not survive fork, nor do locks another thread held
+	global _executor, _executor_lock, _pool_lock
+	_executor = None
+	_executor_lock = threading.Lock()
+	_pool_lock = threading.Lock()
+	if _pool is not None:
+		_pool.lock = threading.Lock()
+		_pool.host_locks = {}
+
+os.register_at_fork(after_in_child=_reset_executor)
+
+# a batch collects the small commands of one lifecycle phase and sends each host a single
+# script, the script prints a marker with the exit code and the host's clock after every step
+class batch:
+	marker = "@@m3-step"
+
+	def __init__(self, name: str = "batch") -> None:
+		self.name: str = name
+		self.steps: Dict[str, List[Tuple[str, bool]]] = {}
+
+	def add(self, hosts: Collection[str], cmd: Union[str, Callable[[str], str]], quiet: bool = False) -> None:
+		for host in hosts:
+			self.steps.setdefault(host, []).append((cmd(host) if callable(cmd) else cmd, quiet))
+
+	def script(self, host: str) -> str:
+		lines: List[str] = [ "echo \"{} -1 0 $(date +%s%N)\"".format(self.marker) ]
+		for i, step in enumerate(self.steps[host]):
+			lines.append("( {} ) 2>&1; echo \"{} {} $? $(date +%s%N)\"".format(step[0], self.marker, i))
+		return "\n".join(lines)
+
+	def parse(self, host: str, res: result) -> List[int]:
+		codes: List[int] = [ -1 ] * len(self.steps[host])
+		out: List[str] = []
+		stamps: Dict[int, int] = {}
+		for line in res.stdout.decode("utf-8", "replace").splitlines():
+			if not line.startswith(self.marker + ' '):
+				out.append(line)
+				continue
+			fields = line.split()
+			i, code = fields[1:3]
+			if len(fields) > 3 and fields[3].isdigit():
+				stamps[int(i)] = int(fields[3])
+			if int(i) < 0:
+				continue
+			codes[int(i)] = int(code)
+			cmd, quiet = self.steps[host][int(i)]
+			if not quiet and int(code) != 0:
+				print("[warn] ret: {} for: {} on {}".format(code, cmd, host))
+				if out:
+					print("\n".join(out))
+			out = []
+		if -1 in codes:
+			print("[warn] {} on {} stopped after {} of {} steps".format(self.name, host, codes.index(-1), len(codes)))
+			res.report()
+		self.trace(host, res, stamps)
+		return codes
+
+	# the host's clock only gives the steps' durations, they are laid out from the command's start
+	def trace(self, host: str, res: result, stamps: Dict[int, int]) -> None:
+		if -1 not in stamps:
+			return
+		for i, (cmd, quiet) in enumerate(self.steps[host]):
+			if i not in stamps or i - 1 not in stamps:
+				break
+			start = res.start + (stamps[i - 1] - stamps[-1]) / 1e9
+			end = res.start + (stamps[i] - stamps[-1]) / 1e9
+			tracing().complete(label([ cmd ]), "step", start, end, host, { "batch": self.name })
+
+	def run(self, timeout: Optional[float] = -1) -> Dict[str, List[int]]:
+		hosts: List[str] = [ host for host in self.steps if self.steps[host] ]
+		if not hosts:
+			return {}
+		cmds = [ pool().cmd(host, self.script(host)) for host in hosts ]
+		results = executor().run(cmds, hosts, quiet=True, timeout=timeout, name=self.name)
+		codes = { host: self.parse(host, res) for host, res in zip(hosts, results) }
+		self.steps = {}
+		return codes
+
+# run into the caller's batch if there is one, otherwise into a fresh one that runs on exit
+@contextlib.contextmanager
+def batched(b: batch = None, name: str = "batch") -> Iterator[batch]:
+	if b is not None:
+		yield b
+		return
+	b = batch(name)
+	yield b
+	b.run()
@@ -0,0 +1,122 @@
+import math
+import statistics
+from typing import List, Dict, Tuple, Callable, Optional
+
+# two sided 95% student t quantiles by degrees of freedom, the normal one past the table
+t95: List[float] = [ math.inf, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+	2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064,
+	2.060, 2.056, 2.052, 2.048, 2.045, 2.042 ]
+
+def t_quantile(df: int) -> float:
+	return t95[df] if df < len(t95) else 1.960
+
+# mean and half width of its 95% confidence interval, inf with fewer than two samples
+def confidence(xs: List[float]) -> Tuple[float, float]:
+	if not xs:
+		return math.nan, math.inf
+	if len(xs) < 2:
+		return xs[0], math.inf
+	return statistics.mean(xs), t_quantile(len(xs) - 1) * statistics.stdev(xs) / math.sqrt(len(xs))
+
+# one configuration: run() runs it once more, samples() are the measurements of every run so far,
+# earlier campaigns' included
+class rep_spec:
+	def __init__(self, name: str, run: Callable[[], None], samples: Callable[[], List[float]]) -> None:
+		self.name: str = name
+		self.run: Callable[[], None] = run
+		self.samples: Callable[[], List[float]] = samples
+		# runs started here, a run that timed out adds no sample but still counts against the cap
+		self.issued: int = 0
+
+	# half width of the confidence interval relative to the mean
+	def width(self) -> float:
+		mean, half = confidence(self.samples())
+		return half / abs(mean) if mean else math.inf
+
+# reruns every configuration until its confidence interval is within target of its mean, at least
+# min_reps and at most max_reps times. a pair of configurations being compared gets more runs,
+# noisier side first, until the interval of their difference either excludes zero or fits within
+# target of their means, whichever comes first. compare holds (a, b) substrings, every
+# configuration whose name has a is compared to the one with a replaced by b: ("-MMW180", "-WMM300")
+# pairs mixes of one campaign, ("-m3-", "-default-") each mix across two campaigns.
+# every round runs each configuration that still needs it once, noisiest first.
+class rep_controller:
+	def __init__(self, target: float = 0.05, min_reps: int = 3, max_reps: int = 10,
+			compare: List[Tuple[str, str]] = None) -> None:
+		self.target: float = target
+		self.min_reps: int = min_reps
+		self.max_reps: int = max_reps
+		self.compare: List[Tuple[str, str]] = compare if compare else []
+		self.specs: Dict[str, rep_spec] = {}
+		self.rounds: int = 0
+
+	# the same name twice is the same configuration, a count loop around the run_* function adds nothing
+	def add(self, name: str, run: Callable[[], None], samples: Callable[[], List[float]]) -> None:
+		if name not in self.specs:
+			self.specs[name] = rep_spec(name, run, samples)
+
+	def pairs(self) -> List[Tuple[rep_spec, rep_spec]]:
+		out: List[Tuple[rep_spec, rep_spec]] = []
+		for a, b in self.compare:
+			for name, s in self.specs.items():
+				other = name.replace(a, b)
+				if a in name and other != name and other in self.specs:
+					out.append((s, self.specs[other]))
+		return out
+
+	# "faster", "slower" or "same" when the pair is decided, None while it is not
+	def verdict(self, a: rep_spec, b: rep_spec) -> Optional[str]:
+		ma, ha = confidence(a.samples())
+		mb, hb = confidence(b.samples())
+		if math.isinf(ha) or math.isinf(hb):
+			return None
+		diff = ma - mb
+		half = math.sqrt(ha ** 2 + hb ** 2)
+		if abs(diff) > half:
+			return "faster" if diff < 0 else "slower"
+		if abs(diff) + half <= self.target * (abs(ma) + abs(mb)) / 2:
+			return "same"
+		return None
+
+	def capped(self, s: rep_spec) -> bool:
+		return s.issued >= self.max_reps or len(s.samples()) >= self.max_reps
+
+	# the configurations that need another run, noisiest first
+	def due(self) -> List[rep_spec]:
+		need: Dict[str, float] = {}
+		for s in self.specs.values():
+			if self.capped(s):
+				continue
+			if len(s.samples()) < self.min_reps or s.width() > self.target:
+				need[s.name] = s.width()
+		for a, b in self.pairs():
+			if self.verdict(a, b) is None:
+				for s in (a, b):
+					if not self.capped(s):
+						need[s.name] = s.width()
+		return sorted([ self.specs[name] for name in need ], key=lambda s: -s.width())
+
+	# execute runs one round's runs, side by side if it likes
+	def run(self, execute: Callable[[List[Callable[[], None]]], None]) -> None:
+		while True:
+			due = self.due()
+			if not due:
+				break
+			self.rounds += 1
+			print("== repetition round {}: {}".format(self.rounds, ' '.join([ s.name for s in due ])))
+			for s in due:
+				s.issued += 1
+			execute([ s.run for s in due ])
+
+	def report(self) -> None:
+		issued = sum([ s.issued for s in self.specs.values() ])
+		print("{:<40} {:>5} {:>10} {:>8}".format("configuration", "runs", "mean", "+-"))
+		for s in self.specs.values():
+			xs = s.samples()
+			mean, half = confidence(xs)
+			print("{:<40} {:>5} {:>9.1f}s {:>7.1%}{}".format(s.name, len(xs), mean, half / mean if mean else math.inf,
+				"" if s.width() <= self.target else "  (capped)" if self.capped(s) else ""))
+		for a, b in self.pairs():
+			print("{} vs {}: {}".format(a.name, b.name, self.verdict(a, b) or "undecided"))
+		print("== {} runs in {} rounds, a fixed count of {} would take {}".format(issued, self.rounds,
+			self.max_reps, self.max_reps * len(self.specs)))
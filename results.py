@@ -0,0 +1,176 @@
+import os
+import re
+import json
+import numpy as np
+from typing import List, Dict, Tuple, Any
+
+from apps import memify
+from manifest import read_test
+
+# one row per application per test, test level fields repeated on every row of the test
+fields: List[Tuple[str, Any]] = [
+	("test", "U256"),
+	("prefix", "U64"),
+	("label", "U64"),
+	("config", "U32"),
+	("mix", "U16"),
+	("delay", "i8"),
+	("app", "U32"),
+	("type", "U32"),
+	("workload", "U64"),
+	("heap", "i8"),
+	("cores", "i8"),
+	("mem_frac", "f8"),
+	("mem_storage_frac", "f8"),
+	("sigve", "?"),
+	("sigve_n", "i8"),
+	("sigve_f", "f8"),
+	("sigve_top", "i8"),
+	("sigve_low_wm_init", "i8"),
+	("sigve_high_wm_init", "i8"),
+	("sigve_wm_increment_percent", "i8"),
+	("sigve_kill_time", "i8"),
+	("timeout", "?"),
+	# aborted by the watchdog for making no progress, apart from running too long
+	("stall", "?"),
+	("start", "i8"),
+	("end", "i8"),
+	("runtime", "f8"),
+]
+dtype = np.dtype(fields)
+
+mix_re = re.compile(r"^([A-Z]+)(\d+)$")
+
+def num(kv: Dict[str, str], key: str, default: float = -1) -> float:
+	try:
+		return float(kv[key])
+	except (KeyError, ValueError):
+		return default
+
+# "artifact-m3-MCM180" -> ("artifact", "m3", "MCM", 180)
+def parse_name(name: str) -> Tuple[str, str, str, int]:
+	parts = name.split('-')
+	m = mix_re.match(parts[-1])
+	if len(parts) < 3 or not m:
+		return name, "", "", -1
+	return parts[0], '-'.join(parts[1:-1]), m.group(1), int(m.group(2))
+
+def signature(test_dir: str) -> float:
+	paths = [ test_dir, test_dir + "/manifest.json", test_dir + "/conf", test_dir + "/info", test_dir + "/timeout",
+		test_dir + "/stall" ]
+	return max(os.stat(p).st_mtime for p in paths if os.path.exists(p))
+
+def parse_test(test_dir: str) -> List[Tuple]:
+	confs, info = read_test(test_dir)
+	test_conf = confs.get("test", {})
+	sigve = confs.get("sigve", {})
+	prefix, label, mix, delay = parse_name(os.path.basename(os.path.dirname(os.path.abspath(test_dir))))
+	start = int(num(info, "start", 0))
+	end = int(num(info, "end", 0))
+	runtime = (end - start) / 1e9 if start and end else np.nan
+
+	rows: List[Tuple] = []
+	for name, kv in sorted(confs.items()):
+		if kv.get("type") not in ("hibench_spark", "detc", "memcached"):
+			continue
+		if kv["type"] == "hibench_spark":
+			heap = memify(kv["xmx"]) if kv.get("xmx") else -1
+		else:
+			heap = int(num(kv, "size_gb")) * 1024 * 1024 * 1024
+		rows.append((test_dir, prefix, label, test_conf.get("conf", "").split('.')[-1], mix, delay,
+			name, kv["type"], kv.get("workload", kv["type"]), heap, int(num(kv, "cores")),
+			num(kv, "mem_fraction"), num(kv, "mem_storage_fraction"),
+			kv.get("sigve", "False") == "True" or kv.get("use_sigve") == "1",
+			int(num(kv, "sigve_n")), num(kv, "sigve_f"),
+			int(num(sigve, "top")), int(num(sigve, "low_wm_init")), int(num(sigve, "high_wm_init")),
+			int(num(sigve, "wm_increment_percent")), int(num(sigve, "kill_time")),
+			os.path.exists(test_dir + "/timeout"), os.path.exists(test_dir + "/stall"), start, end, runtime))
+	return rows
+
+class result_set:
+	def __init__(self, rows: np.ndarray) -> None:
+		self.rows: np.ndarray = rows
+
+	def __len__(self) -> int:
+		return len(self.rows)
+
+	def tests(self) -> np.ndarray:
+		return np.unique(self.rows["test"])
+
+	def column(self, name: str, per_test: bool = True) -> np.ndarray:
+		# test level columns are repeated per app, count each test once
+		if per_test:
+			_, idx = np.unique(self.rows["test"], return_index=True)
+			return self.rows[name][idx]
+		return self.rows[name]
+
+	def completed(self) -> "result_set":
+		return result_set(self.rows[~self.rows["timeout"] & ~self.rows["stall"] & ~np.isnan(self.rows["runtime"])])
+
+	def median(self, name: str = "runtime") -> float:
+		col = self.completed().column(name)
+		return float(np.median(col)) if len(col) else np.nan
+
+	def mean(self, name: str = "runtime") -> float:
+		col = self.completed().column(name)
+		return float(np.mean(col)) if len(col) else np.nan
+
+# columnar store over every prefix-config-MIX/test-N under root. the parsed rows live in one
+# numpy record array on disk, a rescan only re-parses test dirs whose mtimes changed.
+class results_store:
+	def __init__(self, root: str = ".", store: str = None) -> None:
+		self.root: str = root
+		self.store: str = store if store else root + "/.results"
+		self.rows: np.ndarray = np.zeros(0, dtype=dtype)
+		self.index: Dict[str, float] = {}
+		if os.path.exists(self.store + "/rows.npy") and os.path.exists(self.store + "/index.json"):
+			rows = np.load(self.store + "/rows.npy")
+			if rows.dtype == dtype:
+				self.rows = rows
+				with open(self.store + "/index.json") as f:
+					self.index = json.load(f)
+
+	def scan(self) -> Dict[str, float]:
+		found: Dict[str, float] = {}
+		for d in os.listdir(self.root):
+			path = self.root + '/' + d
+			if d.startswith('.') or not os.path.isdir(path):
+				continue
+			for t in os.listdir(path):
+				if t.startswith("test-"):
+					found[path + '/' + t] = signature(path + '/' + t)
+		return found
+
+	def ingest(self) -> int:
+		found = self.scan()
+		stale = [ t for t in self.index if found.get(t) != self.index[t] ]
+		fresh = [ t for t in found if self.index.get(t) != found[t] ]
+		if not stale and not fresh:
+			return 0
+		keep = ~np.isin(self.rows["test"], stale) if stale else np.ones(len(self.rows), dtype=bool)
+		rows: List[Tuple] = []
+		for t in fresh:
+			rows.extend(parse_test(t))
+		self.rows = np.concatenate([ self.rows[keep], np.array(rows, dtype=dtype) ])
+		self.index = found
+		self.save()
+		return len(fresh)
+
+	def save(self) -> None:
+		os.makedirs(self.store, exist_ok=True)
+		np.save(self.store + "/rows.tmp.npy", self.rows)
+		os.replace(self.store + "/rows.tmp.npy", self.store + "/rows.npy")
+		with open(self.store + "/index.tmp", 'w') as f:
+			json.dump(self.index, f)
+		os.replace(self.store + "/index.tmp", self.store + "/index.json")
+
+	# equality on any column, e.g. query(config="sigve", mix="MCM", delay=180, mem_frac=0.7)
+	def query(self, **where: Any) -> result_set:
+		mask = np.ones(len(self.rows), dtype=bool)
+		for k, v in where.items():
+			col = self.rows[k]
+			if col.dtype.kind == 'f':
+				mask &= np.isclose(col, v)
+			else:
+				mask &= col == v
+		return result_set(self.rows[mask])
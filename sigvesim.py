@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import sys
+import argparse
+import itertools
+import numpy as np
+from typing import List, Dict, Tuple, Any
+
+import memtrace
+from apps import sigve_conf, memify
+
+# replays recorded memory traces through a model of the sigve watermark controller, every
+# combination of sigve_conf knobs at once: the controller state is one array entry per
+# combination, so a sweep costs one pass over the trace. per poll_time tick the model does:
+#   - each app uses its recorded rss, held down to a cap while it is shrunk
+#   - above high_wm every app is asked to shrink and gives back expected_shrink percent
+#   - under low_wm the caps are lifted again
+#   - above top for kill_time ms the largest app is killed and stays gone
+#   - every high_wm_period ticks high_wm rises by wm_increment_percent if nothing was shrunk
+#     since, up to high_wm_pool percent of top, and otherwise drops by 1/high_wm_ratio of itself.
+#     low_wm moves the same way with its own period and ratio and never passes high_wm.
+# it is a model of the daemon, not its code: it ranks settings, the cluster has the last word.
+
+sizes: List[str] = [ "top", "low_wm_init", "high_wm_init" ]
+knobs: List[str] = [ "top", "low_wm_init", "high_wm_init", "low_wm_ratio", "high_wm_ratio", "low_wm_period",
+	"high_wm_period", "wm_increment_percent", "high_wm_pool", "expected_shrink", "kill_time", "poll_time" ]
+
+metrics: List[Tuple[str, Any]] = [
+	("kills", "i8"),
+	("shrinks", "i8"),
+	("peak", "i8"),
+	("mean", "f8"),
+	# memory the caps kept from the apps, GB seconds
+	("withheld", "f8"),
+]
+
+# every combination of the given knob values, the rest at sigve_conf's defaults. sizes may be
+# given like sigve_conf takes them ("56g").
+def grid(space: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+	defaults = vars(sigve_conf(""))
+	values: List[List[int]] = []
+	for k in knobs:
+		vs = space.get(k, [ defaults[k] ])
+		values.append([ memify(v) if isinstance(v, str) else int(v) for v in vs ])
+	combos = np.array(list(itertools.product(*values)), dtype=np.int64).reshape(-1, len(knobs))
+	params = { k: combos[:, i] for i, k in enumerate(knobs) }
+	# watermarks have to be ordered under top
+	ok = (params["low_wm_init"] <= params["high_wm_init"]) & (params["high_wm_init"] <= params["top"])
+	return { k: v[ok] for k, v in params.items() }
+
+# usage is ticks x apps bytes at one poll_time, params all combinations with that poll_time
+def simulate(usage: np.ndarray, params: Dict[str, np.ndarray], poll_ms: float) -> Dict[str, np.ndarray]:
+	n = len(params["top"])
+	ticks, apps = usage.shape
+	top = params["top"].astype(np.float64)
+	high = params["high_wm_init"].astype(np.float64)
+	low = params["low_wm_init"].astype(np.float64)
+	pool = top * params["high_wm_pool"] / 100
+	grow = 1 + params["wm_increment_percent"] / 100
+	keep = (1 - params["expected_shrink"] / 100)[:, None]
+	high_period = np.maximum(params["high_wm_period"], 1)
+	low_period = np.maximum(params["low_wm_period"], 1)
+	high_ratio = np.maximum(params["high_wm_ratio"], 1)
+	low_ratio = np.maximum(params["low_wm_ratio"], 1)
+	kill_ticks = np.maximum(np.ceil(params["kill_time"] / poll_ms), 1)
+
+	cap = np.full((n, apps), np.inf)
+	alive = np.ones((n, apps), dtype=bool)
+	over = np.zeros(n)
+	shrunk_high = np.zeros(n, dtype=bool)
+	shrunk_low = np.zeros(n, dtype=bool)
+	kills = np.zeros(n, dtype=np.int64)
+	shrinks = np.zeros(n, dtype=np.int64)
+	peak = np.zeros(n)
+	total_sum = np.zeros(n)
+	withheld = np.zeros(n)
+	rows = np.arange(n)
+
+	for t in range(ticks):
+		wanted = np.where(alive, usage[t][None, :], 0)
+		used = np.minimum(wanted, cap)
+		total = used.sum(axis=1)
+		withheld += (wanted - used).sum(axis=1)
+		peak = np.maximum(peak, total)
+		total_sum += total
+
+		shrink = total > high
+		cap = np.where(shrink[:, None], used * keep, cap)
+		shrinks += shrink
+		shrunk_high |= shrink
+		shrunk_low |= shrink
+		cap[total < low] = np.inf
+
+		over = np.where(total > top, over + 1, 0)
+		kill = over >= kill_ticks
+		if kill.any():
+			alive[rows[kill], np.argmax(used[kill], axis=1)] = False
+			kills += kill
+			over[kill] = 0
+
+		due = (t + 1) % high_period == 0
+		high = np.where(due & ~shrunk_high, np.minimum(high * grow, pool), high)
+		high = np.where(due & shrunk_high, high - high / high_ratio, high)
+		shrunk_high &= ~due
+		due = (t + 1) % low_period == 0
+		low = np.where(due & ~shrunk_low, low * grow, low)
+		low = np.where(due & shrunk_low, low - low / low_ratio, low)
+		low = np.minimum(low, high)
+		shrunk_low &= ~due
+
+	return { "kills": kills, "shrinks": shrinks, "peak": peak.astype(np.int64),
+		"mean": total_sum / max(ticks, 1), "withheld": withheld * poll_ms / 1e3 / 2**30 }
+
+# one baker's pids as ticks x apps rss, sampled every poll_ms. a pid is 0 outside its samples.
+def usage(tr: memtrace.mem_trace, poll_ms: float) -> np.ndarray:
+	series = tr.rss()
+	if not series:
+		return np.zeros((0, 0))
+	start = min([ t[0] for t, _ in series.values() ])
+	end = max([ t[-1] for t, _ in series.values() ])
+	grid_ns = np.arange(start, end + 1, poll_ms * 1e6)
+	return np.stack([ np.interp(grid_ns, t, rss, left=0, right=0) for t, rss in series.values() ], axis=1)
+
+# every combination against every baker of every test, kills and shrinks summed over the
+# bakers, peak the highest. best first: fewest kills, then fewest shrinks, then least withheld.
+def sweep(test_homes: List[str], params: Dict[str, np.ndarray]) -> np.ndarray:
+	n = len(params["top"])
+	out = np.zeros(n, dtype=[ (k, "i8") for k in knobs ] + metrics)
+	for k in knobs:
+		out[k] = params[k]
+	traces = [ tr for home in test_homes for tr in memtrace.load(home).values() if len(tr.pids) ]
+	if not traces:
+		print("[warn] no memory traces in {}".format(' '.join(test_homes)))
+		return out
+	for poll_ms in np.unique(params["poll_time"]):
+		sel = params["poll_time"] == poll_ms
+		sub = { k: v[sel] for k, v in params.items() }
+		for tr in traces:
+			res = simulate(usage(tr, float(poll_ms)), sub, float(poll_ms))
+			out["kills"][sel] += res["kills"]
+			out["shrinks"][sel] += res["shrinks"]
+			out["peak"][sel] = np.maximum(out["peak"][sel], res["peak"])
+			out["mean"][sel] += res["mean"] / len(traces)
+			out["withheld"][sel] += res["withheld"]
+	return out[np.lexsort((out["withheld"], out["shrinks"], out["kills"]))]
+
+# a row of sweep() as the sigve_conf to run it with
+def to_conf(row: np.void, home: str) -> sigve_conf:
+	sc = sigve_conf(home)
+	for k in knobs:
+		setattr(sc, k, int(row[k]))
+	return sc
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("tests", nargs="+", help="test-N dirs with mem_sampler traces")
+	parser.add_argument("--knob", action="append", default=[],
+		help="knob=v1,v2,... e.g. high_wm_init=50g,55g, repeatable")
+	parser.add_argument("--show", type=int, default=20)
+	args = parser.parse_args()
+
+	space: Dict[str, List[Any]] = {
+		"low_wm_init": [ "40g", "45g", "50g" ],
+		"high_wm_init": [ "45g", "50g", "55g" ],
+		"wm_increment_percent": [ 0, 1, 2, 5 ],
+		"expected_shrink": [ 10, 30, 50 ],
+		"kill_time": [ 10000, 30000 ],
+	}
+	for kv in args.knob:
+		k, vs = kv.split('=', 1)
+		if k not in knobs:
+			print("[error] unknown knob {}, one of {}".format(k, ' '.join(knobs)))
+			sys.exit(1)
+		space[k] = vs.split(',')
+	params = grid(space)
+	res = sweep(args.tests, params)
+	print("{} settings".format(len(res)))
+	names = [ k for k in knobs if len(np.unique(params[k])) > 1 ]
+	print(' '.join([ "{:>14}".format(k) for k in names ]) + "  kills shrinks  peak(g)  mean(g)  withheld(gs)")
+	for row in res[:args.show]:
+		print(' '.join([ "{:>14}".format("{:.1f}g".format(row[k] / 2**30) if k in sizes else row[k]) for k in names ]) +
+			"  {:>5} {:>7} {:>8.2f} {:>8.2f} {:>13.1f}".format(
+			row["kills"], row["shrinks"], row["peak"] / 2**30, row["mean"] / 2**30, row["withheld"]))
+
+if __name__ == "__main__":
+	main()
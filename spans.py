@@ -0,0 +1,112 @@
+import os
+import json
+import threading
+import contextlib
+from time import clock_gettime, CLOCK_REALTIME
+from typing import List, Dict, Tuple, Any, Iterator, ContextManager
+
+# complete ("X") events in the chrome trace format, which perfetto and chrome://tracing open.
+# process 0 has a lane per harness thread, process 1 a lane per host for the remote commands.
+# categories: "run" spans enclose the workload, "workload" is the workload itself, "lifecycle"
+# and "ready" are harness work, "cmd" and "step" are remote commands and batch steps.
+harness_pid: int = 0
+hosts_pid: int = 1
+
+class span_tracer:
+	def __init__(self, enabled: bool = True) -> None:
+		self.enabled: bool = enabled
+		self.events: List[Dict[str, Any]] = []
+		self.lanes: Dict[Tuple[int, str], int] = {}
+		self.lock: threading.Lock = threading.Lock()
+
+	def lane(self, pid: int, name: str) -> int:
+		if (pid, name) not in self.lanes:
+			self.lanes[(pid, name)] = len(self.lanes) + 1
+		return self.lanes[(pid, name)]
+
+	def complete(self, name: str, cat: str, start: float, end: float, host: str = None,
+			args: Dict[str, Any] = None) -> None:
+		if not self.enabled:
+			return
+		pid = hosts_pid if host else harness_pid
+		with self.lock:
+			tid = self.lane(pid, host if host else threading.current_thread().name)
+			self.events.append({ "name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+				"ts": start * 1e6, "dur": max(0.0, end - start) * 1e6, "args": args if args else {} })
+
+	@contextlib.contextmanager
+	def span(self, name: str, cat: str = "lifecycle", host: str = None, **args: Any) -> Iterator[None]:
+		start = clock_gettime(CLOCK_REALTIME)
+		try:
+			yield
+		finally:
+			self.complete(name, cat, start, clock_gettime(CLOCK_REALTIME), host, args)
+
+	def chrome(self) -> Dict[str, Any]:
+		meta: List[Dict[str, Any]] = [
+			{ "name": "process_name", "ph": "M", "pid": harness_pid, "args": { "name": "harness" } },
+			{ "name": "process_name", "ph": "M", "pid": hosts_pid, "args": { "name": "hosts" } },
+		]
+		with self.lock:
+			for (pid, name), tid in self.lanes.items():
+				meta.append({ "name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": { "name": name } })
+			events = list(self.events)
+		return { "traceEvents": meta + events, "displayTimeUnit": "ms" }
+
+	def dump(self, path: str) -> None:
+		tmp = path + ".tmp"
+		with open(tmp, 'w') as f:
+			json.dump(self.chrome(), f)
+		os.replace(tmp, path)
+
+	# seconds per lifecycle span name and per host, and how much of the whole run the workload
+	# phases cover. overhead is everything else: setup, teardown, waits and gaps.
+	def summary(self, total: str = "test") -> Dict[str, Any]:
+		with self.lock:
+			events = list(self.events)
+		tops = [ e for e in events if e["name"] == total and e["pid"] == harness_pid ]
+		if not tops:
+			return {}
+		top = tops[-1]
+		workload = merged([ (e["ts"], e["ts"] + e["dur"]) for e in events if e["cat"] == "workload" ])
+		busy = sum([ end - start for start, end in workload ])
+		lifecycle: Dict[str, float] = {}
+		for e in events:
+			if e["pid"] == harness_pid and e["cat"] in ("lifecycle", "ready"):
+				lifecycle[e["name"]] = lifecycle.get(e["name"], 0.0) + e["dur"] / 1e6
+		hosts: Dict[str, float] = {}
+		names = { tid: name for (pid, name), tid in self.lanes.items() if pid == hosts_pid }
+		for e in events:
+			if e["pid"] == hosts_pid:
+				hosts[names[e["tid"]]] = hosts.get(names[e["tid"]], 0.0) + e["dur"] / 1e6
+		wall = top["dur"] / 1e6
+		return {
+			"wall_secs": wall,
+			"workload_secs": busy / 1e6,
+			"overhead_secs": wall - busy / 1e6,
+			"overhead_share": (wall - busy / 1e6) / wall if wall > 0 else 0.0,
+			"lifecycle_secs": dict(sorted(lifecycle.items(), key=lambda kv: -kv[1])),
+			"remote_secs": hosts,
+		}
+
+def merged(intervals: List[Tuple[float, float]]) -> List[Tuple[float, float]]:
+	out: List[Tuple[float, float]] = []
+	for start, end in sorted(intervals):
+		if out and start <= out[-1][1]:
+			out[-1] = (out[-1][0], max(out[-1][1], end))
+		else:
+			out.append((start, end))
+	return out
+
+_tracer: span_tracer = span_tracer(enabled=False)
+
+def tracing() -> span_tracer:
+	return _tracer
+
+def use_tracer(t: span_tracer) -> span_tracer:
+	global _tracer
+	_tracer = t
+	return t
+
+def span(name: str, cat: str = "lifecycle", host: str = None, **args: Any) -> ContextManager[None]:
+	return _tracer.span(name, cat, host, **args)
@@ -0,0 +1,111 @@
+import signal
+import threading
+from time import clock_gettime, CLOCK_MONOTONIC
+from typing import List, Dict, Callable, Optional
+
+from remote import job, executor, owning
+
+# one step of a teardown. jobs names the long running jobs it stops and the commands other threads
+# run for it, which escalation signals along with every command the step itself started, all of
+# them tagged owner.
+class step:
+	def __init__(self, name: str, owner: str, fn: Callable[[], None], after: List[str] = None,
+			jobs: Callable[[], List[job]] = None) -> None:
+		self.name: str = name
+		self.owner: str = owner
+		self.fn: Callable[[], None] = fn
+		self.after: List[str] = after if after else []
+		self.jobs: Optional[Callable[[], List[job]]] = jobs
+		self.thread: threading.Thread = None
+		self.finished: bool = False
+		# pending, running, done or failed, terminated or killed when it finished only after
+		# escalation, stuck when not even then, skipped when it never started
+		self.state: str = "pending"
+
+	def ok(self) -> bool:
+		return self.state == "done"
+
+# runs every step as soon as the steps it comes after are out of the way, independent ones side
+# by side, all under one deadline. past the deadline the commands of the steps still running get
+# a TERM, grace seconds later a KILL, and a step still running grace seconds after that is left
+# behind as stuck. steps not started by then are skipped, the next test's clean gets them.
+class teardown_graph:
+	def __init__(self, name: str, deadline: float = 300, grace: float = 10) -> None:
+		self.name: str = name
+		self.deadline: float = deadline
+		self.grace: float = grace
+		self.steps: Dict[str, step] = {}
+		self.changed: threading.Condition = threading.Condition()
+
+	def add(self, name: str, fn: Callable[[], None], after: List[str] = None,
+			jobs: Callable[[], List[job]] = None) -> None:
+		self.steps[name] = step(name, self.name + ':' + name, fn, [ a for a in (after if after else []) if a in self.steps ],
+			jobs)
+
+	def drive(self, s: step) -> None:
+		state = "done"
+		try:
+			with owning(s.owner):
+				s.fn()
+		except Exception as e:
+			print("[error] {}: {} failed: {!r}".format(self.name, s.name, e))
+			state = "failed"
+		with self.changed:
+			# after escalation the state says how it was stopped
+			if s.state == "running":
+				s.state = state
+			s.finished = True
+			self.changed.notify_all()
+
+	def ready(self, s: step) -> bool:
+		return s.state == "pending" and all([ self.steps[a].finished for a in s.after ])
+
+	def start(self) -> None:
+		for s in self.steps.values():
+			if self.ready(s):
+				s.state = "running"
+				s.thread = threading.Thread(target=self.drive, args=(s,), name=s.owner, daemon=True)
+				s.thread.start()
+
+	def running(self) -> List[step]:
+		return [ s for s in self.steps.values() if s.thread and not s.finished ]
+
+	def wait(self, until: float) -> None:
+		with self.changed:
+			while self.running() and clock_gettime(CLOCK_MONOTONIC) < until:
+				self.changed.wait(until - clock_gettime(CLOCK_MONOTONIC))
+
+	def escalate(self, sig: int, state: str) -> None:
+		with self.changed:
+			for s in self.running():
+				s.state = state
+				jobs = executor().owned(s.owner) + (s.jobs() if s.jobs else [])
+				print("[warn] {}: {} past the deadline, {} {} job(s)".format(self.name, s.name,
+					"terminating" if sig == signal.SIGTERM else "killing", len(jobs)))
+				for j in jobs:
+					j.signal(sig)
+
+	# the steps that did not finish cleanly
+	def run(self) -> List[step]:
+		deadline = clock_gettime(CLOCK_MONOTONIC) + self.deadline
+		with self.changed:
+			self.start()
+			while self.running() and clock_gettime(CLOCK_MONOTONIC) < deadline:
+				self.changed.wait(deadline - clock_gettime(CLOCK_MONOTONIC))
+				self.start()
+		if self.running():
+			self.escalate(signal.SIGTERM, "terminated")
+			self.wait(clock_gettime(CLOCK_MONOTONIC) + self.grace)
+		if self.running():
+			self.escalate(signal.SIGKILL, "killed")
+			self.wait(clock_gettime(CLOCK_MONOTONIC) + self.grace)
+		with self.changed:
+			for s in self.steps.values():
+				if s.state == "pending":
+					s.state = "skipped"
+				elif not s.finished:
+					s.state = "stuck"
+			bad = [ s for s in self.steps.values() if not s.ok() ]
+		for s in bad:
+			print("[error] {}: {} {}".format(self.name, s.name, s.state))
+		return bad
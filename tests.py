@@ -1,6 +1,15 @@
 from apps import *
+from journal import *
+from spans import span_tracer, use_tracer
+from manifest import manifest
+from teardown import teardown_graph, step
+from watchdog import watchdog
+import memtier
+import markbench
 import sys
-from typing import List, NoReturn, Any, Tuple, Set
+import json
+import threading
+from typing import List, NoReturn, Any, Tuple, Set, Dict, Callable, Optional
 from pathlib import Path
 import copy
 from enum import Enum
@@ -12,7 +21,50 @@ class config(Enum):
 	pure_default = 3
 	global_optimal = 4
 
+# one step of a benchmark's pipeline. its command runs once per host (None runs it on the harness),
+# at most concurrency of them at a time (0 for all), once the phase it comes after finished cleanly,
+# or finished at all unless strict.
+class phase:
+	def __init__(self, name: str, cmd: Callable[[Optional[str]], List[str]], hosts: List[Optional[str]],
+			log_fn: Callable[[Optional[str]], Tuple[str, str]], after: str = None, concurrency: int = 0,
+			measured: bool = False, env: Dict[str, str] = None, strict: bool = True) -> None:
+		self.name: str = name
+		self.cmd: Callable[[Optional[str]], List[str]] = cmd
+		self.hosts: List[Optional[str]] = hosts
+		self.log_fn: Callable[[Optional[str]], Tuple[str, str]] = log_fn
+		self.after: str = after
+		self.concurrency: int = concurrency
+		self.measured: bool = measured
+		self.env: Dict[str, str] = env
+		self.strict: bool = strict
+
+		self.start: float = 0
+		self.end: float = 0
+		self.skipped: bool = False
+		self.results: List[result] = []
+		self.finished: threading.Event = threading.Event()
+
+	def ok(self) -> bool:
+		return not self.skipped and all([ r.ok() for r in self.results ])
+
+	def run(self) -> None:
+		self.start = clock_gettime(CLOCK_REALTIME)
+		limit = self.concurrency if self.concurrency > 0 else len(self.hosts)
+		running: List[job] = []
+		for host in self.hosts:
+			if len(running) >= limit:
+				self.results.append(wait_and_report(running.pop(0)))
+			stdout, stderr = self.log_fn(host)
+			running.append(executor().submit(self.cmd(host), host, stdout, stderr,
+				timeout=None, env=self.env, bounded=False))
+		for j in running:
+			self.results.append(wait_and_report(j))
+		self.end = clock_gettime(CLOCK_REALTIME)
+
 class benchmark:
+	# what in its phase logs means work got done, None for any new output
+	progress_marker: Optional[bytes] = None
+
 	def __init__(self, bakers: Set[str], delay: int = 0) -> None:
 		self.order: int
 		self.name: str
@@ -20,20 +72,64 @@ class benchmark:
 		self.bakers: Set[str] = bakers
 		self.delay: int = delay
 		self.apps: List[application] = []
-
-	def write_conf(self) -> None:
-		print("running benchmark.write_conf")
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("order {}\n".format(self.order))
-			conf_f.write("name {}\n".format(self.name))
-			conf_f.write("test_home {}\n".format(self.test_home))
-			conf_f.write("apps {}\n".format(' '.join([ app.name for app in self.apps ])))
-			conf_f.write("delay {}\n".format(self.delay))
+		self.phases: List[phase] = []
+
+	def describe(self) -> Dict[str, Any]:
+		return {
+			"type": type(self).__name__,
+			"order": self.order,
+			"name": self.name,
+			"test_home": self.test_home,
+			"apps": [ app.name for app in self.apps ],
+			"delay": self.delay,
+		}
 	
-	def run(self) -> List[Tuple[subprocess.Popen, TextIO, TextIO]]:
+	# the phases of one run, built once name and test_home are known
+	def pipeline(self) -> List[phase]:
 		raise NotImplementedError
 
+	# every phase gets a thread that waits for the one it comes after, so independent chains
+	# overlap. runs in the benchmark's own launcher thread, the other benchmarks are not held up.
+	def run(self) -> List[job]:
+		print("running {}.run".format(self.name))
+		self.phases = self.pipeline()
+		by_name: Dict[str, phase] = { p.name: p for p in self.phases }
+
+		def drive(p: phase) -> None:
+			try:
+				if p.after:
+					dep = by_name[p.after]
+					dep.finished.wait()
+					if not dep.ok() and p.strict:
+						print("[warn] {}: skipping {}, {} did not finish cleanly".format(self.name, p.name, dep.name))
+						p.skipped = True
+						return
+					if not dep.ok():
+						print("[warn] {}: running {} anyway, {} did not finish cleanly".format(self.name, p.name, dep.name))
+				print("running {}.{}".format(self.name, p.name))
+				with span(self.name + '.' + p.name, "workload", measured=p.measured), owning(self.name + '.' + p.name):
+					p.run()
+			finally:
+				p.finished.set()
+
+		threads = [ threading.Thread(target=drive, args=(p,), name=self.name + '.' + p.name) for p in self.phases ]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		return []
+
+	# first to last second of the measured phases, load and warmup stay out of throughput numbers
+	def window(self) -> Optional[Tuple[float, float]]:
+		measured = [ p for p in self.phases if p.measured and p.end ]
+		if not measured:
+			return None
+		return min([ p.start for p in measured ]), max([ p.end for p in measured ])
+
+	# parse whatever the run left behind, after all of the test's benchmarks finished
+	def report(self) -> None:
+		pass
+
 	def prepare(self, test_home: str, order: int) -> None:
 		self.test_home =  test_home
 		self.order = order
@@ -46,8 +142,10 @@ class benchmark:
 class test:
 	_self: "test" = None
 	def __init__(self, test_home: str, conf: config, benchmarks: List[benchmark],
-			timeout: int = 0) -> None:
+			timeout: int = 0, partition: str = None) -> None:
+		os.mkdir(test_home)
 		self.test_home: str = test_home
+		self.partition: str = partition
 		self.conf: config = conf
 		self.benchmarks: List[benchmark] = benchmarks
 		self.bakers: Set[str] = set()
@@ -56,93 +154,229 @@ class test:
 			bm.prepare(self.test_home, i)
 		self.timeout: int = timeout
 		self.alarm: bool = False
+		# why the watchdog aborted the test, empty when it did not
+		self.stalled: str = ""
+		self.stall_secs: float = 600
+		self.thrash_secs: float = 300
 		self.daemons: List[daemon] = []
-		os.mkdir(test_home)
+		# set on teardown so benchmarks not launched yet never start
+		self.stopping: threading.Event = threading.Event()
+		self.starts: Dict[str, Tuple[float, float]] = {}
+		self.jobs: Dict[str, List[job]] = {}
+		self.launch_errors: List[BaseException] = []
+		self.teardown_secs: float = 300
+		self.teardown_grace: float = 10
 		os.mkdir(test_home + "/conf")
+		self.manifest: manifest = manifest(test_home)
 		test._self = self
 
 	def prologue(self) -> None:
 		print("running test.prologue")
-		for d in self.daemons:
-			d.prologue()
-			d.write_conf()
+		with span("test.prologue"):
+			# one round trip per baker for every daemon, cgroup and app setup step
+			cgroups: List[cgroup] = []
+			with span("test.setup"), batched(name="test.prologue") as b:
+				for d in self.daemons:
+					d.setup(b)
+				for bm in self.benchmarks:
+					for app in bm.apps:
+						if not app.init_done:
+							if app.cg and not app.cg.init_done and app.cg not in cgroups:
+								app.cg.prologue(b)
+								cgroups.append(app.cg)
+							app.setup(b)
+			for d in self.daemons:
+				with span(d.name + ".prologue"):
+					d.prologue()
+				self.manifest.add(d.name, d.describe())
+			for bm in self.benchmarks:
+				for app in bm.apps:
+					if not app.init_done:
+						if app.cg and not app.cg.init_done:
+							self.manifest.add("cgroup_" + app.cg.name, app.cg.describe())
+							app.cg.init_done = True
+						with span(app.name + ".prologue"):
+							app.prologue()
+						self.manifest.add(app.name, app.describe())
+						app.init_done = True
+				self.manifest.add(bm.name, bm.describe())
+			self.manifest.add("test", self.describe())
+			with span("test.write_manifest"):
+				self.manifest.write()
+
+	# the apps' epilogues side by side, then the daemons' (they watch the apps until those are gone,
+	# the spark log collector's last sync wants the executors dead), then the clean batch. bounded by
+	# teardown_secs, so a hung baker can not hold up the tests after this one.
+	def teardown(self) -> List[step]:
+		print("running test.teardown")
+		g = teardown_graph("test.teardown", self.teardown_secs, self.teardown_grace)
+		apps: List[application] = []
 		for bm in self.benchmarks:
 			for app in bm.apps:
-				if not app.init_done:
-					if app.cg and not app.cg.init_done:
-						app.cg.prologue()
-						app.cg.write_conf()
-						app.cg.init_done = True
-					app.prologue()
-					app.write_conf()
-					app.init_done = True
-			bm.write_conf()
-		self.write_conf()
-
-	def epilogue(self) -> None:
-		print("running test.epilogue")
-		for bm in self.benchmarks:
-			for app in bm.apps:
-				if not app.epilogue_done:
-					app.epilogue()
-					app.epilogue_done = True
-		for daemon in self.daemons:
-			daemon.epilogue()
+				if not app.epilogue_done and app not in apps:
+					apps.append(app)
+		for app in apps:
+			g.add(app.name + ".epilogue", lambda app=app: self.app_epilogue(app),
+				jobs=lambda app=app: getattr(app, "jobs", []))
+		epilogues = list(g.steps)
+		for d in self.daemons:
+			g.add(d.name + ".epilogue", lambda d=d: self.daemon_epilogue(d), after=epilogues, jobs=d.live_jobs)
+		g.add("test.clean", self.clean, after=list(g.steps))
+
+		self.manifest.info["teardown_start"] = int(clock_gettime(CLOCK_REALTIME) * 1e9)
+		with span("test.teardown"):
+			bad = g.run()
+		self.manifest.info["teardown_end"] = int(clock_gettime(CLOCK_REALTIME) * 1e9)
+		# run_benchmarks wrote the manifest before any of this
+		self.manifest.write()
+		if bad:
+			with open(self.test_home + "/teardown", 'w') as f:
+				f.write(''.join([ "{} {}\n".format(s.name, s.state) for s in bad ]))
+		return bad
+
+	def app_epilogue(self, app: application) -> None:
+		with span(app.name + ".epilogue"):
+			app.epilogue()
+		app.epilogue_done = True
+
+	def daemon_epilogue(self, d: daemon) -> None:
+		with span(d.name + ".epilogue"):
+			d.epilogue()
 
 	def clean(self) -> None:
 		print("running test.clean")
-		for daemon in self.daemons:
-			daemon.clean()
-		for bm in self.benchmarks:
-			for app in bm.apps:
-				if not app.clean_done:
-					app.clean()
-					app.clean_done = True
-		ssh_bakers(self.bakers, "/homes/liondavi/cluster-misc/bin/toogle_swap")
+		with span("test.clean"), batched(name="test.clean") as b:
+			for daemon in self.daemons:
+				daemon.clean(b)
+			for bm in self.benchmarks:
+				for app in bm.apps:
+					if not app.clean_done:
+						app.clean(b)
+						app.clean_done = True
+			b.add(self.bakers, tools["toogle_swap"])
 
 	def add_obs_daemon(self) -> None:
 		self.obs = obs_daemon(self.bakers, self.test_home)
 		self.daemons.append(self.obs)
 
+	def add_mem_sampler(self, interval: float = 0.02) -> None:
+		groups = [ app.cg.name for bm in self.benchmarks for app in bm.apps if app.cg ]
+		self.mem_sampler = mem_sampler(self.bakers, self.test_home, groups[0] if groups else "thermostat", interval)
+		self.daemons.append(self.mem_sampler)
+
+	def add_spark_log_collector(self, interval: float = 30) -> None:
+		sparks = [ app for bm in self.benchmarks for app in bm.apps if isinstance(app, hibench_spark) ]
+		if not sparks:
+			return
+		# every spark app of the test shares spark_home/work and spark_log_dir
+		hosts: Set[str] = set()
+		for app in sparks:
+			hosts.update(app.bakers)
+		self.collector = spark_log_collector(hosts, self.test_home, sparks[0].spark_home, interval)
+		for app in sparks:
+			app.collector = self.collector
+		self.daemons.append(self.collector)
+
 	def add_sigve_daemon(self, conf: sigve_conf) -> None:
 		self.sigve = sigve_daemon(self.bakers, self.test_home, conf)
 		self.daemons.append(self.sigve)
 
+	# every benchmark starts at its own offset from t0, the sum of its and the earlier delays,
+	# however long the earlier run() calls take (memcached_stress.run waits out its load phase)
+	def launch(self, bm: benchmark, offset: float, t0: float) -> None:
+		if self.stopping.wait(max(0, t0 + offset - clock_gettime(CLOCK_MONOTONIC))):
+			return
+		self.starts[bm.name] = (offset, clock_gettime(CLOCK_MONOTONIC) - t0)
+		try:
+			with span(bm.name + ".run", "run"):
+				self.jobs[bm.name] = bm.run()
+		except BaseException as e:
+			self.launch_errors.append(e)
+
 	def run(self) -> None:
 		print("running test.run")
+		wd = watchdog(self, stall_secs=self.stall_secs, thrash_secs=self.thrash_secs)
+		wd.start()
+		try:
+			with span("test.run", "run"):
+				self.run_benchmarks()
+		finally:
+			wd.stop()
+
+	def run_benchmarks(self) -> None:
 		start = clock_gettime(CLOCK_REALTIME)
-		bm_info: List[Tuple[subprocess.Popen, TextIO, TextIO]] = []
+		t0 = clock_gettime(CLOCK_MONOTONIC)
+		offset = 0
+		threads: List[threading.Thread] = []
 		for bm in self.benchmarks:
-			sleep(bm.delay)
-			bm_info.extend(bm.run())
+			offset += bm.delay
+			threads.append(threading.Thread(target=self.launch, args=(bm, offset, t0), name=bm.name))
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		if self.launch_errors:
+			raise self.launch_errors[0]
 
-		for proc, outlog, errlog in bm_info:
-			proc.wait()
-			if proc.returncode != 0:
-				print("[warn] ret: {} for: {}".format(proc.returncode, proc.args))
-			outlog.close()
-			errlog.close()
+		for bm in self.benchmarks:
+			for j in self.jobs.get(bm.name, []):
+				with span(bm.name + ".wait", "workload"):
+					wait_and_report(j)
+		for bm in self.benchmarks:
+			with span(bm.name + ".report"):
+				bm.report()
 
 		end = clock_gettime(CLOCK_REALTIME)
 
-		with open(self.test_home + "/info", "a") as info_f:
-			info_f.write("start {}\n".format(int(start * 1e9)))
-			info_f.write("end {}\n".format(int(end * 1e9)))
-
-	def write_conf(self) -> None:
-		print("running test.write_conf")
-		with open(self.test_home + "/conf/test", "a") as conf_f:
-			conf_f.write("type {}\n".format(type(self).__name__))
-			conf_f.write("bakers {}\n".format(' '.join(self.bakers)))
-			conf_f.write("test_home {}\n".format(self.test_home))
-			conf_f.write("conf {}\n".format(self.conf))
-			conf_f.write("benchmarks {}\n".format(' '.join([ bm.name for bm in self.benchmarks ])))
+		info = self.manifest.info
+		info["start"] = int(start * 1e9)
+		info["end"] = int(end * 1e9)
+		for bm in self.benchmarks:
+			if bm.name not in self.starts:
+				continue
+			intended, actual = self.starts[bm.name]
+			info["{}_intended_start".format(bm.name)] = int((start + intended) * 1e9)
+			info["{}_start".format(bm.name)] = int((start + actual) * 1e9)
+			if actual - intended > 1:
+				print("[warn] {} started {:.3f}s late".format(bm.name, actual - intended))
+		for bm in self.benchmarks:
+			for p in bm.phases:
+				if p.end:
+					info["{}_{}_start".format(bm.name, p.name)] = int(p.start * 1e9)
+					info["{}_{}_end".format(bm.name, p.name)] = int(p.end * 1e9)
+			window = bm.window()
+			if window:
+				info["{}_measure_start".format(bm.name)] = int(window[0] * 1e9)
+				info["{}_measure_end".format(bm.name)] = int(window[1] * 1e9)
+		self.manifest.write()
+
+	def describe(self) -> Dict[str, Any]:
+		return {
+			"type": type(self).__name__,
+			"bakers": sorted(self.bakers),
+			"test_home": self.test_home,
+			"conf": str(self.conf),
+			"benchmarks": [ bm.name for bm in self.benchmarks ],
+			"partition": self.partition,
+			"timeout": self.timeout,
+			"stall_secs": self.stall_secs,
+			"thrash_secs": self.thrash_secs,
+		}
+
+	# the commands of the phases still running once the test is torn down early, a hung driver
+	# outlives the executors its epilogue killed
+	def kill_phases(self) -> None:
+		for bm in self.benchmarks:
+			for p in bm.phases:
+				for j in executor().owned(bm.name + '.' + p.name):
+					j.kill()
 
 	@staticmethod
 	def feelssignalman(signum, frame) -> NoReturn:
 		print("running test.feelssignalman")
-		test._self.epilogue()
-		test._self.clean()
+		test._self.stopping.set()
+		test._self.teardown()
+		test._self.kill_phases()
 		if signum != signal.SIGALRM:
 			sys.exit(1)
 
@@ -159,14 +393,18 @@ class test_runner:
 		signal.alarm(t.timeout)
 
 		t.clean()
-		t.prologue()
+		try:
+			t.prologue()
+		except not_ready:
+			signal.alarm(0)
+			t.teardown()
+			raise
 
 		t.run()
 		if t.alarm:
 			return t.alarm
 
-		t.epilogue()
-		t.clean()
+		t.teardown()
 
 		return t.alarm
 
@@ -181,43 +419,88 @@ class test_runner:
 		else:
 			return 0
 
+	# trace.json opens in perfetto (ui.perfetto.dev) or chrome://tracing
+	@staticmethod
+	def write_trace(t: test, tracer: span_tracer) -> None:
+		tracer.dump(t.test_home + "/trace.json")
+		summary = tracer.summary()
+		if not summary:
+			return
+		with open(t.test_home + "/trace_summary.json", 'w') as f:
+			json.dump(summary, f, indent=1)
+		print("== {} harness overhead {:.1f}s of {:.1f}s ({:.1%}), top: {}".format(t.test_home,
+			summary["overhead_secs"], summary["wall_secs"], summary["overhead_share"],
+			", ".join([ "{} {:.1f}s".format(k, v) for k, v in list(summary["lifecycle_secs"].items())[:4] ])))
+
 	@staticmethod
 	def run_1time(base_path: str, conf: config, benchmarks: List[benchmark],
-			timeout: int = 45 * 60, _sigve_conf: sigve_conf = None) -> int:
+			timeout: int = 45 * 60, _sigve_conf: sigve_conf = None, partition: str = None,
+			journal: campaign_journal = None, journal_key: Tuple[str, int] = None) -> int:
 			#timeout: int = 90 * 60, _sigve_conf: sigve_conf = None) -> int:
 		i = test_runner.next_test_num(base_path)
-		if i == 0 and not os.path.exists(base_path):
-			os.mkdir(base_path)
-		_test = test("{}/test-{}".format(base_path, i), conf, benchmarks, timeout)
+		os.makedirs(base_path, exist_ok=True)
+		# with tests running side by side another one may take test-i first
+		while True:
+			try:
+				_test = test("{}/test-{}".format(base_path, i), conf, benchmarks, timeout, partition)
+				break
+			except FileExistsError:
+				i += 1
 		_test.add_obs_daemon()
+		_test.add_mem_sampler()
+		_test.add_spark_log_collector()
 		if _sigve_conf:
 			_test.add_sigve_daemon(_sigve_conf)
 		print("== running {}".format(_test.test_home))
-		if test_runner.run(_test):
+		if journal:
+			journal.start(journal_key, _test.test_home)
+		tracer = use_tracer(span_tracer())
+		try:
+			with span("test", "run"):
+				timed_out = test_runner.run(_test)
+		except not_ready as e:
+			print("[error] {} {}".format(_test.test_home, e))
+			with open(_test.test_home + "/not_ready", 'w') as f:
+				f.write("{}\n".format(e))
+			if journal:
+				journal.finish(journal_key, _test.test_home, "not_ready")
+			return 1
+		finally:
+			test_runner.write_trace(_test, tracer)
+			use_tracer(span_tracer(enabled=False))
+		if timed_out and _test.stalled:
+			print("[error] {} {}".format(_test.test_home, _test.stalled))
+			with open(_test.test_home + "/stall", 'w') as f:
+				f.write(_test.stalled + "\n")
+			if journal:
+				journal.finish(journal_key, _test.test_home, "stall")
+			return 1
+		if timed_out:
 			print("[error] {} timeout".format(_test.test_home))
 			Path(_test.test_home + "/timeout").touch()
+			if journal:
+				journal.finish(journal_key, _test.test_home, "timeout")
 			return 1
+		if journal:
+			journal.finish(journal_key, _test.test_home, "done")
 		return 0
 
 class hibench_stress(benchmark):
+	# the driver's and the executors' log line per finished task
+	progress_marker: Optional[bytes] = b"Finished task"
+
 	def __init__(self, bakers: Set[str], hibench: hibench_spark, delay: int = 0) -> None:
 		super(hibench_stress, self).__init__(bakers, delay)
 		self.hibench = hibench
 		self.apps.append(self.hibench)
 
-	def run(self) -> List[Tuple[subprocess.Popen, TextIO, TextIO]]:
-		print("running {}.run".format(self.name))
+	def pipeline(self) -> List[phase]:
 		env = os.environ.copy()
 		env["HIBENCH_CONF_FOLDER"] = self.hibench.conf_dir
-
-		outlog = open(self.hibench.test_log_dir + "/stdout.log", 'w')
-		errlog = open(self.hibench.test_log_dir + "/stderr.log", 'w')
-
-		proc = subprocess.Popen([
-			"{}/bin/workloads/{}/spark/run.sh".format(self.hibench.hibench_home, self.hibench.workload)
-		], stdout=outlog, stderr=errlog, env=env)
-
-		return [ (proc, outlog, errlog) ]
+		run_sh = "{}/bin/workloads/{}/spark/run.sh".format(self.hibench.hibench_home, self.hibench.workload)
+		log_dir = self.hibench.test_log_dir
+		return [ phase("run", lambda host: [ run_sh ], [ None ],
+			lambda host: (log_dir + "/stdout.log", log_dir + "/stderr.log"), measured=True, env=env) ]
 
 class detc_stress(benchmark):
 	def __init__(self, bakers: Set[str], _detc: detc, delay: int = 0,
@@ -232,21 +515,13 @@ class detc_stress(benchmark):
 		self.cores: int = cores
 		self.port: int = port
 	
-	def write_conf(self) -> None:
-		print("running detc_stress.write_conf")
-		super(detc_stress, self).write_conf()
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("clients {}\n".format(self.clients))
-			conf_f.write("requests {}\n".format(self.requests))
-			conf_f.write("keys {}\n".format(self.keys))
-			conf_f.write("cores {}\n".format(self.cores))
-			conf_f.write("server port {}\n".format(self.port))
-
-	def run(self) -> List[Tuple[subprocess.Popen, TextIO, TextIO]]:
-		print("running {}.run".format(self.name))
-
-		info: List[Tuple[subprocess.Popen, TextIO, TextIO]] = []
+	def describe(self) -> Dict[str, Any]:
+		fields = super(detc_stress, self).describe()
+		fields.update({ "clients": self.clients, "requests": self.requests, "keys": self.keys,
+			"cores": self.cores, "server port": self.port })
+		return fields
 
+	def pipeline(self) -> List[phase]:
 		"""
 		base_cmd: List[str] = [
 			"export", "GOMAXPROCS" + '=' + str(self.cores) + ';',
@@ -273,69 +548,61 @@ class detc_stress(benchmark):
 			"-wounds", str(self._detc.wounds),
 		])
 
-		for baker in self.bakers:
+		def log_fn(baker: Optional[str]) -> Tuple[str, str]:
 			log_name = "{}/{}_{}".format(self._detc.test_log_dir, self.name, baker)
+			return log_name + "_stdout.log", log_name + "_stderr.log"
 
-			outlog = open(log_name + "_stdout.log", 'w')
-			errlog = open(log_name + "_stderr.log", 'w')
+		#cmd.extend([ "-hosts", baker + ":" + str(self.port) ])
+		return [ phase("run", lambda baker: pool().cmd(baker, ' '.join(base_cmd)), list(self.bakers), log_fn,
+			measured=True) ]
 
-			cmd = [ "ssh", baker ]
-			cmd.extend(base_cmd)
-			#cmd.extend([ "-hosts", baker + ":" + str(self.port) ])
-			proc = subprocess.Popen(cmd, stdout=outlog, stderr=errlog)
-
-			info.append((proc, outlog, errlog))
-
-		return info
+	def report(self) -> None:
+		print("running {}.report".format(self.name))
+		markbench.report(self.test_home, self._detc.test_log_dir, self.name)
 
 class memcached_stress(benchmark):
 	def __init__(self, bakers: Set[str], _memcached: memcached, delay: int = 0,
 			requests: int = 1 * 1000 * 1000,
-			keys: int = 64 * 1000 * 1000, port: int = 32232) -> None:
+			keys: int = 64 * 1000 * 1000, port: int = 32232, warmup_requests: int = 0) -> None:
 		super(memcached_stress, self).__init__(bakers, delay)
 		self._memcached = _memcached
 		self.apps.append(self._memcached)
 		self.requests: int = requests
 		self.keys: int = keys
 		self.port: int = port
+		self.warmup_requests: int = warmup_requests
 	
-	def write_conf(self) -> None:
-		print("running memcached_stress.write_conf")
-		super(memcached_stress, self).write_conf()
-		with open(self.test_home + "/conf/" + self.name, "a") as conf_f:
-			conf_f.write("requests {}\n".format(self.requests))
-			conf_f.write("keys {}\n".format(self.keys))
-			conf_f.write("server port {}\n".format(self.port))
-
-	def run(self) -> List[Tuple[subprocess.Popen, TextIO, TextIO]]:
-		print("running {}.run".format(self.name))
-
-		info: List[Tuple[subprocess.Popen, TextIO, TextIO]] = []
-
+	def describe(self) -> Dict[str, Any]:
+		fields = super(memcached_stress, self).describe()
+		fields.update({ "requests": self.requests, "keys": self.keys, "server port": self.port,
+			"warmup_requests": self.warmup_requests })
+		return fields
+
+	# load fills the cache with sets, the optional warmup runs the measured mix without counting.
+	# a failed load or warmup is warned about and the run still measured, as memtier always was.
+	def pipeline(self) -> List[phase]:
+		server = sorted(self.bakers)[0]
 		base_cmd: List[str] = [
-			"/home/eurosys21/applications/memtier_benchmark-1.3.0/memtier_benchmark",
-			"-s", "baker10", "-p", str(self.port), "-P", "memcache_binary",
+			tools["memtier"],
+			"-s", pool().addr(server), "-p", str(self.port), "-P", "memcache_binary",
 			"-d", "2048", "-t", "12", "-c", "8"
 		]
 
-		cmd = base_cmd + [ "--key-maximum=" + str(self.keys), "-n", str(self.requests),
-			"--ratio=1:0" ]
-		log_name = "{}/{}0_{}".format(self._memcached.test_log_dir, self.name, "baker10")
-		outlog = open(log_name + "_stdout.log", 'w')
-		errlog = open(log_name + "_stderr.log", 'w')
-		proc0 = subprocess.run(cmd, stdout=outlog, stderr=errlog)
-		if proc0.returncode != 0:
-			print("[warn] ret: {} for: {}".format(proc0.returncode, proc0.args))
-		outlog.close()
-		errlog.close()
-
-		cmd = base_cmd + [ "--key-maximum=" + str(self.keys), "-n", str(self.requests),
-			"--ratio=1:10" ]
-		log_name = "{}/{}1_{}".format(self._memcached.test_log_dir, self.name, "baker10")
-		outlog = open(log_name + "_stdout.log", 'w')
-		errlog = open(log_name + "_stderr.log", 'w')
-		proc1 = subprocess.Popen(cmd, stdout=outlog, stderr=errlog)
-
-		info.append((proc1, outlog, errlog))
-
-		return info
+		steps: List[Tuple[str, int, str]] = [ ("load", self.requests, "1:0") ]
+		if self.warmup_requests:
+			steps.append(("warmup", self.warmup_requests, "1:10"))
+		steps.append(("run", self.requests, "1:10"))
+
+		phases: List[phase] = []
+		for i, (name, requests, ratio) in enumerate(steps):
+			log_name = "{}/{}{}_{}".format(self._memcached.test_log_dir, self.name, i, server)
+			cmd = base_cmd + [ "--key-maximum=" + str(self.keys), "-n", str(requests), "--ratio=" + ratio ]
+			phases.append(phase(name, lambda host, cmd=cmd: cmd, [ None ],
+				lambda host, log_name=log_name: (log_name + "_stdout.log", log_name + "_stderr.log"),
+				after=phases[-1].name if phases else None, measured=name == "run", strict=False))
+		return phases
+
+	def report(self) -> None:
+		print("running {}.report".format(self.name))
+		memtier.report(self.test_home, self._memcached.test_log_dir, self.name, [ p.name for p in self.phases ],
+			[ p.name for p in self.phases if p.measured ])
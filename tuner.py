@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import math
+import argparse
+import itertools
+import numpy as np
+from time import clock_gettime, CLOCK_MONOTONIC
+from typing import List, Dict, Tuple, Optional, Callable
+
+import launch
+from launch import spark_params, workload_n, use_local_cluster
+from tests import config
+from results import results_store, result_set
+from apps import G
+
+# searches one spark workload's heap size, spark.memory.fraction, storageFraction and executor
+# cores for the lowest runtime, within a budget of cluster hours. every trial is a single app
+# workload_n under <prefix>-tune-<letter>0, so it lands in the results store like any other test,
+# and a setting the store already has completed runs of, tuned or run by hand, costs nothing.
+# a trial is stopped once it runs stop_factor times longer than the best median so far; it then
+# counts as a timeout and ranks below every setting that completed.
+#
+# not inside partitioned(): the tuner needs each result before it picks the next trial.
+
+letters: Dict[str, str] = { "ml/kmeans": "M", "websearch/pagerank": "P", "graph/nweight": "W" }
+
+class candidate:
+	def __init__(self, heap: int, mem_frac: float, storage_frac: float, cores: int) -> None:
+		self.heap: int = heap
+		self.mem_frac: float = mem_frac
+		self.storage_frac: float = storage_frac
+		self.cores: int = cores
+
+	def __str__(self) -> str:
+		return "heap {}g mem_frac {} storage_frac {} cores {}".format(self.heap, self.mem_frac,
+			self.storage_frac, self.cores)
+
+class space:
+	def __init__(self, heaps: List[int], mem_fracs: List[float], storage_fracs: List[float],
+			cores: List[int]) -> None:
+		self.candidates: List[candidate] = [ candidate(int(h), m, s, int(c))
+			for h, m, s, c in itertools.product(heaps, mem_fracs, storage_fracs, cores) ]
+
+	# every candidate scaled into the unit cube, one row each
+	def features(self) -> np.ndarray:
+		x = np.array([ [ c.heap, c.mem_frac, c.storage_frac, c.cores ] for c in self.candidates ], dtype=np.float64)
+		lo = x.min(axis=0)
+		span = x.max(axis=0) - lo
+		return (x - lo) / np.where(span > 0, span, 1)
+
+# the hand picked settings of run_global_optimal sit in the middle of these
+default_spaces: Dict[str, space] = {
+	"ml/kmeans": space([ 8, 14, 20 ], [ 0.5, 0.6, 0.7, 0.8 ], [ 0.5, 0.7, 0.9 ], [ 3, 5 ]),
+	"websearch/pagerank": space([ 8, 14, 20 ], [ 0.5, 0.6, 0.7, 0.8 ], [ 0.5, 0.7, 0.9 ], [ 3, 5 ]),
+	"graph/nweight": space([ 16, 24, 32 ], [ 0.4, 0.5, 0.6, 0.7 ], [ 0.5, 0.7, 0.9 ], [ 3, 5 ]),
+}
+
+class tuner:
+	def __init__(self, workload: str, budget_hours: float, sp: space = None, conf: config = config.global_optimal,
+			prefix: str = "tuning", root: str = ".", stop_factor: float = 1.5, max_trial: int = 45 * 60) -> None:
+		self.workload: str = workload
+		self.space: space = sp if sp else default_spaces[workload]
+		self.budget: float = budget_hours
+		self.spent: float = 0.0
+		self.conf: config = conf
+		self.path: str = "{}/{}-tune-{}0".format(root, prefix, letters[workload])
+		self.store: results_store = results_store(root)
+		self.stop_factor: float = stop_factor
+		self.max_trial: int = max_trial
+		self.trials: int = 0
+		self.store.ingest()
+
+	def runs(self, c: candidate) -> result_set:
+		return self.store.query(config=self.conf.name, mix=letters[self.workload], workload=self.workload,
+			heap=c.heap * G, cores=c.cores, mem_frac=c.mem_frac, mem_storage_frac=c.storage_frac)
+
+	# median runtime of the completed runs, inf when every run timed out, nan when never run
+	def score(self, c: candidate) -> float:
+		rs = self.runs(c)
+		if len(rs.completed()):
+			return rs.median()
+		return math.inf if len(rs) else math.nan
+
+	def best(self) -> Tuple[Optional[candidate], float]:
+		scored = [ (self.score(c), i) for i, c in enumerate(self.space.candidates) ]
+		scored = [ (s, i) for s, i in scored if not math.isnan(s) ]
+		if not scored:
+			return None, math.nan
+		s, i = min(scored)
+		return self.space.candidates[i], s
+
+	def left(self) -> float:
+		return self.budget - self.spent
+
+	# runs c once more, false when the budget is gone
+	def trial(self, c: candidate) -> bool:
+		if self.left() <= 0:
+			return False
+		hosts = len(launch.bakers)
+		_, best = self.best()
+		timeout = self.max_trial
+		if math.isfinite(best):
+			timeout = min(timeout, int(best * self.stop_factor) + 1)
+		timeout = max(1, min(timeout, int(self.left() * 3600 / hosts)))
+		print("== tuning {}: {} (timeout {}s, {:.2f} of {} cluster hours used)".format(self.workload, c, timeout,
+			self.spent, self.budget))
+		start = clock_gettime(CLOCK_MONOTONIC)
+		workload_n(self.conf, [ spark_params(c.heap, self.workload, mem_frac=c.mem_frac,
+			mem_storage_frac=c.storage_frac, cores=c.cores) ], 0, self.path, timeout=timeout)
+		self.spent += (clock_gettime(CLOCK_MONOTONIC) - start) * hosts / 3600
+		self.trials += 1
+		self.store.ingest()
+		return True
+
+	# every candidate not measured yet, in order
+	def grid(self) -> Tuple[Optional[candidate], float]:
+		for c in self.space.candidates:
+			if math.isnan(self.score(c)) and not self.trial(c):
+				break
+		return self.best()
+
+	# rung r gives the survivors eta^r runs each and keeps the best 1/eta of them, so noisy
+	# single runs do not decide on their own and bad settings never get the repeats
+	def halving(self, eta: int = 3) -> Tuple[Optional[candidate], float]:
+		alive = list(self.space.candidates)
+		reps = 1
+		while alive:
+			for c in alive:
+				while len(self.runs(c)) < reps:
+					if not self.trial(c):
+						return self.best()
+			if len(alive) == 1:
+				break
+			alive.sort(key=lambda c: self.score(c))
+			alive = alive[:max(1, len(alive) // eta)]
+			reps *= eta
+		return self.best()
+
+	# gaussian process over the unit cube with expected improvement, a handful of spread out
+	# settings first. settings the store already has seed the model for free.
+	def bayes(self, init: int = 5, length: float = 0.3, noise: float = 1e-2,
+			seed: int = 0) -> Tuple[Optional[candidate], float]:
+		x = self.space.features()
+		rng = np.random.default_rng(seed)
+		for i in rng.permutation(len(x))[:init]:
+			c = self.space.candidates[i]
+			if math.isnan(self.score(c)) and not self.trial(c):
+				return self.best()
+		while True:
+			scores = np.array([ self.score(c) for c in self.space.candidates ])
+			seen = ~np.isnan(scores)
+			todo = np.nonzero(~seen)[0]
+			if not len(todo):
+				break
+			y = scores[seen]
+			# timeouts count as the worst completed run, stretched by the stop factor
+			finite = y[np.isfinite(y)]
+			y = np.where(np.isfinite(y), y, (finite.max() if len(finite) else 1.0) * self.stop_factor)
+			mu, sd = y.mean(), y.std() if y.std() > 0 else 1.0
+			mean, std = gp(x[seen], (y - mu) / sd, x[todo], length, noise)
+			ei = expected_improvement(mean, std, ((y.min() - mu) / sd))
+			if not self.trial(self.space.candidates[todo[np.argmax(ei)]]):
+				break
+		return self.best()
+
+def rbf(a: np.ndarray, b: np.ndarray, length: float) -> np.ndarray:
+	d = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+	return np.exp(-0.5 * d / length ** 2)
+
+def gp(x: np.ndarray, y: np.ndarray, xs: np.ndarray, length: float, noise: float) -> Tuple[np.ndarray, np.ndarray]:
+	k = rbf(x, x, length) + noise * np.eye(len(x))
+	l = np.linalg.cholesky(k)
+	alpha = np.linalg.solve(l.T, np.linalg.solve(l, y))
+	ks = rbf(x, xs, length)
+	v = np.linalg.solve(l, ks)
+	return ks.T @ alpha, np.sqrt(np.maximum(1.0 - (v ** 2).sum(axis=0), 1e-12))
+
+# for minimizing: how far under best each point is expected to land
+def expected_improvement(mean: np.ndarray, std: np.ndarray, best: float) -> np.ndarray:
+	z = (best - mean) / std
+	cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+	pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+	return (best - mean) * cdf + std * pdf
+
+strategies: Dict[str, Callable[[tuner], Tuple[Optional[candidate], float]]] = {
+	"grid": tuner.grid,
+	"halving": tuner.halving,
+	"bayes": tuner.bayes,
+}
+
+def main() -> None:
+	parser = argparse.ArgumentParser()
+	parser.add_argument("workload", choices=sorted(letters))
+	parser.add_argument("--strategy", choices=sorted(strategies), default="bayes")
+	parser.add_argument("--budget", type=float, default=8, help="cluster hours")
+	parser.add_argument("--prefix", default="tuning")
+	parser.add_argument("--local", help="run on a local cluster under this root instead")
+	args = parser.parse_args()
+
+	if args.local:
+		use_local_cluster(args.local)
+	t = tuner(args.workload, args.budget, prefix=args.prefix)
+	c, s = strategies[args.strategy](t)
+	print("== {} {} trials, {:.2f} cluster hours: {}".format(args.workload, t.trials, t.spent,
+		"{} at {:.1f}s".format(c, s) if c else "nothing completed"))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import zlib
+import signal
+import threading
+from array import array
+from time import clock_gettime, CLOCK_MONOTONIC
+from typing import List, Dict, Set, Tuple, Optional, Any
+
+from memsampler import header, magic, kind_meta, kind_cgroup
+
+# reads what was appended to a file since the last call, a file that shrank is read from the start
+class tail:
+	def __init__(self, path: str) -> None:
+		self.path: str = path
+		self.off: int = 0
+
+	def read(self) -> bytes:
+		try:
+			with open(self.path, "rb") as f:
+				f.seek(0, os.SEEK_END)
+				if f.tell() < self.off:
+					self.off = 0
+				f.seek(self.off)
+				data = f.read()
+		except OSError:
+			return b""
+		self.off += len(data)
+		return data
+
+# the last memory.stat values of one baker's mem_sampler stream, complete frames only
+class cgroup_tail:
+	def __init__(self, path: str) -> None:
+		self.tail: tail = tail(path)
+		self.buf: bytes = b""
+		self.columns: List[str] = []
+		self.last: Dict[str, int] = {}
+
+	def read(self) -> Dict[str, int]:
+		self.buf += self.tail.read()
+		off = 0
+		while off + header.size <= len(self.buf):
+			m, kind, rows, cols, size = header.unpack_from(self.buf, off)
+			if m != magic:
+				# not a sampler stream, nothing more to learn from it
+				self.buf = b""
+				return self.last
+			if off + header.size + size > len(self.buf):
+				break
+			payload = self.buf[off + header.size:off + header.size + size]
+			off += header.size + size
+			if kind == kind_meta:
+				self.columns = json.loads(payload.decode())["columns"]
+			elif kind == kind_cgroup and rows and cols == len(self.columns):
+				deltas = array('q', zlib.decompress(payload))
+				if sys.byteorder != "little":
+					deltas.byteswap()
+				# columns are delta encoded one after the other, a column's sum is its last value
+				self.last = { name: sum(deltas[c * rows:(c + 1) * rows]) for c, name in enumerate(self.columns) }
+		self.buf = self.buf[off:]
+		return self.last
+
+# watches a running test for signs of life and aborts it the way the alarm does once they stop:
+#   - progress: new output of a running phase, or for a benchmark with a progress_marker (spark's
+#     "Finished task") new occurrences of it in its phase logs and the executor logs the spark log
+#     collector syncs
+#   - pressure: swap growth, major faults and oom kills of the test's cgroup from the mem_sampler
+# no progress for stall_secs while a phase runs is a stall, no progress for thrash_secs under
+# pressure is thrashing. the reason ends up in test.stalled and the test's stall file, apart from
+# the timeout file of a test that merely ran longer than its timeout.
+class watchdog:
+	def __init__(self, t: Any, interval: float = 30, stall_secs: float = 600, thrash_secs: float = 300,
+			majfaults_per_sec: float = 100, swap_bytes: int = 256 * 1024 * 1024) -> None:
+		self.t: Any = t
+		self.interval: float = interval
+		self.stall_secs: float = stall_secs
+		self.thrash_secs: float = thrash_secs
+		self.majfaults_per_sec: float = majfaults_per_sec
+		self.swap_bytes: int = swap_bytes
+		self.tails: Dict[str, tail] = {}
+		self.started: Set[str] = set()
+		self.cgroups: Dict[str, cgroup_tail] = {}
+		self.last_progress: float = 0
+		self.base: Dict[str, int] = {}
+		self.thread: threading.Thread = None
+		self.done: threading.Event = threading.Event()
+
+	def grew(self, path: str, marker: Optional[bytes]) -> int:
+		if path not in self.tails:
+			self.tails[path] = tail(path)
+		data = self.tails[path].read()
+		return data.count(marker) if marker else len(data)
+
+	# how much the test's benchmarks did since the last poll, and whether one of them is running
+	def progress(self) -> Tuple[int, bool]:
+		done = 0
+		running = False
+		markers: List[bytes] = []
+		for bm in self.t.benchmarks:
+			marker = type(bm).progress_marker
+			for p in list(bm.phases):
+				if not p.start or p.finished.is_set():
+					continue
+				running = True
+				# a phase starting is progress too, the one before it finished
+				if bm.name + '.' + p.name not in self.started:
+					self.started.add(bm.name + '.' + p.name)
+					done += 1
+				for host in p.hosts:
+					for path in p.log_fn(host):
+						done += self.grew(path, marker)
+			if marker and marker not in markers:
+				markers.append(marker)
+		spark = self.t.test_home + "/spark"
+		if markers and os.path.isdir(spark):
+			for d, _, files in os.walk(spark):
+				for name in files:
+					if name == "stderr":
+						for marker in markers:
+							done += self.grew(d + '/' + name, marker)
+		return done, running
+
+	# summed over the bakers
+	def counters(self) -> Dict[str, int]:
+		d = self.t.test_home + "/mem_sampler"
+		if os.path.isdir(d):
+			for name in os.listdir(d):
+				if name.endswith(".bin") and name not in self.cgroups:
+					self.cgroups[name] = cgroup_tail(d + '/' + name)
+		out: Dict[str, int] = { "swap": 0, "pgmajfault": 0, "oom_kill": 0 }
+		for cg in self.cgroups.values():
+			last = cg.read()
+			for k in out:
+				out[k] += last.get(k, 0)
+		return out
+
+	# what the cgroup went through since the last progress, empty when nothing to speak of
+	def pressure(self, now: Dict[str, int], secs: float) -> str:
+		why: List[str] = []
+		if now["oom_kill"] > self.base["oom_kill"]:
+			why.append("{} oom kills".format(now["oom_kill"] - self.base["oom_kill"]))
+		if now["swap"] - self.base["swap"] >= self.swap_bytes:
+			why.append("{:.1f}g more swap".format((now["swap"] - self.base["swap"]) / 2**30))
+		if now["pgmajfault"] - self.base["pgmajfault"] >= self.majfaults_per_sec * secs:
+			why.append("{:.0f} major faults/s".format((now["pgmajfault"] - self.base["pgmajfault"]) / secs))
+		return ", ".join(why)
+
+	def check(self) -> Optional[str]:
+		done, running = self.progress()
+		counters = self.counters()
+		now = clock_gettime(CLOCK_MONOTONIC)
+		if done or not running:
+			self.last_progress = now
+			self.base = counters
+			return None
+		quiet = now - self.last_progress
+		if quiet >= self.stall_secs:
+			return "stall no progress for {:.0f}s".format(quiet)
+		if quiet >= self.thrash_secs:
+			why = self.pressure(counters, quiet)
+			if why:
+				return "thrash no progress for {:.0f}s, {}".format(quiet, why)
+		return None
+
+	def loop(self) -> None:
+		while not self.done.wait(self.interval) and not self.t.stopping.is_set():
+			try:
+				reason = self.check()
+			except Exception as e:
+				print("[warn] watchdog: {!r}".format(e))
+				continue
+			if reason and not self.done.is_set():
+				print("[error] {}: {}, aborting".format(self.t.test_home, reason))
+				self.t.stalled = reason
+				# the same way out as the alarm, the handler runs in the main thread
+				os.kill(os.getpid(), signal.SIGALRM)
+				return
+
+	def start(self) -> None:
+		self.last_progress = clock_gettime(CLOCK_MONOTONIC)
+		self.base = self.counters()
+		self.thread = threading.Thread(target=self.loop, name="watchdog", daemon=True)
+		self.thread.start()
+
+	def stop(self) -> None:
+		self.done.set()